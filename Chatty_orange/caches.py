@@ -0,0 +1,76 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Chatty_orange/caches.py
+"""
+Конфигурация CACHES на Redis (django-redis) для настроек проекта.
+
+Каждый алиас живет в своей логической БД Redis, со своим префиксом ключей,
+временем жизни по умолчанию и пулом соединений (пул создается один раз на
+процесс и алиас, соединения переиспользуются между запросами):
+
+- default   - общий кэш (сайдбар, лента и т.п.);
+- sessions  - кэш сессий (SESSION_ENGINE cached_db);
+- ratelimit - счетчики ограничения частоты запросов, общие для всех воркеров;
+- fragments - кэш фрагментов шаблонов; недоступность Redis для него не ошибка,
+  а промах кэша.
+
+Для тестов и локальной разработки без Redis вместо сетевых соединений
+подставляется fakeredis: тот же клиент django-redis, те же команды и
+Lua-скрипты, но данные хранятся в памяти процесса.
+"""
+
+# alias: (номер БД Redis, префикс ключей, TIMEOUT по умолчанию, ошибки Redis = промах)
+CACHE_ALIASES = {
+    'default': (0, 'chatty', 300, False),
+    'sessions': (1, 'session', 60 * 60 * 24 * 14, False),
+    'ratelimit': (2, 'rl', 60, False),
+    'fragments': (3, 'fragment', 600, True),
+}
+
+
+def redis_caches(url, max_connections=50, socket_timeout=1.0, fake=False):
+    """
+    Словарь для настройки CACHES: по алиасу на каждую запись CACHE_ALIASES.
+    url - адрес сервера без номера БД (redis://host:port); fake=True -
+    fakeredis вместо настоящего сервера.
+    """
+    pool_kwargs = {
+        'max_connections': max_connections,
+        'retry_on_timeout': True,
+        'health_check_interval': 30,
+    }
+    if fake:
+        from fakeredis import FakeConnection
+        pool_kwargs['connection_class'] = FakeConnection
+
+    url = url.rstrip('/')
+    return {
+        alias: {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': f'{url}/{db}',
+            'KEY_PREFIX': key_prefix,
+            'TIMEOUT': timeout,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'SOCKET_CONNECT_TIMEOUT': socket_timeout,
+                'SOCKET_TIMEOUT': socket_timeout,
+                'CONNECTION_POOL_KWARGS': dict(pool_kwargs),
+                'IGNORE_EXCEPTIONS': ignore_exceptions,
+            },
+        }
+        for alias, (db, key_prefix, timeout, ignore_exceptions) in CACHE_ALIASES.items()
+    }
@@ -0,0 +1,160 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Chatty_orange/ratelimit.py
+"""
+Ограничение частоты запросов на Redis (алиас кэша ratelimit).
+
+Алгоритм - GCRA (generic cell rate algorithm): для каждой пары
+«квота + пользователь» хранится одно число - теоретическое время следующего
+запроса (TAT). Квота (limit, period) пропускает всплеск до limit запросов,
+дальше - по одному запросу в period / limit секунд. Проверка и списание
+выполняются одним Lua-скриптом, атомарно для всех воркеров; время берется
+из Redis (TIME), так что расхождение часов между серверами не мешает.
+
+За один вызов можно проверить несколько квот (например, общую квоту
+ассистента и квоту конкретного действия): запрос списывается со всех
+сразу или, если хотя бы одна исчерпана, ни с одной.
+
+Квоты задаются настройкой RATE_LIMITS: {имя: (limit, period в секундах)}.
+Если Redis недоступен, запрос пропускается (с предупреждением в логе).
+"""
+import logging
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'ratelimit'
+
+DEFAULT_RATE_LIMITS = {
+    'assistant': (30, 60),
+    'assistant:action': (15, 60),
+}
+
+# KEYS - ключи квот; ARGV - пары (интервал между запросами, period) в мкс.
+# Возвращает {1|0, занято запросов в самой загруженной квоте, через сколько
+# мкс можно повторить}.
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local new_tats = {}
+local used = 0
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[i * 2 - 1])
+    local period = tonumber(ARGV[i * 2])
+    local tat = tonumber(redis.call('GET', key) or now)
+    if tat < now then
+        tat = now
+    end
+    local new_tat = tat + interval
+    if new_tat - period > now then
+        return {0, math.ceil((tat - now) / interval), math.ceil(new_tat - period - now)}
+    end
+    new_tats[i] = new_tat
+    used = math.max(used, math.ceil((new_tat - now) / interval))
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, string.format('%.0f', new_tats[i]), 'PX', math.ceil((new_tats[i] - now) / 1000))
+end
+return {1, used, 0}
+"""
+
+RateLimitResult = namedtuple('RateLimitResult', 'allowed used retry_after')
+
+_script = None
+
+
+def get_quota(name):
+    """(limit, period) квоты из RATE_LIMITS; действия ассистента без своей квоты - assistant:action."""
+    limits = {**DEFAULT_RATE_LIMITS, **getattr(settings, 'RATE_LIMITS', {})}
+    if name in limits:
+        return limits[name]
+    if name.startswith('assistant:'):
+        return limits['assistant:action']
+    raise KeyError(f"Не задана квота {name!r} в RATE_LIMITS")
+
+
+def _run_script(keys, args):
+    # Script сам переключается с EVALSHA на EVAL, если скрипта еще нет в Redis
+    global _script
+    connection = get_redis_connection(CACHE_ALIAS)
+    if _script is None:
+        _script = connection.register_script(GCRA_SCRIPT)
+    return _script(keys=keys, args=args, client=connection)
+
+
+def consume(identifier, quotas):
+    """
+    Списывает запрос identifier со всех квот quotas - списка
+    (имя, limit, period). Возвращает RateLimitResult; retry_after в секундах.
+    """
+    cache = caches[CACHE_ALIAS]
+    keys, args = [], []
+    for name, limit, period in quotas:
+        keys.append(cache.make_key(f'{name}:{identifier}'))
+        args += [period * 1_000_000 // limit, period * 1_000_000]
+    try:
+        allowed, used, retry_after = _run_script(keys, args)
+    except RedisError as e:
+        logger.warning(f"Rate limiter недоступен, запрос пропущен: {e}")
+        return RateLimitResult(True, 0, 0)
+    return RateLimitResult(bool(allowed), used, retry_after / 1_000_000)
+
+
+def check(identifier, *names):
+    """Списывает запрос identifier с именованных квот из RATE_LIMITS."""
+    return consume(identifier, [(name, *get_quota(name)) for name in names])
+
+
+def client_identifier(request):
+    """Идентификатор для лимитов: пользователь или IP анонимного клиента."""
+    if request.user.is_authenticated:
+        return f"user_{request.user.id}"
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return f"ip_{x_forwarded_for.split(',')[0]}"
+    return f"ip_{request.META.get('REMOTE_ADDR')}"
+
+
+def too_many_requests(result, message='Слишком много запросов! Попробуйте позже.'):
+    """JSON-ответ 429 с заголовком Retry-After."""
+    response = JsonResponse({'status': 'error', 'message': message}, status=429)
+    response['Retry-After'] = max(1, round(result.retry_after))
+    return response
+
+
+def rate_limit(*names):
+    """
+    Декоратор view-функции: при исчерпании квот из RATE_LIMITS отвечает 429.
+    Для методов класса - через method_decorator(rate_limit(...), name='post').
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            result = check(client_identifier(request), *names)
+            if not result.allowed:
+                logger.warning(f"Rate limit {', '.join(names)} exceeded for {client_identifier(request)}")
+                return too_many_requests(result)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -20,6 +20,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from Chatty_orange.caches import redis_caches
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     # --- Наши приложения ---
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
@@ -276,4 +279,80 @@ JAZZMIN_UI_TWEAKS = {
         "danger": "btn-danger",
         "success": "btn-success"
     }
-}
\ No newline at end of file
+}
+
+# Лента подписок (subscriptions.timeline)
+FEED_TIMELINE_LENGTH = 500  # Сколько последних постов хранится в ленте каждого пользователя
+FEED_CELEBRITY_FOLLOWERS = 10000  # С этого числа подписчиков посты автора подмешиваются при чтении
+
+# Кэш: Redis через django-redis (алиасы default, sessions, ratelimit, fragments -
+# см. Chatty_orange/caches.py)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379')
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))  # Размер пула на процесс и алиас
+# fakeredis в памяти процесса вместо настоящего Redis (тесты, разработка без Redis)
+USE_FAKE_REDIS = os.getenv('USE_FAKE_REDIS', 'False').lower() in ('true', '1', 't')
+CACHES = redis_caches(REDIS_URL, REDIS_MAX_CONNECTIONS, fake=USE_FAKE_REDIS)
+
+# Сессии пишутся в БД и читаются из кэша sessions
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Ограничение частоты запросов (Chatty_orange.ratelimit): имя квоты -> (запросов, за секунд)
+RATE_LIMITS = {
+    'assistant': (30, 60),  # Все запросы к ИИ-помощнику
+    'assistant:action': (15, 60),  # Одно действие помощника, если для него нет своей квоты
+    'assistant:check_post_content': (5, 60),  # Дорогие действия - меньше
+    'assistant:analyze_profile': (5, 60),
+    'assistant:generate_post_ideas': (5, 60),
+    'assistant:faq': (30, 60),  # Дешевые ответы по справке - больше
+    'assistant:feature_explanation': (30, 60),
+    'subscription_toggle': (30, 60),
+    'post_reaction': (60, 60),
+    'submit_advice': (3, 3600),
+}
+
+# Кэш счетчиков профиля (users.profile_stats); полученные лайки могут отставать на столько секунд
+PROFILE_STATS_CACHE_TIMEOUT = 60
+
+# Реакции зрителя на посты (posts.reactions): при значении > 0 все лайки и дизлайки
+# пользователя держатся в множествах Redis столько секунд; 0 - всегда запрос к БД
+VIEWER_REACTIONS_CACHE_TIMEOUT = 0
+
+# Тела карточек постов в лентах (posts.cards) в кэше fragments, секунд
+POST_CARD_CACHE_TIMEOUT = 60 * 10
+
+# Кэш ответов ИИ-помощника на неперсональные промпты (orange_assistant.response_cache)
+AI_RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24  # Сколько секунд хранится ответ
+AI_RESPONSE_CACHE_MAX_ENTRIES = 5000  # Сверх этого вытесняются давно не запрошенные ответы
+
+# Клиент ИИ-помощника (orange_assistant.ai_client), один на процесс.
+# orange_assistant.ai_client.StubBackend - заглушка без сети для офлайн-разработки
+AI_CLIENT_BACKEND = os.getenv('AI_CLIENT_BACKEND', 'orange_assistant.ai_client.GeminiBackend')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+
+# Устойчивость вызовов Gemini (orange_assistant.resilience)
+AI_DEADLINES = {  # Бюджет времени на ответ действия вместе с повторами, секунд
+    'default': 15,
+    'faq': 10,
+    'feature_explanation': 10,
+    'general_chat': 12,
+    'analyze_sentiment': 12,
+    'check_post_content': 20,
+    'post_creation_suggestion': 20,
+    'analyze_profile': 20,
+    'generate_post_ideas': 20,
+}
+AI_RETRY_ATTEMPTS = 3  # Попыток при временных ошибках (503, 429, таймаут)
+AI_RETRY_BASE_DELAY = 0.5  # Пауза перед повтором - случайная от 0 до base * 2^попытка
+AI_RETRY_MAX_DELAY = 4
+AI_CIRCUIT_FAILURE_THRESHOLD = 5  # Столько временных ошибок за окно размыкают цепь
+AI_CIRCUIT_WINDOW = 30
+AI_CIRCUIT_OPEN_SECONDS = 30  # Сколько секунд помощник отвечает заглушкой без обращения к Gemini
+AI_SINGLEFLIGHT_POLL_INTERVAL = 0.1  # Как часто запрос, ждущий такой же одновременный, проверяет его результат, секунд
+
+# Журнал обращений к ИИ (orange_assistant.usage): записи копятся в Redis и сохраняются пачками
+AI_USAGE_BATCH_SIZE = 100
+
+# Асинхронное представление ИИ-помощника (orange_assistant.views.AsyncChatWithAIView).
+# Имеет смысл под ASGI-сервером (gunicorn + uvicorn worker, см. entrypoint.prod.sh)
+ASSISTANT_ASYNC_VIEW = os.getenv('ASSISTANT_ASYNC_VIEW', 'False').lower() in ('true', '1', 't')
@@ -54,6 +54,12 @@ DATABASES = {
     }
 }
 
+# Без REDIS_URL (локальная разработка, тесты) кэш работает на fakeredis
+USE_FAKE_REDIS = os.getenv(
+    'USE_FAKE_REDIS', 'False' if os.getenv('REDIS_URL') else 'True'
+).lower() in ('true', '1', 't')
+CACHES = redis_caches(REDIS_URL, REDIS_MAX_CONNECTIONS, fake=USE_FAKE_REDIS)
+
 # Email Console Backend
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -33,6 +33,9 @@ CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in csrf_origins_str.split(',')
 
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
+# Production работает под ASGI (entrypoint.prod.sh), помощник - асинхронный
+ASSISTANT_ASYNC_VIEW = os.getenv('ASSISTANT_ASYNC_VIEW', 'True').lower() in ('true', '1', 't')
+
 # ========== СТАТИЧЕСКИЕ ФАЙЛЫ (КРИТИЧЕСКИ ВАЖНО!) ==========
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
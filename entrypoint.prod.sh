@@ -16,6 +16,11 @@ python manage.py migrate --noinput
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Запуск Gunicorn
-echo "Starting Gunicorn..."
-exec gunicorn Chatty_orange.wsgi:application $GUNICORN_CMD_ARGS
\ No newline at end of file
+# Запуск Gunicorn: по умолчанию ASGI с uvicorn-воркерами (асинхронный ИИ-помощник),
+# SERVER_INTERFACE=wsgi - прежние синхронные воркеры
+if [ "${SERVER_INTERFACE:-asgi}" = "wsgi" ]; then
+  echo "Starting Gunicorn (WSGI)..."
+  exec gunicorn Chatty_orange.wsgi:application $GUNICORN_CMD_ARGS
+fi
+echo "Starting Gunicorn (ASGI, uvicorn workers)..."
+exec gunicorn Chatty_orange.asgi:application -k uvicorn_worker.UvicornWorker $GUNICORN_CMD_ARGS
\ No newline at end of file
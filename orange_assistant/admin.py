@@ -1,3 +1,57 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from . import usage
+from .models import AIUsageLog
+
+REPORT_DAYS = 7
+
+
+@admin.register(AIUsageLog)
+class AIUsageLogAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'action', 'user', 'upstream_status', 'cache_hit',
+        'latency_ms', 'prompt_chars', 'response_chars'
+    )
+    list_filter = ('action', 'upstream_status', 'cache_hit')
+    search_fields = ('user__username',)
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    change_list_template = 'admin/orange_assistant/aiusagelog/change_list.html'
+
+    # Журнал пишется только помощником
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                'report/',
+                self.admin_site.admin_view(self.report_view),
+                name='orange_assistant_aiusagelog_report'
+            ),
+        ] + super().get_urls()
 
-# Register your models here.
+    def report_view(self, request):
+        """Затраты и перцентили времени ответа по действиям за последние дни (?days=N)."""
+        try:
+            days = max(1, int(request.GET.get('days', REPORT_DAYS)))
+        except ValueError:
+            days = REPORT_DAYS
+        # Записи из буфера Redis - в отчет сразу
+        usage.flush()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Отчет по обращениям к ИИ",
+            'days': days,
+            'rows': usage.report(since=timezone.now() - timedelta(days=days)),
+        }
+        return TemplateResponse(request, 'admin/orange_assistant/aiusagelog/report.html', context)
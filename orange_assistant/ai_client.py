@@ -0,0 +1,175 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# orange_assistant/ai_client.py
+"""
+Клиент сервиса ИИ, общий для всего процесса.
+
+Бэкенд создается один раз на воркер при первом запросе (после fork у
+gunicorn) и переиспользуется: genai.configure и GenerativeModel больше не
+вызываются на каждое сообщение, а gRPC-канал модели с уже установленным
+TLS-соединением живет между запросами.
+
+- GeminiBackend: Google Gemini через google-generativeai;
+- StubBackend: локальная заглушка без сети для тестов и офлайн-разработки.
+
+Бэкенд выбирается настройкой AI_CLIENT_BACKEND (путь к классу), по
+умолчанию - Gemini. При изменении настроек (override_settings в тестах)
+клиент пересоздается.
+"""
+import threading
+
+import google.generativeai as genai
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'orange_assistant.ai_client.GeminiBackend'
+DEFAULT_MODEL = 'gemini-2.0-flash'
+EMPTY_RESPONSE = "ИИ не смог сгенерировать ответ в ожидаемом формате."
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class AIClientNotConfigured(Exception):
+    """Для выбранного бэкенда не хватает настроек (например, ключа API)."""
+
+
+class BaseAIBackend:
+    """
+    Интерфейс бэкенда: синхронная и асинхронная генерация текста целиком
+    (generate/agenerate) и по частям по мере генерации (stream/astream).
+    timeout - сколько секунд ждать ответа сервиса (None - без ограничения);
+    повторы и дедлайны действий - в orange_assistant.resilience.
+    """
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, timeout: float = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, timeout: float = None):
+        yield self.generate(prompt, timeout=timeout)
+
+    async def astream(self, prompt: str, timeout: float = None):
+        yield await self.agenerate(prompt, timeout=timeout)
+
+
+class GeminiBackend(BaseAIBackend):
+    """Google Gemini: ключ настраивается и модель создается один раз."""
+
+    def __init__(self):
+        api_key = getattr(settings, 'GOOGLE_API_KEY', None)
+        if not api_key:
+            raise AIClientNotConfigured("GOOGLE_API_KEY не настроен")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(getattr(settings, 'GEMINI_MODEL', DEFAULT_MODEL))
+
+    @staticmethod
+    def response_text(response) -> str:
+        """Текст ответа Gemini: из parts, text или первого кандидата."""
+        if response.parts:
+            return "".join(part.text for part in response.parts if hasattr(part, 'text'))
+        if hasattr(response, 'text') and response.text:
+            return response.text
+        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+            return "".join(part.text for part in response.candidates[0].content.parts if hasattr(part, 'text'))
+        return EMPTY_RESPONSE
+
+    @staticmethod
+    def chunk_text(chunk) -> str:
+        """Текст очередной части потокового ответа (пустая строка, если текста нет)."""
+        return "".join(part.text for part in chunk.parts if hasattr(part, 'text')) if chunk.parts else ""
+
+    @staticmethod
+    def request_options(timeout):
+        # Повторы делает resilience: встроенные повторы клиента Google отключены
+        options = {'retry': None}
+        if timeout is not None:
+            options['timeout'] = timeout
+        return options
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        return self.response_text(
+            self.model.generate_content(prompt, request_options=self.request_options(timeout))
+        )
+
+    async def agenerate(self, prompt: str, timeout: float = None) -> str:
+        return self.response_text(
+            await self.model.generate_content_async(prompt, request_options=self.request_options(timeout))
+        )
+
+    def stream(self, prompt: str, timeout: float = None):
+        options = self.request_options(timeout)
+        for chunk in self.model.generate_content(prompt, stream=True, request_options=options):
+            text = self.chunk_text(chunk)
+            if text:
+                yield text
+
+    async def astream(self, prompt: str, timeout: float = None):
+        options = self.request_options(timeout)
+        async for chunk in await self.model.generate_content_async(prompt, stream=True, request_options=options):
+            text = self.chunk_text(chunk)
+            if text:
+                yield text
+
+
+class StubBackend(BaseAIBackend):
+    """Заглушка без сети: детерминированный ответ с началом промпта."""
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        return f"🍊 [офлайн-режим] Ответ на запрос: {' '.join(prompt.split())[:200]}"
+
+    async def agenerate(self, prompt: str, timeout: float = None) -> str:
+        return self.generate(prompt)
+
+    def stream(self, prompt: str, timeout: float = None):
+        # По слову, как приходили бы части ответа настоящей модели
+        words = self.generate(prompt).split(' ')
+        yield words[0]
+        for word in words[1:]:
+            yield ' ' + word
+
+    async def astream(self, prompt: str, timeout: float = None):
+        for part in self.stream(prompt):
+            yield part
+
+
+def get_client() -> BaseAIBackend:
+    """Бэкенд ИИ текущего процесса (создается при первом обращении)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                backend_path = getattr(settings, 'AI_CLIENT_BACKEND', None) or DEFAULT_BACKEND
+                _client = import_string(backend_path)()
+    return _client
+
+
+def reset_client():
+    """Сбрасывает клиент; следующий get_client() создаст его заново."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting in ('AI_CLIENT_BACKEND', 'GOOGLE_API_KEY', 'GEMINI_MODEL'):
+        reset_client()
@@ -14,20 +14,24 @@
 # limitations under the License.
 
 
-import google.generativeai as genai
-from django.conf import settings
-from django.db.models import Count, Q
 import logging
 from datetime import datetime, timedelta
 import json
 
+from asgiref.sync import sync_to_async
+
 # Импортируем все модели глобально
 from posts.models import Post, Comment
+from posts.search import get_search_backend
+from users.lookup import lookup_user
 from users.models import CustomUser
+from users.profile_stats import COUNTERS as PROFILE_COUNTERS, get_profile_stats
+from . import ai_client, resilience, response_cache, singleflight, usage
 
 # Импортируем модель подписок
 try:
     from subscriptions.models import Subscription
+    from subscriptions.recommendations import recommend_authors
 except ImportError:
     logger.error("Модель Subscription не найдена")
     Subscription = None
@@ -35,36 +39,223 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
-def get_gemini_response(prompt: str) -> str:
+# Ответы пользователю, когда сервис ИИ недоступен или не уложился в дедлайн
+DEGRADED_RESPONSE = (
+    "Сервис ИИ сейчас перегружен, поэтому я отвечаю коротко 🍊 Попробуй повторить запрос через минуту, "
+    "а пока можно воспользоваться поиском по сайту или разделом помощи."
+)
+TIMEOUT_RESPONSE = "Сервис ИИ не ответил вовремя. Попробуй повторить запрос чуть позже! 🍊"
+
+
+def _client_error_message(error: Exception) -> str:
+    """Текст ответа пользователю при ошибке клиента ИИ (с записью в лог)."""
+    if isinstance(error, ai_client.AIClientNotConfigured):
+        logger.error("GOOGLE_API_KEY не настроен в settings.py.")
+        return "Ошибка: Ключ API для сервиса ИИ не настроен."
+    if isinstance(error, resilience.CircuitOpenError):
+        logger.info(f"Ответ без обращения к Gemini: {error}")
+        return DEGRADED_RESPONSE
+    if resilience.is_timeout(error):
+        logger.error(f"Gemini не ответил вовремя: {error}")
+        return TIMEOUT_RESPONSE
+    logger.error(f"Ошибка при взаимодействии с Gemini API: {error}")
+    return f"Произошла ошибка при обращении к сервису ИИ. Подробности: {str(error)}"
+
+
+def get_gemini_response(prompt: str, action: str = None) -> str:
     """
     Отправляет запрос к Google Gemini API и возвращает текстовый ответ.
+    Клиент общий для процесса (см. ai_client); дедлайн действия action,
+    повторы и circuit breaker - см. resilience. Одинаковые одновременные
+    запросы объединяются в один (см. singleflight). Ответ записывается в
+    журнал обращений (см. usage).
     """
-    api_key = settings.GOOGLE_API_KEY
-    if not api_key:
-        logger.error("GOOGLE_API_KEY не настроен в settings.py.")
-        return "Ошибка: Ключ API для сервиса ИИ не настроен."
+    call = usage.start(action, prompt)
+    response = singleflight.do(action, prompt, lambda: _generate(prompt, action, call))
+    usage.finish(call, response)
+    return response
 
+
+def _generate(prompt: str, action: str, call: usage.UsageCall) -> str:
+    call.upstream()
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
-        if response.parts:
-            return "".join(part.text for part in response.parts if hasattr(part, 'text'))
-        elif hasattr(response, 'text') and response.text:
-            return response.text
-        else:
-            if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-                return "".join(part.text for part in response.candidates[0].content.parts if hasattr(part, 'text'))
-            return "ИИ не смог сгенерировать ответ в ожидаемом формате."
+        client = ai_client.get_client()
+        return resilience.call(lambda timeout: client.generate(prompt, timeout=timeout), action)
+    except Exception as e:
+        call.failed(e)
+        return _client_error_message(e)
 
+
+async def aget_gemini_response(prompt: str, action: str = None) -> str:
+    """Асинхронный вариант get_gemini_response для async-представлений."""
+    call = usage.start(action, prompt)
+    response = await singleflight.ado(action, prompt, lambda: _agenerate(prompt, action, call))
+    await sync_to_async(usage.finish)(call, response)
+    return response
+
+
+async def _agenerate(prompt: str, action: str, call: usage.UsageCall) -> str:
+    call.upstream()
+    try:
+        client = ai_client.get_client()
+        return await resilience.acall(lambda timeout: client.agenerate(prompt, timeout=timeout), action)
     except Exception as e:
-        logger.error(f"Ошибка при взаимодействии с Gemini API: {e}")
-        return f"Произошла ошибка при обращении к сервису ИИ. Подробности: {str(e)}"
+        call.failed(e)
+        return _client_error_message(e)
 
 
-def get_faq_answer(question: str, user_info: dict) -> str:
-    """Отвечает на часто задаваемые вопросы о сайте."""
-    prompt = f"""Пользователь {user_info.get('username', 'аноним')} задает вопрос о сайте Chatty Orange: '{question}'. 
+def stream_gemini_response(prompt: str, action: str = None, on_complete=None):
+    """
+    Ответ Gemini по частям по мере генерации. Ошибка превращается в
+    последнюю часть с ее описанием. on_complete(полный ответ) вызывается,
+    только если генерация завершилась без ошибки. Запрос, присоединившийся
+    к такому же одновременному, получает готовый ответ одной частью.
+    """
+    call = usage.start(action, prompt)
+    return usage.track_stream(
+        call, singleflight.stream(action, prompt, lambda: _stream(prompt, action, call, on_complete))
+    )
+
+
+def _stream(prompt: str, action: str, call: usage.UsageCall, on_complete=None):
+    call.upstream()
+    parts = []
+    try:
+        client = ai_client.get_client()
+        for part in resilience.stream(lambda timeout: client.stream(prompt, timeout=timeout), action):
+            parts.append(part)
+            yield part
+    except Exception as e:
+        call.failed(e)
+        yield _client_error_message(e)
+        return
+    if not parts:
+        yield ai_client.EMPTY_RESPONSE
+    elif on_complete is not None:
+        on_complete("".join(parts))
+
+
+def astream_gemini_response(prompt: str, action: str = None, on_complete=None):
+    """Асинхронный вариант stream_gemini_response."""
+    call = usage.start(action, prompt)
+    return usage.atrack_stream(
+        call, singleflight.astream(action, prompt, lambda: _astream(prompt, action, call, on_complete))
+    )
+
+
+async def _astream(prompt: str, action: str, call: usage.UsageCall, on_complete=None):
+    call.upstream()
+    parts = []
+    try:
+        client = ai_client.get_client()
+        async for part in resilience.astream(lambda timeout: client.astream(prompt, timeout=timeout), action):
+            parts.append(part)
+            yield part
+    except Exception as e:
+        call.failed(e)
+        yield _client_error_message(e)
+        return
+    if not parts:
+        yield ai_client.EMPTY_RESPONSE
+    elif on_complete is not None:
+        await on_complete("".join(parts))
+
+
+# Начала ответов get_gemini_response, означающие ошибку: такие ответы не кэшируются
+GEMINI_ERROR_PREFIXES = (
+    "Ошибка:",
+    "Произошла ошибка при обращении к сервису ИИ",
+    "ИИ не смог сгенерировать ответ",
+    DEGRADED_RESPONSE,
+    TIMEOUT_RESPONSE,
+)
+
+
+def get_shared_gemini_response(action: str, prompt: str) -> str:
+    """
+    Ответ Gemini на промпт без персональных данных: один на всех
+    пользователей, поэтому берется из кэша ответов (response_cache).
+    """
+    call = usage.start(action, prompt)
+    return response_cache.get_or_generate(
+        action, prompt, lambda prompt: get_gemini_response(prompt, action),
+        cache_if=lambda response: not response.startswith(GEMINI_ERROR_PREFIXES),
+        on_hit=lambda response: usage.finish_cached(call, response)
+    )
+
+
+def stream_shared_gemini_response(action: str, prompt: str):
+    """Потоковый вариант get_shared_gemini_response: из кэша - одной частью."""
+    call = usage.start(action, prompt)
+    cached = response_cache.lookup(action, prompt)
+    if cached is not None:
+        usage.finish_cached(call, cached)
+        yield cached
+        return
+    yield from stream_gemini_response(
+        prompt, action, on_complete=lambda response: response_cache.store(action, prompt, response)
+    )
+
+
+async def aget_shared_gemini_response(action: str, prompt: str) -> str:
+    """Асинхронный вариант get_shared_gemini_response (Redis - в потоке)."""
+    call = usage.start(action, prompt)
+    cached = await sync_to_async(response_cache.lookup)(action, prompt)
+    if cached is not None:
+        await sync_to_async(usage.finish_cached)(call, cached)
+        return cached
+    response = await aget_gemini_response(prompt, action)
+    if not response.startswith(GEMINI_ERROR_PREFIXES):
+        await sync_to_async(response_cache.store)(action, prompt, response)
+    return response
+
+
+async def astream_shared_gemini_response(action: str, prompt: str):
+    """Асинхронный вариант stream_shared_gemini_response."""
+    call = usage.start(action, prompt)
+    cached = await sync_to_async(response_cache.lookup)(action, prompt)
+    if cached is not None:
+        await sync_to_async(usage.finish_cached)(call, cached)
+        yield cached
+        return
+
+    async def store(response):
+        await sync_to_async(response_cache.store)(action, prompt, response)
+
+    async for part in astream_gemini_response(prompt, action, on_complete=store):
+        yield part
+
+
+def _respond(prompt: str, action: str, stream: bool = False, shared: bool = False):
+    """
+    Ответ на промпт действия action: строкой или, при stream=True,
+    итератором частей. shared - ответы действия общие для всех и кэшируются.
+    """
+    if shared:
+        if stream:
+            return stream_shared_gemini_response(action, prompt)
+        return get_shared_gemini_response(action, prompt)
+    if stream:
+        return stream_gemini_response(prompt, action)
+    return get_gemini_response(prompt, action)
+
+
+async def _arespond(prompt: str, action: str, stream: bool = False, shared: bool = False):
+    """Асинхронный вариант _respond: строка или асинхронный итератор частей."""
+    if shared:
+        if stream:
+            return astream_shared_gemini_response(action, prompt)
+        return await aget_shared_gemini_response(action, prompt)
+    if stream:
+        return astream_gemini_response(prompt, action)
+    return await aget_gemini_response(prompt, action)
+
+
+def faq_prompt(question: str) -> str:
+    """Промпт ответа на вопрос о сайте."""
+    # Имени пользователя в промпте нет: ответ общий и кэшируется
+    question = ' '.join(question.split())
+    return f"""Пользователь задает вопрос о сайте Chatty Orange: '{question}'. 
 
     Chatty Orange - это социальная сеть со следующими функциями:
     - Создание постов с изображениями и тегами
@@ -75,13 +266,23 @@ def get_faq_answer(question: str, user_info: dict) -> str:
     - Настройка профиля с аватаром
 
     Ответь на вопрос подробно и дружелюбно. Если вопрос не по теме сайта, вежливо укажи на это."""
-    return get_gemini_response(prompt)
 
 
-def get_feature_explanation(feature_query: str, user_info: dict) -> str:
-    """Объясняет, как работают функции сайта, или общие возможности ассистента."""
+def get_faq_answer(question: str, user_info: dict, stream: bool = False):
+    """Отвечает на часто задаваемые вопросы о сайте."""
+    return _respond(faq_prompt(question), 'faq', stream, shared=True)
+
+
+async def aget_faq_answer(question: str, user_info: dict, stream: bool = False):
+    """Асинхронный вариант get_faq_answer."""
+    return await _arespond(faq_prompt(question), 'faq', stream, shared=True)
+
 
-    user_name = user_info.get('username', 'аноним')
+def feature_explanation_prompt(feature_query: str) -> str:
+    """Промпт объяснения функции сайта или общих возможностей ассистента."""
+
+    # Имени пользователя в промпте нет: ответ общий и кэшируется
+    feature_query = ' '.join(feature_query.split())
     normalized_query = feature_query.lower()
 
     general_capability_keywords = [
@@ -92,7 +293,7 @@ def get_feature_explanation(feature_query: str, user_info: dict) -> str:
     is_general_query = any(keyword in normalized_query for keyword in general_capability_keywords)
 
     if is_general_query:
-        prompt = f"""Пользователь {user_name} спрашивает о твоих общих возможностях или просит помощи.
+        prompt = f"""Пользователь спрашивает о твоих общих возможностях или просит помощи.
 Расскажи о себе и основных функциях сайта Chatty Orange, которые ты поддерживаешь.
 Chatty Orange - это социальная сеть, где пользователи могут создавать посты, комментировать, подписываться на других и т.д.
 
@@ -115,7 +316,7 @@ Chatty Orange - это социальная сеть, где пользоват
 Представь эту информацию дружелюбно и структурированно. Поощряй пользователя задавать вопросы.
 """
     else:
-        prompt = f"""Пользователь {user_name} спрашивает о функции '{feature_query}' на сайте Chatty Orange. 
+        prompt = f"""Пользователь спрашивает о функции '{feature_query}' на сайте Chatty Orange. 
 
         Подробно объясни:
         1. Что это за функция.
@@ -127,7 +328,17 @@ Chatty Orange - это социальная сеть, где пользоват
         Если это похоже на запрос одной из твоих специальных возможностей (например, поиск постов, анализ текста), выполни его.
         Если это совершенно неизвестный запрос, вежливо сообщи, что ты не можешь помочь с этой конкретной темой, но готов помочь с другими вопросами о Chatty Orange."""
 
-    return get_gemini_response(prompt)
+    return prompt
+
+
+def get_feature_explanation(feature_query: str, user_info: dict, stream: bool = False):
+    """Объясняет, как работают функции сайта, или общие возможности ассистента."""
+    return _respond(feature_explanation_prompt(feature_query), 'feature_explanation', stream, shared=True)
+
+
+async def aget_feature_explanation(feature_query: str, user_info: dict, stream: bool = False):
+    """Асинхронный вариант get_feature_explanation."""
+    return await _arespond(feature_explanation_prompt(feature_query), 'feature_explanation', stream, shared=True)
 
 
 def get_interactive_tour_step(step_number: int, user_info: dict) -> str:
@@ -186,8 +397,8 @@ def get_interactive_tour_step(step_number: int, user_info: dict) -> str:
     return f"<h5>{step_data['title']}</h5><p>{content_html}</p>"
 
 
-def get_post_creation_suggestion(current_text: str, user_info: dict) -> str:
-    """Помогает с созданием поста."""
+def post_creation_prompt(current_text: str, user_info: dict) -> str:
+    """Промпт помощи с созданием поста."""
     if not current_text:
         prompt = f"""Пользователь {user_info.get('username', 'Аноним')} создает свой первый пост на Chatty Orange.
 
@@ -208,7 +419,17 @@ def get_post_creation_suggestion(current_text: str, user_info: dict) -> str:
 
         Будь дружелюбным и поддерживающим!"""
 
-    return get_gemini_response(prompt)
+    return prompt
+
+
+def get_post_creation_suggestion(current_text: str, user_info: dict, stream: bool = False):
+    """Помогает с созданием поста."""
+    return _respond(post_creation_prompt(current_text, user_info), 'post_creation_suggestion', stream)
+
+
+async def aget_post_creation_suggestion(current_text: str, user_info: dict, stream: bool = False):
+    """Асинхронный вариант get_post_creation_suggestion."""
+    return await _arespond(post_creation_prompt(current_text, user_info), 'post_creation_suggestion', stream)
 
 
 def find_post_by_keyword(keyword: str, user_info: dict) -> str:
@@ -222,41 +443,64 @@ def find_post_by_keyword(keyword: str, user_info: dict) -> str:
             logger.error("Модель Post не доступна")
             return "Ошибка: модель постов не доступна. Обратитесь к администратору."
 
-        # Выполняем поиск
-        posts = Post.objects.filter(Q(title__icontains=keyword) | Q(text__icontains=keyword))[:10]
+        posts = list(_keyword_search_queryset(keyword))
+        return _format_found_posts(keyword, posts)
 
-        logger.info(f"Найдено {posts.count()} постов по ключевому слову '{keyword}'")
+    except Exception as e:
+        logger.error(f"Ошибка при поиске постов по ключевому слову '{keyword}': {e}")
+        return f"Произошла ошибка при поиске постов: {str(e)} 🍊"
 
-        if not posts.exists():
-            logger.info(f"Посты с ключевым словом '{keyword}' не найдены.")
-            return f"К сожалению, посты с ключевым словом '{keyword}' не найдены. Попробуйте другой запрос."
 
-        posts_info = []
-        for post in posts:
-            author_username = post.author.username if post.author else "неизвестный автор"
-            try:
-                post_url = post.get_absolute_url() if hasattr(post, 'get_absolute_url') else f"/posts/{post.id}/"
-            except Exception as e:
-                logger.warning(f"Ошибка при получении URL поста {post.id}: {e}")
-                post_url = f"/posts/{post.id}/"
+async def afind_post_by_keyword(keyword: str, user_info: dict) -> str:
+    """Асинхронный вариант find_post_by_keyword (async ORM)."""
+    logger.info(f"Пользователь {user_info.get('username', 'аноним')} ищет посты с ключевым словом: '{keyword}'")
+    try:
+        posts = [post async for post in _keyword_search_queryset(keyword)]
+        return _format_found_posts(keyword, posts)
+
+    except Exception as e:
+        logger.error(f"Ошибка при поиске постов по ключевому слову '{keyword}': {e}")
+        return f"Произошла ошибка при поиске постов: {str(e)} 🍊"
+
 
-            # ИСПРАВЛЕНО: Возвращаем чистый текст БЕЗ HTML-тегов
-            # JavaScript formatMessage сам создаст ссылки
-            posts_info.append(
-                f"• **{post.title}** от @{author_username}\n  Ссылка: {post_url}")
+def _keyword_search_queryset(keyword: str):
+    # Выполняем поиск тем же бэкендом, что и лента постов
+    search_backend = get_search_backend()
+    return search_backend.order_by_relevance(
+        search_backend.filter(Post.objects.select_related('author'), keyword)
+    )[:10]
 
-        posts_details_str = "\n\n".join(posts_info)
 
-        return f"""🔍 **Найденные посты по запросу "{keyword}":**
+def _format_found_posts(keyword: str, posts: list) -> str:
+    """Ответ со списком найденных по ключевому слову постов."""
+    logger.info(f"Найдено {len(posts)} постов по ключевому слову '{keyword}'")
+
+    if not posts:
+        logger.info(f"Посты с ключевым словом '{keyword}' не найдены.")
+        return f"К сожалению, посты с ключевым словом '{keyword}' не найдены. Попробуйте другой запрос."
+
+    posts_info = []
+    for post in posts:
+        author_username = post.author.username if post.author else "неизвестный автор"
+        try:
+            post_url = post.get_absolute_url() if hasattr(post, 'get_absolute_url') else f"/posts/{post.id}/"
+        except Exception as e:
+            logger.warning(f"Ошибка при получении URL поста {post.id}: {e}")
+            post_url = f"/posts/{post.id}/"
+
+        # ИСПРАВЛЕНО: Возвращаем чистый текст БЕЗ HTML-тегов
+        # JavaScript formatMessage сам создаст ссылки
+        posts_info.append(
+            f"• **{post.title}** от @{author_username}\n  Ссылка: {post_url}")
+
+    posts_details_str = "\n\n".join(posts_info)
+
+    return f"""🔍 **Найденные посты по запросу "{keyword}":**
 
 {posts_details_str}
 
 💡 Нажми на ссылку, чтобы прочитать пост полностью!"""
 
-    except Exception as e:
-        logger.error(f"Ошибка при поиске постов по ключевому слову '{keyword}': {e}")
-        return f"Произошла ошибка при поиске постов: {str(e)} 🍊"
-
 
 def get_post_details(post_id: int, user_info: dict) -> str:
     """
@@ -271,11 +515,11 @@ def get_post_details(post_id: int, user_info: dict) -> str:
         if Comment is None:
             return "Ошибка: модель комментариев не доступна."
 
-        post = Post.objects.get(pk=post_id)
+        # Реакции и комментарии - из колонок-счетчиков поста, без подсчета по связям
+        post = Post.objects.select_related('author').get(pk=post_id)
         author_username = post.author.username if post.author else "неизвестный автор"
-        likes_count = post.likes.count() if hasattr(post, 'likes') else 0
 
-        comments = Comment.objects.filter(post=post).order_by('-created_at')[:5]
+        comments = Comment.objects.filter(post=post).select_related('author').order_by('-created_at')[:5]
         comments_info = []
         if comments:
             for comment in comments:
@@ -292,10 +536,10 @@ def get_post_details(post_id: int, user_info: dict) -> str:
         post_details = f"""
 📰 **{post.title}**
 ✍️ Автор: @{author_username}
-👍 Лайков: {likes_count}
+👍 Лайков: {post.likes_count} · 👎 Дизлайков: {post.dislikes_count} · 💬 Комментариев: {post.comments_count}
 
 📝 **Содержание:**
-{post.text[:500]}{'...' if len(post.text) > 500 else ''} 
+{post.text_plain[:500]}{'...' if len(post.text_plain) > 500 else ''} 
 
 💬 **Последние комментарии:**
 {comments_details_str}
@@ -313,6 +557,16 @@ def get_post_details(post_id: int, user_info: dict) -> str:
         return f"Произошла ошибка при загрузке деталей поста: {str(e)} 🍊"
 
 
+def format_username_suggestions(suggestions: list) -> str:
+    """
+    Строка «Возможно, вы имели в виду» для сообщения о ненайденном пользователе.
+    """
+    if not suggestions:
+        return ""
+    names = ", ".join(f"@{name}" for name in suggestions)
+    return f"\n\n🔎 Возможно, вы имели в виду: {names}"
+
+
 def find_user_by_username(username: str, user_info: dict) -> str:
     """
     Ищет пользователя по имени и представляет его профиль.
@@ -322,7 +576,13 @@ def find_user_by_username(username: str, user_info: dict) -> str:
         if CustomUser is None:
             return "Ошибка: модель пользователей не доступна."
 
-        found_user = CustomUser.objects.get(username__iexact=username)
+        found_user, suggestions = lookup_user(username)
+        if found_user is None:
+            logger.info(f"Пользователь с именем '{username}' не найден.")
+            return (
+                f"К сожалению, пользователь с именем '{username}' не найден. "
+                f"Проверьте правильность написания имени.{format_username_suggestions(suggestions)}"
+            )
 
         # Получаем статистику пользователя
         posts_count = Post.objects.filter(author=found_user).count() if Post else 0
@@ -363,9 +623,6 @@ def find_user_by_username(username: str, user_info: dict) -> str:
 
 💡 Хочешь подписаться на этого автора? Перейди в его профиль @{found_user.username}!"""
 
-    except CustomUser.DoesNotExist:
-        logger.info(f"Пользователь с именем '{username}' не найден.")
-        return f"К сожалению, пользователь с именем '{username}' не найден. Проверьте правильность написания имени."
     except Exception as e:
         logger.error(f"Ошибка при поиске пользователя '{username}': {e}")
         return f"Произошла ошибка при поиске пользователя: {str(e)} 🍊"
@@ -383,58 +640,31 @@ def get_user_activity(user_id: int, user_info: dict) -> str:
             return "Ошибка: модель пользователей не доступна."
 
         target_user = CustomUser.objects.get(pk=user_id)
-        target_username = target_user.username
-
-        # Последние 3 поста пользователя
-        posts_info_list = []
-        if Post:
-            latest_posts = Post.objects.filter(author=target_user).order_by('-pub_date')[:3]
-            if latest_posts:
-                for post in latest_posts:
-                    try:
-                        post_url = post.get_absolute_url() if hasattr(post,
-                                                                      'get_absolute_url') else f"/posts/{post.id}/"
-                    except Exception:
-                        post_url = f"/posts/{post.id}/"
-                    posts_info_list.append(f"📝 **{post.title}**\nСсылка: {post_url}")
-            else:
-                posts_info_list.append("📝 Недавних постов нет.")
-        else:
-            posts_info_list.append("📝 Информация о постах недоступна.")
-
-        posts_activity_str = "\n\n".join(posts_info_list)
-
-        # Последние 3 комментария пользователя
-        comments_info_list = []
-        if Comment:
-            latest_comments = Comment.objects.filter(author=target_user).order_by('-created_at')[:3]
-            if latest_comments:
-                for comment in latest_comments:
-                    try:
-                        comment_post_url = comment.post.get_absolute_url() if comment.post and hasattr(comment.post,
-                                                                                                       'get_absolute_url') else f"/posts/{comment.post.id}/" if comment.post else "URL поста недоступен"
-                    except Exception:
-                        comment_post_url = f"/posts/{comment.post.id}/" if comment.post else "URL поста недоступен"
-                    comments_info_list.append(
-                        f"💬 Прокомментировал: \"{comment.text[:60]}{'...' if len(comment.text) > 60 else ''}\"\nСсылка: {comment_post_url}")
-            else:
-                comments_info_list.append("💬 Недавних комментариев нет.")
-        else:
-            comments_info_list.append("💬 Информация о комментариях недоступна.")
+        latest_posts = list(_latest_posts(target_user)) if Post else None
+        latest_comments = list(_latest_comments(target_user)) if Comment else None
+        return _format_user_activity(user_id, target_user, latest_posts, latest_comments)
 
-        comments_activity_str = "\n\n".join(comments_info_list)
-
-        logger.info(f"Успешно получена активность для пользователя @{target_username} (ID: {user_id}).")
+    except CustomUser.DoesNotExist:
+        logger.warning(f"Запрошена активность для несуществующего пользователя с ID {user_id}.")
+        return f"К сожалению, пользователь не найден."
+    except Exception as e:
+        logger.error(f"Ошибка при получении активности пользователя ID {user_id}: {e}")
+        return f"Произошла ошибка при загрузке активности пользователя: {str(e)} 🍊"
 
-        return f"""📊 **Последняя активность @{target_username}:**
 
-**Недавние посты:**
-{posts_activity_str}
+async def aget_user_activity(user_id: int, user_info: dict) -> str:
+    """Асинхронный вариант get_user_activity (async ORM)."""
+    requesting_user_info = user_info.get('username', 'аноним')
+    logger.info(f"Пользователь {requesting_user_info} запрашивает активность пользователя с ID: {user_id}")
 
-**Недавние комментарии:**
-{comments_activity_str}
+    try:
+        if CustomUser is None:
+            return "Ошибка: модель пользователей не доступна."
 
-💡 Нажми на ссылки, чтобы посмотреть посты или комментарии!"""
+        target_user = await CustomUser.objects.aget(pk=user_id)
+        latest_posts = [post async for post in _latest_posts(target_user)] if Post else None
+        latest_comments = [comment async for comment in _latest_comments(target_user)] if Comment else None
+        return _format_user_activity(user_id, target_user, latest_posts, latest_comments)
 
     except CustomUser.DoesNotExist:
         logger.warning(f"Запрошена активность для несуществующего пользователя с ID {user_id}.")
@@ -444,6 +674,66 @@ def get_user_activity(user_id: int, user_info: dict) -> str:
         return f"Произошла ошибка при загрузке активности пользователя: {str(e)} 🍊"
 
 
+def _latest_posts(user):
+    # Последние 3 поста пользователя
+    return Post.objects.filter(author=user).order_by('-pub_date')[:3]
+
+
+def _latest_comments(user):
+    # Последние 3 комментария пользователя (пост - тем же запросом, для ссылки)
+    return Comment.objects.filter(author=user).select_related('post').order_by('-created_at')[:3]
+
+
+def _format_user_activity(user_id: int, target_user, latest_posts, latest_comments) -> str:
+    """Ответ с активностью пользователя; None вместо списка - модель недоступна."""
+    target_username = target_user.username
+
+    posts_info_list = []
+    if latest_posts is None:
+        posts_info_list.append("📝 Информация о постах недоступна.")
+    elif latest_posts:
+        for post in latest_posts:
+            try:
+                post_url = post.get_absolute_url() if hasattr(post,
+                                                              'get_absolute_url') else f"/posts/{post.id}/"
+            except Exception:
+                post_url = f"/posts/{post.id}/"
+            posts_info_list.append(f"📝 **{post.title}**\nСсылка: {post_url}")
+    else:
+        posts_info_list.append("📝 Недавних постов нет.")
+
+    posts_activity_str = "\n\n".join(posts_info_list)
+
+    comments_info_list = []
+    if latest_comments is None:
+        comments_info_list.append("💬 Информация о комментариях недоступна.")
+    elif latest_comments:
+        for comment in latest_comments:
+            try:
+                comment_post_url = comment.post.get_absolute_url() if comment.post and hasattr(comment.post,
+                                                                                               'get_absolute_url') else f"/posts/{comment.post.id}/" if comment.post else "URL поста недоступен"
+            except Exception:
+                comment_post_url = f"/posts/{comment.post.id}/" if comment.post else "URL поста недоступен"
+            comments_info_list.append(
+                f"💬 Прокомментировал: \"{comment.text[:60]}{'...' if len(comment.text) > 60 else ''}\"\nСсылка: {comment_post_url}")
+    else:
+        comments_info_list.append("💬 Недавних комментариев нет.")
+
+    comments_activity_str = "\n\n".join(comments_info_list)
+
+    logger.info(f"Успешно получена активность для пользователя @{target_username} (ID: {user_id}).")
+
+    return f"""📊 **Последняя активность @{target_username}:**
+
+**Недавние посты:**
+{posts_activity_str}
+
+**Недавние комментарии:**
+{comments_activity_str}
+
+💡 Нажми на ссылки, чтобы посмотреть посты или комментарии!"""
+
+
 def get_subscription_recommendations(user_info: dict, current_user_id: int = None) -> str:
     """Рекомендует интересных авторов для подписки с более дружелюбным форматом."""
     logger.info(f"Пользователь {user_info.get('username', 'аноним')} запрашивает рекомендации подписок")
@@ -458,27 +748,8 @@ def get_subscription_recommendations(user_info: dict, current_user_id: int = Non
             logger.error("Модель Post не доступна")
             return "Ошибка: модель постов не доступна."
 
-        # Получаем популярных авторов
-        recommended_users = CustomUser.objects.annotate(
-            num_posts=Count('post')
-        ).filter(
-            num_posts__gt=0
-        ).order_by('-num_posts')
-
-        # Исключаем текущего пользователя
-        if current_user_id:
-            recommended_users = recommended_users.exclude(id=current_user_id)
-
-            # Если модель подписок доступна, исключаем тех, на кого уже подписан
-            if Subscription:
-                try:
-                    user = CustomUser.objects.get(id=current_user_id)
-                    subscribed_ids = Subscription.objects.filter(subscriber=user).values_list('target_id', flat=True)
-                    recommended_users = recommended_users.exclude(id__in=subscribed_ids)
-                except Exception as e:
-                    logger.warning(f"Ошибка при исключении подписок: {e}")
-
-        recommended_users = recommended_users[:5]
+        # Кандидаты, число постов и последний пост - одним запросом
+        recommended_users = recommend_authors(current_user_id, limit=5)
 
         if not recommended_users:
             logger.info("Рекомендации не найдены")
@@ -486,19 +757,13 @@ def get_subscription_recommendations(user_info: dict, current_user_id: int = Non
 
         authors_info = []
         for user in recommended_users:
-            # Получаем последний пост для контекста
-            try:
-                last_post = Post.objects.filter(author=user).order_by('-pub_date').first()
-                post_preview = f"Последний пост: \"{last_post.title[:30]}...\"" if last_post else "Еще нет постов"
-            except Exception as e:
-                logger.warning(f"Ошибка при получении последнего поста для пользователя {user.username}: {e}")
-                post_preview = "Информация о постах недоступна"
+            post_preview = f"Последний пост: \"{user.latest_post_title[:30]}...\""
 
             bio_info = ""
             if hasattr(user, 'bio') and user.bio:
                 bio_info = f'📝 О себе: {user.bio[:80]}...'
 
-            authors_info.append(f"""🔸 **@{user.username}** ({user.num_posts} постов)
+            authors_info.append(f"""🔸 **@{user.username}** ({user.posts_count} постов)
 {bio_info}
 📰 {post_preview}""")
 
@@ -516,11 +781,12 @@ def get_subscription_recommendations(user_info: dict, current_user_id: int = Non
         return f"Не удалось загрузить рекомендации: {str(e)} 🍊"
 
 
-def check_post_content(post_text: str, user_info: dict) -> str:
-    """Проверяет текст поста на соответствие правилам."""
-    if not post_text.strip():
-        return "📝 Текст поста не может быть пустым!"
+EMPTY_POST_MESSAGE = "📝 Текст поста не может быть пустым!"
 
+
+def post_content_check_prompt(post_text: str) -> str:
+    """Промпт проверки текста поста на соответствие правилам."""
+    # Имени автора в промпте нет: одинаковые тексты проверяются одним запросом
     site_rules = """
     1. ❌ Запрещены оскорбления, угрозы и агрессия
     2. ❌ Запрещен контент 18+, насилие, шок-контент
@@ -531,7 +797,7 @@ def check_post_content(post_text: str, user_info: dict) -> str:
     7. ✅ Основной язык - русский
     """
 
-    prompt = f"""Проверь текст поста от {user_info.get('username', 'Аноним')}:
+    prompt = f"""Проверь текст поста:
     "{post_text}"
 
     Правила Chatty Orange:
@@ -546,7 +812,54 @@ def check_post_content(post_text: str, user_info: dict) -> str:
 
     Будь дружелюбным и конструктивным!"""
 
-    return get_gemini_response(prompt)
+    return prompt
+
+
+def check_post_content(post_text: str, user_info: dict, stream: bool = False):
+    """Проверяет текст поста на соответствие правилам."""
+    if not post_text.strip():
+        return EMPTY_POST_MESSAGE
+    return _respond(post_content_check_prompt(post_text), 'check_post_content', stream)
+
+
+async def acheck_post_content(post_text: str, user_info: dict, stream: bool = False):
+    """Асинхронный вариант check_post_content."""
+    if not post_text.strip():
+        return EMPTY_POST_MESSAGE
+    return await _arespond(post_content_check_prompt(post_text), 'check_post_content', stream)
+
+
+def profile_analysis_prompt(user_id: int) -> str:
+    """
+    Промпт анализа профиля по статистике пользователя (запросы к БД, без ИИ).
+    Для несуществующего пользователя - CustomUser.DoesNotExist.
+    """
+    # Все счетчики - одним запросом (с кэшем), см. users.profile_stats
+    profile = get_profile_stats(user_id)
+    stats = {counter: profile[counter] for counter in PROFILE_COUNTERS}
+    stats['days_on_site'] = (datetime.now().date() - profile['date_joined'].date()).days
+
+    logger.info(f"Статистика для @{profile['username']}: {stats}")
+
+    prompt = f"""Проанализируй статистику пользователя @{profile['username']} на Chatty Orange:
+
+    📊 Статистика:
+    - Дней на сайте: {stats['days_on_site']}
+    - Постов: {stats['posts_count']}
+    - Комментариев: {stats['comments_count']}
+    - Получено лайков: {stats['likes_received']}
+    - Подписчиков: {stats['subscribers_count']}
+    - Подписок: {stats['subscriptions_count']}
+
+    Дай персонализированные советы:
+    1. Оцени активность (низкая/средняя/высокая)
+    2. Что делает хорошо
+    3. Что можно улучшить
+    4. 3 конкретных совета для роста
+
+    Используй эмодзи и будь позитивным!"""
+
+    return prompt
 
 
 def analyze_profile_stats(user_id: int) -> str:
@@ -557,70 +870,26 @@ def analyze_profile_stats(user_id: int) -> str:
         if CustomUser is None:
             return "Ошибка: модель пользователей не доступна."
 
-        user = CustomUser.objects.get(id=user_id)
-
-        # Собираем статистику
-        posts_count = Post.objects.filter(author=user).count() if Post else 0
-        comments_count = Comment.objects.filter(author=user).count() if Comment else 0
-
-        # Подсчет лайков
-        likes_received = 0
-        if Post:
-            try:
-                user_posts = Post.objects.filter(author=user)
-                for post in user_posts:
-                    if hasattr(post, 'likes'):
-                        likes_received += post.likes.count()
-            except Exception as e:
-                logger.warning(f"Ошибка при подсчете лайков: {e}")
-
-        # Подписки
-        subscribers_count = 0
-        subscriptions_count = 0
-        if Subscription:
-            try:
-                subscribers_count = Subscription.objects.filter(target=user).count()
-                subscriptions_count = Subscription.objects.filter(subscriber=user).count()
-            except Exception as e:
-                logger.warning(f"Ошибка при подсчете подписок: {e}")
-
-        # Дни на сайте
-        days_on_site = 0
-        if hasattr(user, 'date_joined'):
-            days_on_site = (datetime.now().date() - user.date_joined.date()).days
-        elif hasattr(user, 'created_at'):
-            days_on_site = (datetime.now().date() - user.created_at.date()).days
-
-        stats = {
-            'posts_count': posts_count,
-            'comments_count': comments_count,
-            'likes_received': likes_received,
-            'subscribers_count': subscribers_count,
-            'subscriptions_count': subscriptions_count,
-            'days_on_site': days_on_site
-        }
-
-        logger.info(f"Статистика для @{user.username}: {stats}")
+        return get_gemini_response(profile_analysis_prompt(user_id), 'analyze_profile')
 
-        prompt = f"""Проанализируй статистику пользователя @{user.username} на Chatty Orange:
+    except CustomUser.DoesNotExist:
+        logger.warning(f"Пользователь с ID {user_id} не найден для анализа профиля")
+        return "Пользователь не найден."
+    except Exception as e:
+        logger.error(f"Ошибка анализа профиля: {e}")
+        return f"Не удалось проанализировать профиль: {str(e)} 🍊"
 
-        📊 Статистика:
-        - Дней на сайте: {stats['days_on_site']}
-        - Постов: {stats['posts_count']}
-        - Комментариев: {stats['comments_count']}
-        - Получено лайков: {stats['likes_received']}
-        - Подписчиков: {stats['subscribers_count']}
-        - Подписок: {stats['subscriptions_count']}
 
-        Дай персонализированные советы:
-        1. Оцени активность (низкая/средняя/высокая)
-        2. Что делает хорошо
-        3. Что можно улучшить
-        4. 3 конкретных совета для роста
+async def aanalyze_profile_stats(user_id: int) -> str:
+    """Асинхронный вариант analyze_profile_stats: статистика - в потоке, Gemini - асинхронно."""
+    logger.info(f"Анализ профиля для пользователя ID: {user_id}")
 
-        Используй эмодзи и будь позитивным!"""
+    try:
+        if CustomUser is None:
+            return "Ошибка: модель пользователей не доступна."
 
-        return get_gemini_response(prompt)
+        prompt = await sync_to_async(profile_analysis_prompt)(user_id)
+        return await aget_gemini_response(prompt, 'analyze_profile')
 
     except CustomUser.DoesNotExist:
         logger.warning(f"Пользователь с ID {user_id} не найден для анализа профиля")
@@ -630,8 +899,8 @@ def analyze_profile_stats(user_id: int) -> str:
         return f"Не удалось проанализировать профиль: {str(e)} 🍊"
 
 
-def generate_post_ideas(user_info: dict, tags: list = None) -> str:
-    """Генерирует идеи для постов на основе трендов и интересов."""
+def post_ideas_prompt(tags: list = None) -> str:
+    """Промпт генерации идей для постов."""
     # Здесь можно анализировать популярные теги и темы
     available_tags = ['Путешествия', 'Еда', 'Технологии', 'Творчество', 'Спорт', 'Книги', 'Музыка', 'Фото']
 
@@ -640,7 +909,8 @@ def generate_post_ideas(user_info: dict, tags: list = None) -> str:
     else:
         focus_tags = 'разные темы'
 
-    prompt = f"""Сгенерируй 5 креативных идей для постов в Chatty Orange для пользователя {user_info.get('username', 'Аноним')}.
+    # Имени пользователя в промпте нет: идеи по одним и тем же тегам общие и кэшируются
+    return f"""Сгенерируй 5 креативных идей для постов в Chatty Orange.
 
     Тематика: {focus_tags}
     Доступные теги: {', '.join(available_tags)}
@@ -656,12 +926,20 @@ def generate_post_ideas(user_info: dict, tags: list = None) -> str:
     - Легкими в реализации
     - Подходящими для социальной сети"""
 
-    return get_gemini_response(prompt)
+
+def generate_post_ideas(user_info: dict, tags: list = None, stream: bool = False):
+    """Генерирует идеи для постов на основе трендов и интересов."""
+    return _respond(post_ideas_prompt(tags), 'generate_post_ideas', stream, shared=True)
 
 
-def analyze_sentiment(text: str) -> str:
-    """Анализирует эмоциональный тон текста."""
-    prompt = f"""Проанализируй эмоциональный тон этого текста:
+async def agenerate_post_ideas(user_info: dict, tags: list = None, stream: bool = False):
+    """Асинхронный вариант generate_post_ideas."""
+    return await _arespond(post_ideas_prompt(tags), 'generate_post_ideas', stream, shared=True)
+
+
+def sentiment_prompt(text: str) -> str:
+    """Промпт анализа эмоционального тона текста."""
+    return f"""Проанализируй эмоциональный тон этого текста:
     "{text}"
 
     Определи:
@@ -674,4 +952,12 @@ def analyze_sentiment(text: str) -> str:
     Эмоции: [список]
     Энергия: [уровень]"""
 
-    return get_gemini_response(prompt)
\ No newline at end of file
+
+def analyze_sentiment(text: str, stream: bool = False):
+    """Анализирует эмоциональный тон текста."""
+    return _respond(sentiment_prompt(text), 'analyze_sentiment', stream)
+
+
+async def aanalyze_sentiment(text: str, stream: bool = False):
+    """Асинхронный вариант analyze_sentiment."""
+    return await _arespond(sentiment_prompt(text), 'analyze_sentiment', stream)
\ No newline at end of file
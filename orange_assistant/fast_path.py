@@ -0,0 +1,101 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# orange_assistant/fast_path.py
+"""
+Локальные ответы помощника без обращения к ИИ и доля таких ответов.
+
+Запрос на естественном языке проходит уровни по очереди:
+
+1. намерения с ответом из данных сайта (поиск постов и пользователей,
+   детали поста, активность, рекомендации) - готовые шаблоны из БД;
+2. короткие реплики (приветствие, благодарность, прощание, "что ты
+   умеешь") - ответы-шаблоны из этого модуля;
+3. всё остальное - генерация Gemini.
+
+Для каждого намерения считается, сколько запросов обслужено локально
+(local) и сколько ушло в ИИ (llm); счетчики - в хэше Redis, см. get_stats
+и команду ai_response_cache.
+"""
+import logging
+
+from django.core.cache import caches
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from . import intents
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'default'
+STATS_KEY = 'assistant_answers'
+LOCAL = 'local'
+LLM = 'llm'
+
+COMMANDS_HELP = """• 'Найди пользователя [имя]' - поиск людей
+• 'Найди посты про [тема]' или 'Найди пост (тема)' - поиск постов
+• 'Расскажи о посте [ID]' - детали поста
+• 'Какие статьи у [имя]?' - посты автора
+• 'Что нового у [имя]?' - активность пользователя
+• 'Кого почитать?' - рекомендации авторов"""
+
+SMALL_TALK_ANSWERS = {
+    intents.GREETING: "Привет, {username}! 👋 Я твой Апельсиновый Помощник! Чем могу помочь?\n\n" + COMMANDS_HELP,
+    intents.THANKS: "Пожалуйста, {username}! 🍊 Обращайся, если что-то понадобится.",
+    intents.GOODBYE: "До встречи, {username}! 🍊 Заглядывай ещё.",
+    intents.CAPABILITIES: (
+        "Я ищу посты и людей, рассказываю о постах и активности авторов, советую, кого почитать, "
+        "и отвечаю на вопросы о Chatty Orange 🍊\n\nПопробуй:\n" + COMMANDS_HELP
+    ),
+}
+
+
+def small_talk_answer(intent_name, user_info):
+    """Ответ-шаблон на короткую реплику (intents.SMALL_TALK)."""
+    username = user_info.get('username') or 'друг'
+    return SMALL_TALK_ANSWERS[intent_name].format(username=username)
+
+
+def _key():
+    return caches[CACHE_ALIAS].make_key(STATS_KEY)
+
+
+def record(intent_name, tier):
+    """Учитывает ответ на намерение: tier - LOCAL или LLM. Ошибки Redis не мешают ответу."""
+    try:
+        get_redis_connection(CACHE_ALIAS).hincrby(_key(), f'{intent_name}:{tier}', 1)
+    except RedisError as e:
+        logger.warning(f"Не удалось учесть ответ помощника: {e}")
+
+
+def get_stats():
+    """{'intents': {намерение: {'local': n, 'llm': n}}, 'local': n, 'total': n, 'local_share': доля}."""
+    counters = {}
+    for field, value in get_redis_connection(CACHE_ALIAS).hgetall(_key()).items():
+        intent_name, tier = field.decode().rsplit(':', 1)
+        counters.setdefault(intent_name, {LOCAL: 0, LLM: 0})[tier] = int(value)
+    local = sum(tiers[LOCAL] for tiers in counters.values())
+    total = local + sum(tiers[LLM] for tiers in counters.values())
+    return {
+        'intents': counters,
+        'local': local,
+        'total': total,
+        'local_share': local / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    get_redis_connection(CACHE_ALIAS).delete(_key())
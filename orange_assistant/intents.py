@@ -0,0 +1,414 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# orange_assistant/intents.py
+"""
+Распознавание намерений в запросах к помощнику на естественном языке.
+
+Все выражения компилируются при импорте модуля:
+
+- фразы-индикаторы всех намерений собраны в одно выражение в виде
+  префиксного дерева; проход по тексту находит все вхождения, в том числе
+  вложенные и перекрывающиеся ('покажи пост' - и поиск постов, и детали
+  поста);
+- шаблоны извлечения параметра (имя пользователя, ключевое слово)
+  объединены в одно выражение на параметр. Приоритет шаблонов сохраняется:
+  берется первый по списку сработавший шаблон, как при последовательных
+  re.search.
+
+classify(text) возвращает намерение, его параметры и темы подсказок для
+общего чата. Замер скорости: manage.py benchmark_intent_router.
+"""
+import re
+from collections import namedtuple
+
+Intent = namedtuple('Intent', 'name slots hints')
+
+# Намерения в порядке приоритета
+USER_POSTS = 'user_posts'
+POST_SEARCH = 'post_search'
+POST_DETAILS = 'post_details'
+USER_SEARCH = 'user_search'
+USER_ACTIVITY = 'user_activity'
+RECOMMENDATIONS = 'recommendations'
+GREETING = 'greeting'
+THANKS = 'thanks'
+GOODBYE = 'goodbye'
+CAPABILITIES = 'capabilities'
+GENERAL_CHAT = 'general_chat'
+
+# Реплики, на которые помощник отвечает шаблоном (см. fast_path)
+SMALL_TALK = (GREETING, THANKS, GOODBYE, CAPABILITIES)
+
+# Темы подсказок общего чата
+HINT_USERS = 'hint_users'
+HINT_POSTS = 'hint_posts'
+HINT_RECOMMENDATIONS = 'hint_recommendations'
+
+# Фразы-индикаторы (подстроки текста в нижнем регистре)
+INDICATORS = {
+    USER_POSTS: [
+        'статьи у', 'посты у', 'какие статьи у', 'какие посты у',
+        'статьи пользователя', 'посты пользователя',
+        'статьи от', 'посты от',
+        'что писал', 'что писала',
+        'статьи у пользователя', 'посты у пользователя',
+    ],
+    POST_SEARCH: [
+        'найди пост', 'найти пост', 'ищи пост', 'искать пост',
+        'найди стать', 'найти стать', 'покажи пост',
+        'найди посты про', 'найти посты про', 'ищи посты про',
+    ],
+    POST_DETAILS: [
+        'расскажи о посте', 'пост номер', 'пост id', 'детали поста',
+        'покажи пост', 'что в посте', 'открой пост',
+    ],
+    USER_SEARCH: [
+        'найди пользователя', 'найти пользователя', 'ищи пользователя',
+        'найди юзера', 'профиль', 'кто такой',
+    ],
+    USER_ACTIVITY: [
+        'что нового у', 'активность пользователя', 'что делает',
+        'последние посты', 'недавняя активность',
+    ],
+    RECOMMENDATIONS: [
+        'кого почитать', 'рекомендации', 'посоветуй авторов',
+        'интересные авторы', 'на кого подписаться',
+    ],
+    HINT_USERS: ['пользователь', 'юзер'],
+    HINT_POSTS: ['пост', 'стать'],
+    HINT_RECOMMENDATIONS: ['рекоменд', 'совет'],
+}
+
+# "Какие статьи Orange" - запрос постов пользователя без предлога
+USER_POSTS_WITHOUT_PREPOSITION = r'какие\s+(?:статьи|посты)\s+[A-Za-z0-9_А-Яа-я-]+'
+
+# Шаблоны параметров: в каждом ровно одна группа, порядок - приоритет
+POSTS_AUTHOR_PATTERNS = [
+    r'(?:статьи|посты)\s+у\s+([A-Za-z0-9_А-Яа-я-]+)',
+    r'(?:статьи|посты)\s+пользователя\s+([A-Za-z0-9_А-Яа-я-]+)',
+    r'что\s+(?:писал|писала)\s+([A-Za-z0-9_А-Яа-я-]+)',
+    r'какие\s+(?:статьи|посты)\s+у\s+([A-Za-z0-9_А-Яа-я-]+)',
+    r'(?:статьи|посты)\s+от\s+([A-Za-z0-9_А-Яа-я-]+)',
+    r'(?:статьи|посты)\s+у\s+пользователя\s+([A-Za-z0-9_А-Яа-я-]+)',
+    r'какие\s+(?:статьи|посты)\s+([A-Za-z0-9_А-Яа-я-]+)(?:\s|$|\?)',
+]
+
+USERNAME_PATTERNS = [
+    r'найди?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
+    r'найти?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
+    r'ищи?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
+    r'искать?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
+    r'пользователь\s+([a-zA-Z0-9_-]{2,})',
+    r'профиль\s+([a-zA-Z0-9_-]{2,})',
+    r'@([a-zA-Z0-9_-]{2,})',
+    r'в\s+профиле\s+([a-zA-Z0-9_-]{2,})',
+    r'кто\s+такой\s+([a-zA-Z0-9_-]{2,})',
+    r'кто\s+такая\s+([a-zA-Z0-9_-]{2,})',
+    r'найди\s+([a-zA-Z0-9_-]{2,})',
+]
+
+# Запрос постов пользователя - ключевое слово для поиска постов не ищется
+KEYWORD_EXCLUSION = (
+    r'(статьи\s+у\s+\w+|посты\s+у\s+\w+|какие\s+(?:статьи|посты)\s+у\s+\w+'
+    r'|(?:статьи|посты)\s+пользователя\s+\w+|(?:статьи|посты)\s+от\s+\w+|что\s+писал\w*\s+\w+)'
+)
+
+KEYWORD_PATTERNS = [
+    # В скобках: (Django) или [Python]
+    r'[(\[](.*?)[)\]]',
+    # С предлогами - всё до конца строки без знаков препинания
+    r'(?:посты?|статьи|пост)\s+про\s+(.+?)(?:[!?.,:;]*$)',
+    r'(?:посты?|статьи|пост)\s+о\s+(.+?)(?:[!?.,:;]*$)',
+    r'(?:посты?|статьи|пост)\s+об\s+(.+?)(?:[!?.,:;]*$)',
+    r'найди?\s+(?:статьи|посты?)\s+по\s+теме\s+(.+?)(?:[!?.,:;]*$)',
+    r'покажи?\s+(?:статьи|посты?)\s+на\s+тему\s+(.+?)(?:[!?.,:;]*$)',
+    # Действия с постами - всё после ключевого слова
+    r'найди?\s+(?:пост|статьи|посты?)\s+(.+?)(?:[!?.,:;]*$)',
+    r'покажи?\s+(?:пост|статьи|посты?)\s+(.+?)(?:[!?.,:;]*$)',
+    r'ищи?\s+(?:пост|статьи|посты?)\s+(.+?)(?:[!?.,:;]*$)',
+    # "пост + ключевое слово"
+    r'пост\s+(.+?)(?:[!?.,:;]*$)',
+    r'статьи?\s+(.+?)(?:[!?.,:;]*$)',
+]
+
+# Короткие сообщения, которые целиком - одна форма (знаки препинания и
+# эмодзи отброшены): "Привет!", "Спасибо 🍊", "найди пост 5", "@orange"
+SHORT_FORMS = {
+    GREETING: (
+        r'(?:привет\w*|здравствуй(?:те)?|добрый\s+(?:день|вечер)|доброе\s+утро|хай|салют|hi|hello)'
+        r'(?:\s+(?:помощник|бот|апельсин\w*))?'
+    ),
+    THANKS: r'(?:спасибо|благодарю|спс|thanks|thank\s+you)(?:\s+(?:большое|огромное|тебе))*',
+    GOODBYE: r'(?:пока|до\s+свидания|до\s+встречи|bye)',
+    CAPABILITIES: (
+        r'(?:что\s+ты\s+(?:умеешь|можешь)|что\s+умеешь|помощь|помоги|help|команды'
+        r'|как\s+тобой\s+пользоваться)'
+    ),
+    POST_DETAILS: r'(?:(?:найди|покажи|открой)\s+)?(?:пост|стать[юя])\s*(?:№|#|номер)?\s*(?P<post_id>\d+)',
+    USER_SEARCH: r'@(?P<username>[a-z0-9_-]{2,})',
+}
+
+ACTIVITY_USERNAME_PATTERNS = [
+    r'что\s+нового\s+у\s+(\w+)',
+    r'активность\s+пользователя\s+(\w+)',
+    r'что\s+делает\s+(\w+)',
+]
+
+# Не имена пользователей и не ключевые слова
+USERNAME_STOP_WORDS = {'имя', 'логин', 'ник', 'название', 'нейм'}
+KEYWORD_STOP_WORDS = {'текст', 'слово', 'и', 'или', 'а', 'в'}
+# Служебные слова между "статьи/посты" и именем автора
+POSTS_AUTHOR_SKIP_WORDS = {'у', 'от', 'пользователя', 'про', 'о', 'об', 'по', 'с'}
+
+
+def _prefix_closure(indicators):
+    """
+    {фраза: намерения} с учетом вложенности: фразе достаются и намерения
+    всех фраз, которые являются ее началом ('найди посты про' - еще и
+    'найди пост'). Из совпадающих в одной позиции фраз выражение выбирает
+    самую длинную, остальные - ее начала.
+    """
+    phrase_intents = {}
+    for intent, phrases in indicators.items():
+        for phrase in phrases:
+            phrase_intents.setdefault(phrase, set()).add(intent)
+    return {
+        phrase: frozenset().union(*(
+            intents for prefix, intents in phrase_intents.items() if phrase.startswith(prefix)
+        ))
+        for phrase in phrase_intents
+    }
+
+
+def _trie_pattern(phrases):
+    """
+    Выражение для набора фраз в виде префиксного дерева (как автомат
+    Aho-Corasick): общие начала проверяются один раз, а из фраз,
+    совпадающих в одной позиции, выбирается самая длинная.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def pattern(node):
+        branches = [re.escape(char) + pattern(child) for char, child in node.items() if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f'(?:{body})?' if '' in node else body
+
+    return pattern(trie)
+
+
+class OrderedPatterns:
+    """
+    Шаблоны с одной группой в каждом; порядок списка - приоритет. Все
+    шаблоны объединены в одно выражение-альтернативу, поэтому самый
+    приоритетный из совпавших находится одним проходом по тексту.
+    """
+
+    def __init__(self, patterns, flags=0):
+        for pattern in patterns:
+            assert re.compile(pattern).groups == 1, pattern
+        self.patterns = [re.compile(pattern, flags) for pattern in patterns]
+        self.combined = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), flags)
+
+    def matches(self, text):
+        """
+        Группы первых (самых левых) совпадений шаблонов в порядке
+        приоритета - как у re.search по очереди; несовпавшие шаблоны
+        пропускаются. Шаблоны после лучшего проверяются по отдельности и
+        только если вызывающему понадобилось следующее значение.
+        """
+        best = value = None
+        position = 0
+        while True:
+            # В каждой позиции совпадает первая по списку подходящая альтернатива
+            match = self.combined.search(text, position)
+            if match is None:
+                break
+            if best is None or match.lastindex - 1 < best:
+                best, value = match.lastindex - 1, match.group(match.lastindex)
+                if best == 0:
+                    break
+            position = match.start() + 1
+        if best is None:
+            return
+        yield value
+        for pattern in self.patterns[best + 1:]:
+            match = pattern.search(text)
+            if match:
+                yield match.group(1)
+
+
+PHRASE_INTENTS = _prefix_closure(INDICATORS)
+INDICATOR_RE = re.compile(f'(?P<bare>{USER_POSTS_WITHOUT_PREPOSITION})|(?P<phrase>{_trie_pattern(PHRASE_INTENTS)})')
+# Имя автора сохраняет регистр; остальные параметры ищутся в тексте в нижнем регистре
+POSTS_AUTHOR = OrderedPatterns(POSTS_AUTHOR_PATTERNS, re.IGNORECASE)
+USERNAME = OrderedPatterns(USERNAME_PATTERNS)
+KEYWORD_EXCLUSION_RE = re.compile(KEYWORD_EXCLUSION)
+KEYWORD = OrderedPatterns(KEYWORD_PATTERNS)
+ACTIVITY_USERNAME = OrderedPatterns(ACTIVITY_USERNAME_PATTERNS)
+
+SHORT_FORM_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in SHORT_FORMS.items()))
+SHORT_FORM_NOISE_RE = re.compile(r'[^\w\s№#@-]+')
+
+BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+NUMBER_RE = re.compile(r'\d+')
+AUTHOR_WORD_RE = re.compile(r'^[A-Za-z0-9_А-Яа-я-]+$')
+TRAILING_PUNCTUATION_RE = re.compile(r'[!?.,:;]+$')
+TOPIC_PREFIX_RE = re.compile(r'^(теме|тему)\s+')
+PREPOSITION_NUMBER_RE = re.compile(r'^(про|о|об)\s+\d+$')
+
+
+def find_indicators(text):
+    """Намерения и темы подсказок, фразы которых встречаются в text (в нижнем регистре)."""
+    found = set()
+    position = 0
+    while True:
+        # Следующий поиск - со следующего символа: вхождения могут перекрываться
+        match = INDICATOR_RE.search(text, position)
+        if match is None:
+            return found
+        if match.group('bare') is not None:
+            found.add(USER_POSTS)
+        else:
+            found |= PHRASE_INTENTS[match.group('phrase')]
+        position = match.start() + 1
+
+
+def first_number(text):
+    match = NUMBER_RE.search(text)
+    return int(match.group()) if match else None
+
+
+def extract_username(text):
+    """Имя пользователя из запроса вида "найди пользователя alek" или "@alek"."""
+    if not text:
+        return None
+    for username in USERNAME.matches(text.lower().strip()):
+        username = username.lower()
+        if len(username) < 2 or username.isdigit() or username in USERNAME_STOP_WORDS:
+            continue
+        return username
+    return None
+
+
+def extract_keyword(text):
+    """
+    Ключевое слово для поиска постов. None - если его нет или это запрос
+    постов конкретного пользователя ("статьи у Orange").
+    """
+    if not text:
+        return None
+    text = text.lower().strip()
+    if KEYWORD_EXCLUSION_RE.search(text):
+        return None
+    for keyword in KEYWORD.matches(text):
+        keyword = TRAILING_PUNCTUATION_RE.sub('', keyword.strip()).strip()
+        keyword = TOPIC_PREFIX_RE.sub('', keyword).strip()
+        if len(keyword) < 2 or keyword.isdigit() or keyword in KEYWORD_STOP_WORDS:
+            continue
+        if PREPOSITION_NUMBER_RE.match(keyword):
+            continue
+        return keyword
+    return None
+
+
+def extract_posts_author(text):
+    """Автор из запроса его постов ("какие статьи у Orange"), регистр сохраняется."""
+    username = next(POSTS_AUTHOR.matches(text), None)
+    if username is not None:
+        return username
+
+    # Первое значимое слово после "статьи/посты"
+    words = text.split()
+    for i, word in enumerate(words):
+        if word.lower() not in ('статьи', 'посты'):
+            continue
+        for next_word in words[i + 1:]:
+            next_word = next_word.strip('?!.,')
+            if (next_word.lower() not in POSTS_AUTHOR_SKIP_WORDS and len(next_word) > 1
+                    and AUTHOR_WORD_RE.match(next_word)):
+                return next_word
+    return None
+
+
+def extract_activity_username(text):
+    """Имя из запроса активности ("что нового у orange"), text - в нижнем регистре."""
+    return next(ACTIVITY_USERNAME.matches(text), None)
+
+
+def match_short_form(text):
+    """Intent для сообщения, которое целиком - короткая форма (SHORT_FORMS), иначе None."""
+    match = SHORT_FORM_RE.fullmatch(' '.join(SHORT_FORM_NOISE_RE.sub(' ', text).split()))
+    if match is None:
+        return None
+    slots = {}
+    if match.lastgroup == POST_DETAILS:
+        slots = {'post_id': int(match.group('post_id'))}
+    elif match.lastgroup == USER_SEARCH:
+        slots = {'username': match.group('username')}
+    return Intent(match.lastgroup, slots, ())
+
+
+def classify(text):
+    """
+    Намерение запроса и его параметры за один проход по индикаторам:
+
+    - user_posts: username (автор или None);
+    - post_search: keyword (только если ключевое слово найдено, иначе
+      запрос проверяется дальше);
+    - post_details: post_id (или None);
+    - user_search: username (или None);
+    - user_activity: user_id и username (оба могут быть None);
+    - recommendations, SMALL_TALK, general_chat - без параметров; у
+      general_chat в hints темы подсказок (HINT_*).
+
+    Короткие формы (SHORT_FORMS) проверяются, только если индикаторы не
+    дали намерения.
+    """
+    # Markdown-выделение из готовых подсказок помощника не мешает разбору
+    clean = BOLD_RE.sub(r'\1', text)
+    lower = clean.lower().strip()
+    found = find_indicators(lower)
+
+    if USER_POSTS in found:
+        return Intent(USER_POSTS, {'username': extract_posts_author(clean)}, ())
+    if POST_SEARCH in found:
+        keyword = extract_keyword(text)
+        if keyword:
+            return Intent(POST_SEARCH, {'keyword': keyword}, ())
+    if POST_DETAILS in found:
+        return Intent(POST_DETAILS, {'post_id': first_number(text)}, ())
+    if USER_SEARCH in found:
+        return Intent(USER_SEARCH, {'username': extract_username(text)}, ())
+    if USER_ACTIVITY in found:
+        slots = {'user_id': first_number(text), 'username': extract_activity_username(lower)}
+        return Intent(USER_ACTIVITY, slots, ())
+    if RECOMMENDATIONS in found:
+        return Intent(RECOMMENDATIONS, {}, ())
+
+    short_form = match_short_form(lower)
+    if short_form is not None:
+        return short_form
+
+    hints = tuple(hint for hint in (HINT_USERS, HINT_POSTS, HINT_RECOMMENDATIONS) if hint in found)
+    return Intent(GENERAL_CHAT, {}, hints)
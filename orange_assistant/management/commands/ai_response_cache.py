@@ -0,0 +1,58 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.core.management.base import BaseCommand
+
+from orange_assistant import fast_path, response_cache, singleflight
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает метрики кэша ответов ИИ-помощника (записи, попадания и "
+        "промахи по действиям), объединения одинаковых одновременных "
+        "запросов и долю ответов без ИИ; с --clear очищает кэш и счетчики."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Очистить кэш ответов и статистику')
+
+    def handle(self, *args, **options):
+        stats = response_cache.get_stats()
+        self.stdout.write(f"Записей в кэше: {stats['entries']}")
+        for action, counters in sorted(stats['actions'].items()):
+            self.stdout.write(
+                f"{action}: попаданий {counters['hits']}, промахов {counters['misses']}, "
+                f"доля попаданий {counters['hit_rate']:.0%}"
+            )
+        for action, counters in sorted(singleflight.get_stats().items()):
+            self.stdout.write(
+                f"{action}: запросов к ИИ {counters['led']}, "
+                f"дождались одинакового одновременного {counters['joined']}"
+            )
+
+        answers = fast_path.get_stats()
+        self.stdout.write(
+            f"Ответов на запросы в чате без ИИ: {answers['local']} из {answers['total']} "
+            f"({answers['local_share']:.0%})"
+        )
+        for intent_name, tiers in sorted(answers['intents'].items()):
+            self.stdout.write(f"{intent_name}: локально {tiers['local']}, через ИИ {tiers['llm']}")
+
+        if options['clear']:
+            removed = response_cache.clear()
+            singleflight.reset_stats()
+            fast_path.reset_stats()
+            self.stdout.write(self.style.SUCCESS(f"Кэш очищен, удалено ответов: {removed}."))
@@ -0,0 +1,117 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import statistics
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from orange_assistant import intents
+
+# Запросы пользователей к помощнику (из журналов чата, имена заменены)
+QUERIES = [
+    "Какие статьи у Orange?",
+    "какие посты у alek_92",
+    "Посты пользователя Alek",
+    "Что писал Orange?",
+    "что писала marina_k в последнее время",
+    "Статьи от Orange",
+    "покажи статьи у пользователя igor",
+    "Какие статьи Orange",
+    "**Какие статьи у Orange?**",
+    "Найди посты про Django",
+    "найди пост (Python)",
+    "Найди пост [асинхронность]",
+    "найти посты про машинное обучение!",
+    "ищи пост про котиков",
+    "Найди статьи по теме docker compose",
+    "покажи посты на тему путешествия",
+    "найди статью про нейросети",
+    "Найди пост про 5",
+    "Расскажи о посте 5",
+    "покажи пост 123",
+    "что в посте 42?",
+    "открой пост номер 7",
+    "детали поста 15",
+    "пост id 99",
+    "Расскажи о посте",
+    "Найди пользователя alek",
+    "найти юзера orange_fan",
+    "ищи пользователя maxim-s",
+    "профиль viktor",
+    "Кто такой igor2024?",
+    "кто такая @marina",
+    "найди пользователя имя",
+    "Что нового у пользователя 1?",
+    "что нового у orange",
+    "Активность пользователя alek",
+    "что делает maxim",
+    "последние посты",
+    "недавняя активность",
+    "Кого почитать?",
+    "Посоветуй авторов про Python",
+    "на кого подписаться новичку?",
+    "дай рекомендации",
+    "интересные авторы есть?",
+    "Привет! Как дела?",
+    "Как написать хороший пост?",
+    "Где найти настройки профиля",
+    "Можешь дать совет по оформлению статьи?",
+    "Как найти пользователя, если не помню ник?",
+    "Что такое Chatty Orange?",
+    "Расскажи анекдот про апельсины",
+    "Как удалить комментарий?",
+    "Почему мой пост не опубликовался?",
+    "Помоги придумать заголовок для поста о путешествии в Грузию",
+    "Сколько лайков у моего последнего поста?",
+    "Хочу поменять аватарку, как это сделать?",
+    "Кто самый активный пользователь на сайте?",
+    "ну и где мои подписчики",
+    "Спасибо, ты лучший помощник! 🍊",
+    "Что ты умеешь?",
+    "Напиши стихотворение об осени в стиле Пушкина, пожалуйста, "
+    "чтобы было про листопад, дождь и горячий чай с апельсинами",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет распознавание намерений в запросах к помощнику "
+        "(orange_assistant.intents.classify) на корпусе реальных запросов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200, help='Сколько раз прогнать корпус')
+
+    def handle(self, *args, **options):
+        timings = []
+        for _ in range(options['rounds']):
+            for query in QUERIES:
+                started = time.perf_counter()
+                intents.classify(query)
+                timings.append((time.perf_counter() - started) * 1_000_000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"Распознавание намерения: медиана {statistics.median(timings):.1f} мкс, "
+            f"p95 {p95:.1f} мкс, максимум {timings[-1]:.1f} мкс ({len(timings)} запросов)"
+        )
+
+        distribution = Counter(intents.classify(query).name for query in QUERIES)
+        for name, count in distribution.most_common():
+            self.stdout.write(f"{name}: {count}")
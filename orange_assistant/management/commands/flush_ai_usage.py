@@ -0,0 +1,31 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.core.management.base import BaseCommand
+
+from orange_assistant import usage
+
+
+class Command(BaseCommand):
+    help = (
+        "Сохраняет в БД накопленные в Redis записи журнала обращений к ИИ "
+        "(AIUsageLog). Запускается по расписанию, чтобы остаток неполной "
+        "пачки не ждал следующих запросов."
+    )
+
+    def handle(self, *args, **options):
+        saved = usage.flush()
+        self.stdout.write(self.style.SUCCESS(f"Сохранено записей журнала обращений к ИИ: {saved}."))
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время ответа')),
+                ('action', models.CharField(max_length=50, verbose_name='Действие')),
+                ('latency_ms', models.PositiveIntegerField(verbose_name='Время ответа, мс')),
+                ('prompt_chars', models.PositiveIntegerField(verbose_name='Длина промпта')),
+                ('response_chars', models.PositiveIntegerField(verbose_name='Длина ответа')),
+                ('cache_hit', models.BooleanField(default=False, verbose_name='Из кэша')),
+                ('upstream_status', models.CharField(choices=[('ok', 'Ответ получен'), ('error', 'Ошибка'), ('timeout', 'Дедлайн истек'), ('circuit_open', 'Circuit breaker разомкнут'), ('joined', 'Ответ одинакового одновременного запроса'), ('skipped', 'Без обращения к ИИ')], max_length=20, verbose_name='Обращение к Gemini')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ai_usage_logs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Обращение к ИИ',
+                'verbose_name_plural': 'Журнал обращений к ИИ',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at', 'action'], name='orange_ai_usage_created')],
+            },
+        ),
+    ]
@@ -1,3 +1,69 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class AIUsageLog(models.Model):
+    """
+    Ответ помощника на промпт: обращение к Gemini, ответ из кэша или ответ
+    одинакового одновременного запроса. Пишется пачками (см. usage).
+    """
+    STATUS_OK = 'ok'
+    STATUS_ERROR = 'error'
+    STATUS_TIMEOUT = 'timeout'
+    STATUS_CIRCUIT_OPEN = 'circuit_open'
+    STATUS_JOINED = 'joined'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (STATUS_OK, "Ответ получен"),
+        (STATUS_ERROR, "Ошибка"),
+        (STATUS_TIMEOUT, "Дедлайн истек"),
+        (STATUS_CIRCUIT_OPEN, "Circuit breaker разомкнут"),
+        (STATUS_JOINED, "Ответ одинакового одновременного запроса"),
+        (STATUS_SKIPPED, "Без обращения к ИИ"),
+    ]
+
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Время ответа")
+    action = models.CharField(max_length=50, verbose_name="Действие")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ai_usage_logs',
+        verbose_name="Пользователь"
+    )
+    latency_ms = models.PositiveIntegerField(verbose_name="Время ответа, мс")
+    prompt_chars = models.PositiveIntegerField(verbose_name="Длина промпта")
+    response_chars = models.PositiveIntegerField(verbose_name="Длина ответа")
+    cache_hit = models.BooleanField(default=False, verbose_name="Из кэша")
+    upstream_status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, verbose_name="Обращение к Gemini"
+    )
+
+    class Meta:
+        verbose_name = "Обращение к ИИ"
+        verbose_name_plural = "Журнал обращений к ИИ"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'action'], name='orange_ai_usage_created'),
+        ]
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.action} ({self.get_upstream_status_display()}, {self.latency_ms} мс)"
@@ -0,0 +1,278 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# orange_assistant/resilience.py
+"""
+Устойчивость вызовов сервиса ИИ: дедлайны, повторы и circuit breaker.
+
+- дедлайн: у каждого действия помощника свой бюджет времени на ответ
+  (AI_DEADLINES, секунды) вместе со всеми повторами; остаток бюджета
+  передается клиенту как таймаут запроса;
+- повторы: только при временных ошибках (503, 429, 500, таймауты, обрыв
+  соединения), не больше AI_RETRY_ATTEMPTS попыток, пауза - экспоненциальная
+  с полным джиттером (случайная от 0 до base * 2^попытка), чтобы воркеры не
+  повторяли запросы синхронно; пауза, не укладывающаяся в дедлайн, не
+  делается;
+- circuit breaker: состояние в общем кэше (одно на все воркеры). После
+  AI_CIRCUIT_FAILURE_THRESHOLD временных ошибок за AI_CIRCUIT_WINDOW секунд
+  цепь размыкается на AI_CIRCUIT_OPEN_SECONDS: запросы к сервису не идут,
+  сразу выбрасывается CircuitOpenError (помощник отвечает заглушкой). Затем
+  один пробный запрос на все воркеры: успех замыкает цепь, ошибка снова
+  размыкает.
+
+Потоковые ответы повторяются только до первой полученной части.
+"""
+import asyncio
+import logging
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from google.api_core import exceptions as api_exceptions
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'default'
+
+DEFAULT_DEADLINES = {
+    'default': 15,
+}
+
+# Ошибки, после которых имеет смысл повторить запрос
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Цепь разомкнута: сервис ИИ недавно часто отвечал ошибками."""
+
+
+class AIDeadlineExceeded(TimeoutError):
+    """Бюджет времени действия исчерпан."""
+
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def is_timeout(error):
+    return isinstance(error, (TimeoutError, api_exceptions.DeadlineExceeded))
+
+
+def get_deadline(action=None):
+    """Бюджет времени на ответ для действия помощника, секунды."""
+    deadlines = {**DEFAULT_DEADLINES, **getattr(settings, 'AI_DEADLINES', {})}
+    return deadlines.get(action, deadlines['default'])
+
+
+def backoff_delay(attempt):
+    """Пауза перед повтором номер attempt (с нуля): полный джиттер."""
+    base = getattr(settings, 'AI_RETRY_BASE_DELAY', 0.5)
+    cap = getattr(settings, 'AI_RETRY_MAX_DELAY', 4)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker с состоянием в кэше. Ключи: счетчик ошибок (живет
+    AI_CIRCUIT_WINDOW секунд), время до которого цепь разомкнута и флаг
+    пробного запроса. Если кэш недоступен, запросы пропускаются.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def _key(self, suffix):
+        return f'circuit:{self.name}:{suffix}'
+
+    @property
+    def cache(self):
+        return caches[CACHE_ALIAS]
+
+    def state(self):
+        """'closed', 'open' или 'half_open' (ждет пробного запроса)."""
+        opened_until = self.cache.get(self._key('opened_until'))
+        if opened_until is None:
+            return 'closed'
+        return 'open' if time.time() < opened_until else 'half_open'
+
+    def allow(self):
+        """Можно ли сейчас обращаться к сервису."""
+        try:
+            state = self.state()
+            if state == 'closed':
+                return True
+            if state == 'open':
+                return False
+            # Пробный запрос - один на все воркеры
+            return self.cache.add(self._key('probe'), 1, timeout=get_deadline('default') * 2)
+        except Exception as e:
+            logger.warning(f"Circuit breaker {self.name} недоступен, запрос пропущен: {e}")
+            return True
+
+    def record_success(self):
+        try:
+            self.cache.delete_many([self._key('failures'), self._key('opened_until'), self._key('probe')])
+        except Exception as e:
+            logger.warning(f"Circuit breaker {self.name} недоступен: {e}")
+
+    def record_failure(self):
+        try:
+            window = getattr(settings, 'AI_CIRCUIT_WINDOW', 30)
+            self.cache.add(self._key('failures'), 0, timeout=window)
+            failures = self.cache.incr(self._key('failures'))
+            half_open = self.cache.get(self._key('opened_until')) is not None
+            if half_open or failures >= getattr(settings, 'AI_CIRCUIT_FAILURE_THRESHOLD', 5):
+                self.open()
+        except Exception as e:
+            logger.warning(f"Circuit breaker {self.name} недоступен: {e}")
+
+    def open(self):
+        open_seconds = getattr(settings, 'AI_CIRCUIT_OPEN_SECONDS', 30)
+        # Ключ живет дольше периода размыкания: после него цепь полуоткрыта
+        self.cache.set(self._key('opened_until'), time.time() + open_seconds, timeout=open_seconds * 10)
+        self.cache.delete_many([self._key('failures'), self._key('probe')])
+        logger.error(f"Circuit {self.name} разомкнут на {open_seconds} с: сервис ИИ отвечает ошибками")
+
+
+gemini_breaker = CircuitBreaker('gemini')
+
+
+def _retry_delay(error, attempt, deadline, action):
+    """Пауза перед повтором после временной ошибки или None, если повторять нельзя."""
+    delay = backoff_delay(attempt)
+    if attempt + 1 >= getattr(settings, 'AI_RETRY_ATTEMPTS', 3) or time.monotonic() + delay >= deadline:
+        return None
+    logger.warning(f"Временная ошибка сервиса ИИ ({action}), попытка {attempt + 1}: {error}; повтор через {delay:.2f} с")
+    return delay
+
+
+def _remaining(deadline, action):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise AIDeadlineExceeded(f"Дедлайн {get_deadline(action)} с для {action or 'default'} исчерпан")
+    return remaining
+
+
+def call(func, action=None, breaker=gemini_breaker):
+    """
+    func(timeout) с дедлайном действия, повторами и circuit breaker.
+    timeout - остаток бюджета времени, его нужно передать клиенту.
+    """
+    deadline = time.monotonic() + get_deadline(action)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit {breaker.name} разомкнут")
+        try:
+            result = func(_remaining(deadline, action))
+        except AIDeadlineExceeded:
+            raise
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            breaker.record_failure()
+            delay = _retry_delay(e, attempt, deadline, action)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+        else:
+            breaker.record_success()
+            return result
+
+
+async def acall(func, action=None, breaker=gemini_breaker):
+    """Асинхронный вариант call: func(timeout) возвращает awaitable, дедлайн - через wait_for."""
+    deadline = time.monotonic() + get_deadline(action)
+    attempt = 0
+    while True:
+        if not await sync_to_async(breaker.allow)():
+            raise CircuitOpenError(f"Circuit {breaker.name} разомкнут")
+        try:
+            remaining = _remaining(deadline, action)
+            result = await asyncio.wait_for(func(remaining), remaining)
+        except AIDeadlineExceeded:
+            raise
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            await sync_to_async(breaker.record_failure)()
+            delay = _retry_delay(e, attempt, deadline, action)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+        else:
+            await sync_to_async(breaker.record_success)()
+            return result
+
+
+def stream(func, action=None, breaker=gemini_breaker):
+    """
+    Части ответа из func(timeout) (итератор) с теми же правилами, что и
+    у call; повтор возможен, только пока не получено ни одной части.
+    """
+    state = {}
+
+    def first_chunk(timeout):
+        iterator = iter(func(timeout))
+        state['iterator'] = iterator
+        return next(iterator, None)
+
+    first = call(first_chunk, action, breaker)
+    if first is None:
+        return
+    yield first
+    try:
+        yield from state['iterator']
+    except Exception as e:
+        if is_transient(e):
+            breaker.record_failure()
+        raise
+
+
+async def astream(func, action=None, breaker=gemini_breaker):
+    """Асинхронный вариант stream: func(timeout) - асинхронный итератор."""
+    state = {}
+
+    async def first_chunk(timeout):
+        iterator = aiter(func(timeout))
+        state['iterator'] = iterator
+        return await anext(iterator, None)
+
+    first = await acall(first_chunk, action, breaker)
+    if first is None:
+        return
+    yield first
+    try:
+        async for chunk in state['iterator']:
+            yield chunk
+    except Exception as e:
+        if is_transient(e):
+            await sync_to_async(breaker.record_failure)()
+        raise
@@ -0,0 +1,164 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# orange_assistant/response_cache.py
+"""
+Кэш ответов Gemini на неперсональные промпты (FAQ, объяснение функций,
+идеи постов).
+
+- промпты таких действий не содержат имени пользователя, поэтому ответ
+  общий для всех; ключ - sha256 нормализованного промпта (регистр и
+  пробелы не важны) вместе с именем действия;
+- ответ живет AI_RESPONSE_CACHE_TIMEOUT секунд; записей не больше
+  AI_RESPONSE_CACHE_MAX_ENTRIES - лишние вытесняются по давности последнего
+  обращения (LRU по индексу в sorted set);
+- попадания и промахи считаются по действиям в общем для всех воркеров
+  хэше Redis (см. get_stats и команду ai_response_cache).
+
+Чтение и запись - по одному Lua-скрипту (одно обращение к Redis, атомарно).
+Если Redis недоступен, ответ просто запрашивается у Gemini.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'default'
+KEY_PREFIX = 'ai_response'
+
+# KEYS: ответ, индекс, статистика; ARGV: действие.
+# Попадание обновляет время обращения в индексе.
+LOOKUP_SCRIPT = """
+local response = redis.call('GET', KEYS[1])
+if response then
+    local time = redis.call('TIME')
+    redis.call('ZADD', KEYS[2], 'XX', tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000), KEYS[1])
+    redis.call('HINCRBY', KEYS[3], ARGV[1] .. ':hits', 1)
+else
+    redis.call('HINCRBY', KEYS[3], ARGV[1] .. ':misses', 1)
+end
+return response
+"""
+
+# KEYS: ответ, индекс; ARGV: ответ, TTL в мс, максимум записей.
+# Возвращает число вытесненных записей.
+STORE_SCRIPT = """
+local time = redis.call('TIME')
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+redis.call('ZADD', KEYS[2], tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000), KEYS[1])
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[3])
+if excess <= 0 then
+    return 0
+end
+local evicted = redis.call('ZRANGE', KEYS[2], 0, excess - 1)
+redis.call('DEL', unpack(evicted))
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+return excess
+"""
+
+_scripts = {}
+
+
+def _run_script(source, keys, args):
+    connection = get_redis_connection(CACHE_ALIAS)
+    if source not in _scripts:
+        _scripts[source] = connection.register_script(source)
+    return _scripts[source](keys=keys, args=args, client=connection)
+
+
+def _key(name):
+    return caches[CACHE_ALIAS].make_key(f'{KEY_PREFIX}:{name}')
+
+
+def normalize_prompt(prompt):
+    """Промпт без различий в регистре и пробелах - основа ключа кэша."""
+    return ' '.join(prompt.casefold().split())
+
+
+def response_key(action, prompt):
+    digest = hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+    return _key(f'{action}:{digest}')
+
+
+def lookup(action, prompt):
+    """Закэшированный ответ или None (при недоступности Redis - тоже None)."""
+    try:
+        cached = _run_script(LOOKUP_SCRIPT, [response_key(action, prompt), _key('index'), _key('stats')], [action])
+    except RedisError as e:
+        logger.warning(f"Кэш ответов ИИ недоступен: {e}")
+        return None
+    logger.debug(f"AI response cache {'hit' if cached is not None else 'miss'}: action={action}")
+    return cached.decode() if cached is not None else None
+
+
+def store(action, prompt, response):
+    """Сохраняет ответ, вытесняя давно не запрошенные сверх лимита."""
+    timeout = getattr(settings, 'AI_RESPONSE_CACHE_TIMEOUT', 60 * 60 * 24)
+    max_entries = getattr(settings, 'AI_RESPONSE_CACHE_MAX_ENTRIES', 5000)
+    try:
+        _run_script(
+            STORE_SCRIPT, [response_key(action, prompt), _key('index')],
+            [response, timeout * 1000, max_entries]
+        )
+    except RedisError as e:
+        logger.warning(f"Не удалось сохранить ответ ИИ в кэш: {e}")
+
+
+def get_or_generate(action, prompt, generate, cache_if=lambda response: True, on_hit=None):
+    """
+    Ответ на prompt из кэша или generate(prompt). Новый ответ кэшируется,
+    если cache_if(ответ) истинно (ошибки сервиса ИИ кэшировать нельзя).
+    on_hit(ответ) вызывается при попадании в кэш.
+    """
+    cached = lookup(action, prompt)
+    if cached is not None:
+        if on_hit is not None:
+            on_hit(cached)
+        return cached
+    response = generate(prompt)
+    if cache_if(response):
+        store(action, prompt, response)
+    return response
+
+
+def get_stats():
+    """
+    Метрики кэша: {'entries': число записей, 'actions': {действие: {'hits',
+    'misses', 'hit_rate'}}}.
+    """
+    connection = get_redis_connection(CACHE_ALIAS)
+    stats = {}
+    for field, value in connection.hgetall(_key('stats')).items():
+        action, kind = field.decode().rsplit(':', 1)
+        stats.setdefault(action, {'hits': 0, 'misses': 0})[kind] = int(value)
+    for counters in stats.values():
+        total = counters['hits'] + counters['misses']
+        counters['hit_rate'] = counters['hits'] / total if total else 0.0
+    return {'entries': connection.zcard(_key('index')), 'actions': stats}
+
+
+def clear():
+    """Удаляет все закэшированные ответы и статистику."""
+    connection = get_redis_connection(CACHE_ALIAS)
+    index_key = _key('index')
+    keys = connection.zrange(index_key, 0, -1)
+    connection.delete(index_key, _key('stats'), *keys)
+    return len(keys)
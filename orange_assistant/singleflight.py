@@ -0,0 +1,281 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# orange_assistant/singleflight.py
+"""
+Объединение одинаковых одновременных запросов к ИИ (single-flight).
+
+Когда много пользователей одновременно отправляют один и тот же промпт
+(например, анализ настроения популярного поста), к Gemini уходит один
+запрос, а остальные ждут его результат - в любом воркере:
+
+- ключ полета - действие и sha256 нормализованного промпта (как у кэша
+  ответов);
+- первый запрос становится ведущим: ставит в Redis блокировку со своим
+  токеном (живет дедлайн действия плюс запас) и вызывает сервис;
+- остальные запоминают токен ведущего и опрашивают результат этого полета
+  каждые AI_SINGLEFLIGHT_POLL_INTERVAL секунд; результат хранится недолго
+  (только для ожидающих) - это не кэш;
+- если ведущий пропал без результата (упал воркер, поток прерван), ждущий
+  запрос выполняется сам.
+
+Потоковый ответ ведущий отдает по частям, ожидающие получают его целиком
+одной частью. Если Redis недоступен, запросы выполняются без объединения.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from . import resilience
+from .response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'default'
+KEY_PREFIX = 'ai_flight'
+RESULT_TTL = 30  # Секунд: ждущим хватает, повторного использования нет
+LOCK_MARGIN = 5  # Запас к дедлайну действия для блокировки ведущего
+
+# KEYS: блокировка, статистика; ARGV: токен, TTL в мс, действие.
+# Возвращает {1, токен} ведущему или {0, токен ведущего}.
+JOIN_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    redis.call('HINCRBY', KEYS[2], ARGV[3] .. ':joined', 1)
+    return {0, current}
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+redis.call('HINCRBY', KEYS[2], ARGV[3] .. ':led', 1)
+return {1, ARGV[1]}
+"""
+
+# KEYS: блокировка; ARGV: токен. Снимает только свою блокировку.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_scripts = {}
+
+
+def _run_script(source, keys, args):
+    connection = get_redis_connection(CACHE_ALIAS)
+    if source not in _scripts:
+        _scripts[source] = connection.register_script(source)
+    return _scripts[source](keys=keys, args=args, client=connection)
+
+
+def _key(name):
+    return caches[CACHE_ALIAS].make_key(f'{KEY_PREFIX}:{name}')
+
+
+def flight_key(action, prompt):
+    digest = hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+    return _key(f'{action or "default"}:{digest}')
+
+
+def _join(key, action):
+    """(ведущий ли, токен полета)."""
+    ttl = (resilience.get_deadline(action) + LOCK_MARGIN) * 1000
+    is_leader, token = _run_script(
+        JOIN_SCRIPT, [key, _key('stats')], [uuid.uuid4().hex, ttl, action or 'default']
+    )
+    return bool(is_leader), token.decode() if isinstance(token, bytes) else token
+
+
+def _poll(key, token):
+    """(результат или None, продолжается ли полет)."""
+    pipe = get_redis_connection(CACHE_ALIAS).pipeline(transaction=False)
+    pipe.get(f'{key}:result:{token}')
+    pipe.get(key)
+    result, current = pipe.execute()
+    if result is not None:
+        return result.decode(), False
+    return None, current is not None and current.decode() == token
+
+
+def _publish(key, token, result):
+    # Ответ уже оплачен: сбой Redis не должен его потерять, ожидающие
+    # просто выполнят запрос сами после снятия блокировки
+    try:
+        get_redis_connection(CACHE_ALIAS).set(f'{key}:result:{token}', result, ex=RESULT_TTL)
+    except RedisError as e:
+        logger.warning(f"Не удалось опубликовать результат полета ИИ: {e}")
+
+
+def _release(key, token):
+    try:
+        _run_script(RELEASE_SCRIPT, [key], [token])
+    except RedisError as e:
+        logger.warning(f"Не удалось снять блокировку полета ИИ: {e}")
+
+
+def _wait_timeout(action):
+    return resilience.get_deadline(action) + LOCK_MARGIN
+
+
+def _poll_interval():
+    return getattr(settings, 'AI_SINGLEFLIGHT_POLL_INTERVAL', 0.1)
+
+
+def _wait(key, token, action):
+    """Результат полета ведущего или None, если ведущий пропал без результата."""
+    give_up_at = time.monotonic() + _wait_timeout(action)
+    while time.monotonic() < give_up_at:
+        time.sleep(_poll_interval())
+        result, in_flight = _poll(key, token)
+        if result is not None or not in_flight:
+            return result
+    return None
+
+
+async def _await(key, token, action):
+    """Асинхронный вариант _wait."""
+    give_up_at = time.monotonic() + _wait_timeout(action)
+    while time.monotonic() < give_up_at:
+        await asyncio.sleep(_poll_interval())
+        result, in_flight = await sync_to_async(_poll)(key, token)
+        if result is not None or not in_flight:
+            return result
+    return None
+
+
+def do(action, prompt, func):
+    """func() - ответ на prompt; одновременно для одного промпта выполняется один раз."""
+    key = flight_key(action, prompt)
+    try:
+        is_leader, token = _join(key, action)
+        if not is_leader:
+            result = _wait(key, token, action)
+            if result is not None:
+                logger.debug(f"AI request coalesced: action={action}")
+                return result
+            return func()
+    except RedisError as e:
+        logger.warning(f"Объединение запросов к ИИ недоступно: {e}")
+        return func()
+
+    try:
+        result = func()
+        _publish(key, token, result)
+        return result
+    finally:
+        _release(key, token)
+
+
+async def ado(action, prompt, func):
+    """Асинхронный вариант do: func() возвращает awaitable."""
+    key = flight_key(action, prompt)
+    try:
+        is_leader, token = await sync_to_async(_join)(key, action)
+        if not is_leader:
+            result = await _await(key, token, action)
+            if result is not None:
+                logger.debug(f"AI request coalesced: action={action}")
+                return result
+            return await func()
+    except RedisError as e:
+        logger.warning(f"Объединение запросов к ИИ недоступно: {e}")
+        return await func()
+
+    try:
+        result = await func()
+        await sync_to_async(_publish)(key, token, result)
+        return result
+    finally:
+        await sync_to_async(_release)(key, token)
+
+
+def stream(action, prompt, func):
+    """
+    Потоковый вариант do: func() - итератор частей ответа. Ведущий отдает
+    части по мере генерации, ожидающие - весь ответ одной частью.
+    """
+    key = flight_key(action, prompt)
+    try:
+        is_leader, token = _join(key, action)
+        if not is_leader:
+            result = _wait(key, token, action)
+            if result is not None:
+                yield result
+                return
+            yield from func()
+            return
+    except RedisError as e:
+        logger.warning(f"Объединение запросов к ИИ недоступно: {e}")
+        yield from func()
+        return
+
+    try:
+        parts = []
+        for part in func():
+            parts.append(part)
+            yield part
+        _publish(key, token, "".join(parts))
+    finally:
+        _release(key, token)
+
+
+async def astream(action, prompt, func):
+    """Асинхронный вариант stream: func() - асинхронный итератор частей."""
+    key = flight_key(action, prompt)
+    try:
+        is_leader, token = await sync_to_async(_join)(key, action)
+        if not is_leader:
+            result = await _await(key, token, action)
+            if result is not None:
+                yield result
+                return
+            async for part in func():
+                yield part
+            return
+    except RedisError as e:
+        logger.warning(f"Объединение запросов к ИИ недоступно: {e}")
+        async for part in func():
+            yield part
+        return
+
+    try:
+        parts = []
+        async for part in func():
+            parts.append(part)
+            yield part
+        await sync_to_async(_publish)(key, token, "".join(parts))
+    finally:
+        await sync_to_async(_release)(key, token)
+
+
+def get_stats():
+    """{действие: {'led': запросов к сервису, 'joined': присоединившихся к чужому полету}}."""
+    stats = {}
+    for field, value in get_redis_connection(CACHE_ALIAS).hgetall(_key('stats')).items():
+        action, kind = field.decode().rsplit(':', 1)
+        stats.setdefault(action, {'led': 0, 'joined': 0})[kind] = int(value)
+    return stats
+
+
+def reset_stats():
+    get_redis_connection(CACHE_ALIAS).delete(_key('stats'))
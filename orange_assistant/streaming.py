@@ -0,0 +1,179 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# orange_assistant/streaming.py
+"""
+Потоковая выдача ответов ассистента (Server-Sent Events).
+
+Клиент просит поток заголовком Accept: text/event-stream и получает:
+
+    event: chunk
+    data: {"text": "очередная часть ответа"}
+
+    event: done
+    data: {"timestamp": "...", "truncated": false}
+
+Ограничение длины ответа (MAX_RESPONSE_LENGTH) применяется по ходу потока
+и дает тот же результат, что и обрезка готового ответа: первые
+TRUNCATED_LENGTH символов и пометка о сокращении.
+
+event_stream - для синхронного представления (WSGI), aevent_stream - для
+асинхронного (ASGI).
+"""
+import json
+import logging
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_RESPONSE_LENGTH = 5000
+TRUNCATED_LENGTH = 4900
+TRUNCATION_NOTICE = "\n\n... (ответ сокращен)"
+STREAM_ERROR_MESSAGE = "Произошла ошибка при выполнении запроса. Попробуйте позже! 🍊"
+
+
+def wants_stream(request):
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def truncate_response(text):
+    """Обрезает готовый ответ длиннее MAX_RESPONSE_LENGTH."""
+    if len(text) > MAX_RESPONSE_LENGTH:
+        return text[:TRUNCATED_LENGTH] + TRUNCATION_NOTICE
+    return text
+
+
+class ResponseTruncator:
+    """
+    Инкрементальное ограничение длины ответа. Части пропускаются, пока их
+    общая длина не превысит MAX_RESPONSE_LENGTH. Символы после
+    TRUNCATED_LENGTH придерживаются: если ответ закончится раньше лимита, они
+    отдаются в finish(), иначе вместо них уходит пометка о сокращении, а
+    truncated становится истинным (дальше читать источник не нужно).
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.held = ''
+        self.truncated = False
+        self.length = 0
+
+    def feed(self, chunk):
+        """Части для отправки после очередного фрагмента ответа."""
+        parts = []
+        if self.sent < TRUNCATED_LENGTH:
+            head = chunk[:TRUNCATED_LENGTH - self.sent]
+            chunk = chunk[len(head):]
+            self.sent += len(head)
+            if head:
+                parts.append(head)
+        self.held += chunk
+        if self.sent + len(self.held) > MAX_RESPONSE_LENGTH:
+            self.truncated = True
+            self.length = self.sent + len(TRUNCATION_NOTICE)
+            parts.append(TRUNCATION_NOTICE)
+        return parts
+
+    def finish(self):
+        """Остаток после завершения ответа."""
+        self.length = self.sent + len(self.held)
+        return [self.held] if self.held else []
+
+
+def truncate_chunks(chunks, state):
+    """
+    Части ответа с ограничением длины (см. ResponseTruncator); источник
+    закрывается, как только лимит превышен. state['truncated'] и
+    state['length'] - итог для финального события.
+    """
+    truncator = ResponseTruncator()
+    state.update(truncated=False, length=0)
+    try:
+        for chunk in chunks:
+            yield from truncator.feed(chunk)
+            if truncator.truncated:
+                break
+        else:
+            yield from truncator.finish()
+        state.update(truncated=truncator.truncated, length=truncator.length)
+    finally:
+        # Прерываем генерацию у источника (например, поток Gemini)
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+async def atruncate_chunks(chunks, state):
+    """Асинхронный вариант truncate_chunks для асинхронного итератора частей."""
+    truncator = ResponseTruncator()
+    state.update(truncated=False, length=0)
+    try:
+        async for chunk in chunks:
+            for part in truncator.feed(chunk):
+                yield part
+            if truncator.truncated:
+                break
+        else:
+            for part in truncator.finish():
+                yield part
+        state.update(truncated=truncator.truncated, length=truncator.length)
+    finally:
+        aclose = getattr(chunks, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _done_event(state, log_label):
+    logger.info(f"AI streamed response length: {state.get('length', 0)} chars {log_label}")
+    return sse_event('done', {
+        'timestamp': timezone.now().isoformat(),
+        'truncated': state.get('truncated', False),
+    })
+
+
+def event_stream(chunks, log_label=''):
+    """SSE-события для частей ответа: chunk по мере появления и done в конце."""
+    state = {}
+    try:
+        for text in truncate_chunks(iter(chunks), state):
+            yield sse_event('chunk', {'text': text})
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой выдаче ответа {log_label}: {e}")
+        yield sse_event('chunk', {'text': STREAM_ERROR_MESSAGE})
+    yield _done_event(state, log_label)
+
+
+async def aevent_stream(chunks, log_label=''):
+    """Асинхронный вариант event_stream (для ASGI); chunks - строка или асинхронный итератор."""
+    if isinstance(chunks, str):
+        chunks = _single_chunk(chunks)
+    state = {}
+    try:
+        async for text in atruncate_chunks(chunks, state):
+            yield sse_event('chunk', {'text': text})
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой выдаче ответа {log_label}: {e}")
+        yield sse_event('chunk', {'text': STREAM_ERROR_MESSAGE})
+    yield _done_event(state, log_label)
+
+
+async def _single_chunk(text):
+    yield text
@@ -1,9 +1,13 @@
 # orange_assistant/urls.py
+from django.conf import settings
 from django.urls import path
-from .views import ChatWithAIView
+from .views import AsyncChatWithAIView, ChatWithAIView
 
 app_name = 'orange_assistant'
 
+# Под ASGI-сервером (entrypoint.prod.sh) - асинхронный вариант представления
+chat_view_class = AsyncChatWithAIView if getattr(settings, 'ASSISTANT_ASYNC_VIEW', False) else ChatWithAIView
+
 urlpatterns = [
-    path('api/chat/', ChatWithAIView.as_view(), name='ai_chat'),
+    path('api/chat/', chat_view_class.as_view(), name='ai_chat'),
 ]
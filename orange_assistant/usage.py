@@ -0,0 +1,306 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# orange_assistant/usage.py
+"""
+Журнал ответов помощника на промпты (модель AIUsageLog): какие действия
+сколько тратят квоты Gemini и как быстро отвечают.
+
+- запись заводится на каждый ответ: обращение к Gemini, ответ из кэша
+  (response_cache) или ответ одинакового одновременного запроса
+  (singleflight) - с действием, пользователем, временем ответа, длинами
+  промпта и ответа и исходом обращения к Gemini;
+- в БД записи по одной не пишутся: они копятся в списке Redis, общем для
+  воркеров, и запрос, после которого в списке набралось
+  AI_USAGE_BATCH_SIZE записей, забирает пачку и сохраняет ее одним
+  bulk_create. Остаток сохраняют команда flush_ai_usage (по расписанию) и
+  отчет в админке. Если сохранить пачку не удалось, она возвращается в
+  буфер;
+- пользователь берется из контекста запроса (bind_user в представлении
+  помощника), а не передается через все функции ai_services.
+
+Если Redis недоступен, запись теряется - на ответ пользователю это не влияет.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Aggregate, Avg, Count, FloatField, Q, Sum
+from django.db.models.functions import Coalesce
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from . import resilience
+from .models import AIUsageLog
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'default'
+BUFFER_KEY = 'ai_usage_buffer'
+BATCH_SIZE = 100
+
+PERCENTILES = (50, 95, 99)
+# Исходы, при которых запрос ушел в Gemini и расходует квоту
+BILLABLE_STATUSES = (AIUsageLog.STATUS_OK, AIUsageLog.STATUS_ERROR, AIUsageLog.STATUS_TIMEOUT)
+FAILED_STATUSES = (AIUsageLog.STATUS_ERROR, AIUsageLog.STATUS_TIMEOUT, AIUsageLog.STATUS_CIRCUIT_OPEN)
+
+# KEYS: буфер; ARGV: размер пачки. Забирает пачку из начала списка атомарно.
+TAKE_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+end
+return items
+"""
+
+_scripts = {}
+_user_id = ContextVar('ai_usage_user_id', default=None)
+
+
+def _run_script(source, keys, args):
+    redis = get_redis_connection(CACHE_ALIAS)
+    if source not in _scripts:
+        _scripts[source] = redis.register_script(source)
+    return _scripts[source](keys=keys, args=args, client=redis)
+
+
+def _key():
+    return caches[CACHE_ALIAS].make_key(BUFFER_KEY)
+
+
+def _batch_size():
+    return getattr(settings, 'AI_USAGE_BATCH_SIZE', BATCH_SIZE)
+
+
+def bind_user(user_id):
+    """Пользователь текущего запроса к помощнику (None - гость)."""
+    _user_id.set(user_id)
+
+
+class UsageCall:
+    """Ответ на один промпт: от start до finish."""
+
+    def __init__(self, action, prompt):
+        self.action = action or 'general_chat'
+        self.user_id = _user_id.get()
+        self.prompt_chars = len(prompt)
+        self.response_chars = 0
+        self.cache_hit = False
+        # Пока ответ не запрошен у Gemini, он получен от ведущего запроса (singleflight)
+        self.status = AIUsageLog.STATUS_JOINED
+        self.started = time.monotonic()
+        self.created_at = time.time()
+
+    def upstream(self):
+        """Запрос ушел в Gemini."""
+        self.status = AIUsageLog.STATUS_OK
+
+    def failed(self, error):
+        if isinstance(error, resilience.CircuitOpenError):
+            self.status = AIUsageLog.STATUS_CIRCUIT_OPEN
+        elif resilience.is_timeout(error):
+            self.status = AIUsageLog.STATUS_TIMEOUT
+        else:
+            self.status = AIUsageLog.STATUS_ERROR
+
+    def cached(self):
+        """Ответ взят из кэша ответов, без обращения к Gemini."""
+        self.cache_hit = True
+        self.status = AIUsageLog.STATUS_SKIPPED
+
+    def as_entry(self):
+        return {
+            'created_at': self.created_at,
+            'action': self.action,
+            'user_id': self.user_id,
+            'latency_ms': round((time.monotonic() - self.started) * 1000),
+            'prompt_chars': self.prompt_chars,
+            'response_chars': self.response_chars,
+            'cache_hit': self.cache_hit,
+            'upstream_status': self.status,
+        }
+
+
+def start(action, prompt):
+    return UsageCall(action, prompt)
+
+
+def finish(call, response=None):
+    """
+    Кладет запись в буфер; если набралась пачка - сохраняет ее в БД.
+    response - полный ответ (для потокового ответа длина уже накоплена в call).
+    """
+    if response is not None:
+        call.response_chars = len(response)
+    try:
+        buffered = get_redis_connection(CACHE_ALIAS).rpush(_key(), json.dumps(call.as_entry()))
+        if buffered >= _batch_size():
+            flush_batch()
+    except RedisError as e:
+        logger.warning(f"Не удалось записать обращение к ИИ в журнал: {e}")
+
+
+def finish_cached(call, response):
+    call.cached()
+    finish(call, response)
+
+
+def track_stream(call, parts):
+    """Отдает части ответа, по завершении потока записывает обращение."""
+    try:
+        for part in parts:
+            call.response_chars += len(part)
+            yield part
+    finally:
+        finish(call)
+
+
+async def atrack_stream(call, parts):
+    """Асинхронный вариант track_stream."""
+    try:
+        async for part in parts:
+            call.response_chars += len(part)
+            yield part
+    finally:
+        await sync_to_async(finish)(call)
+
+
+def _to_log(entry, known_user_ids):
+    user_id = entry['user_id'] if entry['user_id'] in known_user_ids else None
+    return AIUsageLog(
+        created_at=datetime.fromtimestamp(entry['created_at'], tz=dt_timezone.utc),
+        action=entry['action'],
+        user_id=user_id,
+        latency_ms=entry['latency_ms'],
+        prompt_chars=entry['prompt_chars'],
+        response_chars=entry['response_chars'],
+        cache_hit=entry['cache_hit'],
+        upstream_status=entry['upstream_status'],
+    )
+
+
+def flush_batch():
+    """Сохраняет одну пачку записей из буфера. Возвращает число сохраненных."""
+    items = _run_script(TAKE_SCRIPT, [_key()], [_batch_size()])
+    if not items:
+        return 0
+    entries = [json.loads(item) for item in items]
+    try:
+        # Пользователь мог быть удален, пока запись ждала в буфере
+        user_ids = {entry['user_id'] for entry in entries if entry['user_id']}
+        known_user_ids = set(
+            get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True)
+        ) if user_ids else set()
+        AIUsageLog.objects.bulk_create([_to_log(entry, known_user_ids) for entry in entries])
+    except Exception as e:
+        logger.error(f"Не удалось сохранить {len(entries)} записей журнала обращений к ИИ: {e}")
+        _return_to_buffer(items)
+        return 0
+    return len(entries)
+
+
+def _return_to_buffer(items):
+    """Возвращает несохраненную пачку в начало буфера в прежнем порядке."""
+    try:
+        get_redis_connection(CACHE_ALIAS).lpush(_key(), *reversed(items))
+    except RedisError as e:
+        logger.warning(f"Не удалось вернуть {len(items)} записей журнала обращений к ИИ в буфер: {e}")
+
+
+def flush():
+    """Сохраняет весь буфер пачками. Возвращает число сохраненных записей."""
+    saved = 0
+    while True:
+        batch = flush_batch()
+        if not batch:
+            return saved
+        saved += batch
+
+
+def buffered_count():
+    return get_redis_connection(CACHE_ALIAS).llen(_key())
+
+
+class PercentileCont(Aggregate):
+    """PERCENTILE_CONT PostgreSQL: перцентиль с линейной интерполяцией."""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+def _percentile(ordered, fraction):
+    """Как PERCENTILE_CONT: линейная интерполяция по отсортированным значениям."""
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _latency_percentiles(queryset):
+    """{действие: {'p50': мс, 'p95': мс, 'p99': мс}}."""
+    if connection.vendor == 'postgresql':
+        rows = queryset.values('action').annotate(**{
+            f'p{percentile}': PercentileCont('latency_ms', percentile / 100)
+            for percentile in PERCENTILES
+        })
+        return {
+            row['action']: {f'p{percentile}': row[f'p{percentile}'] for percentile in PERCENTILES}
+            for row in rows
+        }
+
+    latencies = {}
+    for action, latency in queryset.order_by('action', 'latency_ms').values_list('action', 'latency_ms'):
+        latencies.setdefault(action, []).append(latency)
+    return {
+        action: {f'p{percentile}': _percentile(values, percentile / 100) for percentile in PERCENTILES}
+        for action, values in latencies.items()
+    }
+
+
+def report(since=None):
+    """
+    Сводка по действиям: ответов, из кэша, запросов к Gemini, неудачных,
+    символов отправлено и получено в Gemini, среднее и перцентили времени
+    ответа (p50, p95, p99, мс). Сначала самые затратные по числу запросов к Gemini.
+    """
+    queryset = AIUsageLog.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    billable = Q(upstream_status__in=BILLABLE_STATUSES)
+    rows = list(
+        queryset.values('action').annotate(
+            requests=Count('pk'),
+            cache_hits=Count('pk', filter=Q(cache_hit=True)),
+            upstream_calls=Count('pk', filter=billable),
+            failures=Count('pk', filter=Q(upstream_status__in=FAILED_STATUSES)),
+            prompt_chars=Coalesce(Sum('prompt_chars', filter=billable), 0),
+            response_chars=Coalesce(Sum('response_chars', filter=billable), 0),
+            avg_latency_ms=Avg('latency_ms'),
+        ).order_by('-upstream_calls', 'action')
+    )
+    percentiles = _latency_percentiles(queryset)
+    for row in rows:
+        row.update(percentiles.get(row['action'], {}))
+    return rows
@@ -17,14 +17,15 @@
 import json
 import logging
 import re
-import time
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from django.core.cache import cache
+
+from Chatty_orange import ratelimit
 
 from .ai_services import (
     get_gemini_response,
@@ -40,31 +41,34 @@ from .ai_services import (
     find_post_by_keyword,
     get_post_details,
     find_user_by_username,
-    get_user_activity
+    format_username_suggestions,
+    get_user_activity,
+    aanalyze_profile_stats,
+    aanalyze_sentiment,
+    acheck_post_content,
+    afind_post_by_keyword,
+    agenerate_post_ideas,
+    aget_faq_answer,
+    aget_feature_explanation,
+    aget_gemini_response,
+    aget_post_creation_suggestion,
+    aget_user_activity,
 )
+from . import fast_path, intents, usage
+from .streaming import aevent_stream, event_stream, truncate_response, wants_stream
 
 logger = logging.getLogger(__name__)
 
-
-def check_rate_limit(user_identifier, max_requests=15, window=60):
-    """
-     ЗАЩИТА ОТ СПАМА: Максимум 15 запросов в минуту на пользователя/IP
-    """
-    key = f"ai_requests_{user_identifier}"
-    requests = cache.get(key, [])
-    now = time.time()
-
-    # Очищаем старые запросы
-    requests = [req for req in requests if now - req < window]
-
-    # Проверяем лимит
-    if len(requests) >= max_requests:
-        return False, len(requests)
-
-    # Добавляем новый запрос
-    requests.append(now)
-    cache.set(key, requests, window)
-    return True, len(requests)
+# Подсказки общего чата по темам запроса (intents.HINT_*)
+HELP_SUGGESTIONS = {
+    intents.HINT_USERS: ["💡 Для поиска пользователя: 'Найди пользователя [имя]'"],
+    intents.HINT_POSTS: [
+        "💡 Для поиска постов: 'Найди посты про [тема]'",
+        "💡 Для деталей поста: 'Расскажи о посте [ID]'",
+        "💡 Для поиска в скобках: 'Найди пост (ключевое слово)'",
+    ],
+    intents.HINT_RECOMMENDATIONS: ["💡 Для рекомендаций: 'Кого почитать?'"],
+}
 
 
 @method_decorator(ensure_csrf_cookie, name='dispatch')  # БЕЗОПАСНО: требует CSRF токен
@@ -78,236 +82,33 @@ class ChatWithAIView(View):
 
     def post(self, request, *args, **kwargs):
         try:
-            # ✅ ЗАЩИТА 1: Rate Limiting
-            if request.user.is_authenticated:
-                user_identifier = f"user_{request.user.id}"
-                username = request.user.username
-            else:
-                # Для анонимных пользователей используем IP
-                user_identifier = f"ip_{self.get_client_ip(request)}"
-                username = "Гость"
-
-            allowed, request_count = check_rate_limit(user_identifier)
-            if not allowed:
-                logger.warning(f"Rate limit exceeded for {user_identifier}")
-                return JsonResponse({
-                    'error': f'Слишком много запросов! Попробуйте через минуту. (Лимит: 15 запросов/мин)'
-                }, status=429)
-
-            # Логируем использование для мониторинга
-            logger.info(f"AI request {request_count}/15 from {username} ({user_identifier})")
-
-            # Загружаем данные из запроса
-            if request.content_type == 'application/json':
-                data = json.loads(request.body)
-            else:
-                data = request.POST
-
-            action_type = data.get('action_type')
-            user_input = data.get('user_input', '')
-            user_info = data.get('user_info', {})
-
-            # ✅ ЗАЩИТА 2: Умная проверка длины запроса (ПОСЛЕ определения action_type)
-            def validate_request_length(user_input: str, action_type: str, username: str):
-                """Проверяет длину запроса в зависимости от типа действия"""
-                limits = {
-                    'check_post_content': 5000,  # Проверка контента поста
-                    'post_creation_suggestion': 5000,  # Помощь с созданием поста
-                    'analyze_sentiment': 3000,  # Анализ настроения
-                    'general_chat': 2000,  # Общий чат
-                    'faq': 1000,  # FAQ
-                    'feature_explanation': 1000,  # Объяснение функций
-                }
-
-                limit = limits.get(action_type, 1000)  # По умолчанию 1000
-
-                if len(user_input) > limit:
-                    logger.warning(
-                        f"Too long request from {username}: {len(user_input)} chars, limit: {limit}, action: {action_type}")
-                    return False, f'Слишком длинный запрос! Максимум {limit} символов для данного типа действия.'
-
-                return True, ""
-
-            # Проверяем длину ПОСЛЕ получения action_type
-            is_valid, error_msg = validate_request_length(user_input, action_type, username)
-            if not is_valid:
-                return JsonResponse({'error': error_msg}, status=400)
-
-            # ✅ ЗАЩИТА 3: Базовая валидация action_type
-            allowed_actions = {
-                'faq', 'feature_explanation', 'general_chat', 'interactive_tour_step',
-                'post_creation_suggestion', 'subscription_recommendations', 'check_post_content',
-                'analyze_profile', 'generate_post_ideas', 'analyze_sentiment',
-                'find_post_by_keyword', 'get_post_details', 'find_user_by_username',
-                'get_user_activity'
-            }
-
-            if action_type and action_type not in allowed_actions:
-                logger.warning(f"Invalid action_type from {username}: {action_type}")
-                return JsonResponse({
-                    'error': 'Неизвестный тип действия'
-                }, status=400)
-
-            # Добавляем информацию о текущем пользователе
-            if request.user.is_authenticated:
-                user_info.update({
-                    'user_id': request.user.id,
-                    'username': request.user.username,
-                    'is_authenticated': True
-                })
-            else:
-                user_info.update({
-                    'user_id': None,
-                    'username': user_info.get('username', 'Гость'),
-                    'is_authenticated': False
-                })
-
-            # Логируем запрос для статистики (но не весь user_input для приватности)
-            logger.info(
-                f"AI request: action={action_type}, user={user_info.get('username')}, "
-                f"input_length={len(user_input)}, chars='{user_input[:30]}...'"
-            )
+            prepared = self.prepare_request(request, request.user)
+            if isinstance(prepared, JsonResponse):
+                return prepared
+            usage.bind_user(prepared['user_info']['user_id'])
 
             # Обработка различных типов действий
             try:
-                if action_type == 'faq':
-                    if not user_input:
-                        return JsonResponse({'error': 'Введите ваш вопрос'}, status=400)
-                    ai_response = get_faq_answer(question=user_input, user_info=user_info)
-
-                elif action_type == 'feature_explanation':
-                    if not user_input:
-                        return JsonResponse({'error': 'Укажите функцию для объяснения'}, status=400)
-                    ai_response = get_feature_explanation(feature_query=user_input, user_info=user_info)
-
-                elif action_type == 'general_chat':
-                    if not user_input:
-                        ai_response = f"Привет, {user_info.get('username')}! 👋 Я твой Апельсиновый Помощник! Чем могу помочь?"
-                    else:
-                        # Используем обработку естественного языка
-                        ai_response = self.handle_natural_language_query(user_input, user_info)
-
-                elif action_type == 'interactive_tour_step':
-                    step_number = data.get('step_number')
-                    if step_number is None:
-                        return JsonResponse({'error': 'Не указан номер шага'}, status=400)
-                    try:
-                        step_number = int(step_number)
-                        if step_number < 1 or step_number > 10:  # ✅ Валидация диапазона
-                            return JsonResponse({'error': 'Номер шага должен быть от 1 до 10'}, status=400)
-                    except ValueError:
-                        return JsonResponse({'error': 'Номер шага должен быть числом'}, status=400)
-                    ai_response = get_interactive_tour_step(step_number=step_number, user_info=user_info)
-
-                elif action_type == 'post_creation_suggestion':
-                    current_text = data.get('current_text', '')
-                    if len(current_text) > 5000:  # ✅ Ограничение для текста поста
-                        return JsonResponse({'error': 'Слишком длинный текст поста'}, status=400)
-                    ai_response = get_post_creation_suggestion(current_text=current_text, user_info=user_info)
-
-                elif action_type == 'subscription_recommendations':
-                    current_user_id = user_info.get('user_id') if user_info.get('is_authenticated') else None
-                    ai_response = get_subscription_recommendations(user_info=user_info, current_user_id=current_user_id)
-
-                elif action_type == 'check_post_content':
-                    if not user_input:
-                        return JsonResponse({'error': 'Введите текст для проверки'}, status=400)
-                    if len(user_input) > 5000:  # ✅ Ограничение для проверки контента
-                        return JsonResponse({'error': 'Слишком длинный текст для проверки'}, status=400)
-                    ai_response = check_post_content(post_text=user_input, user_info=user_info)
-
-                elif action_type == 'analyze_profile':
-                    if not user_info.get('is_authenticated'):
-                        ai_response = "🔒 Эта функция доступна только авторизованным пользователям!"
-                    else:
-                        ai_response = analyze_profile_stats(user_id=user_info.get('user_id'))
-
-                elif action_type == 'generate_post_ideas':
-                    tags = data.get('tags', [])
-                    if len(tags) > 10:  # ✅ Ограничение количества тегов
-                        return JsonResponse({'error': 'Слишком много тегов (максимум 10)'}, status=400)
-                    ai_response = generate_post_ideas(user_info=user_info, tags=tags)
-
-                elif action_type == 'analyze_sentiment':
-                    if not user_input:
-                        return JsonResponse({'error': 'Введите текст для анализа'}, status=400)
-                    ai_response = analyze_sentiment(text=user_input)
-
-                elif action_type == 'find_post_by_keyword':
-                    # Извлекаем ключевое слово из user_input
-                    keyword = self.extract_keyword_for_posts(user_input)
-                    if not keyword:
-                        return JsonResponse({'error': 'Не удалось извлечь ключевое слово для поиска'}, status=400)
-                    if len(keyword) > 100:  # ✅ Ограничение длины ключевого слова
-                        return JsonResponse({'error': 'Слишком длинное ключевое слово'}, status=400)
-                    logger.info(f"Extracted keyword for post search: '{keyword}'")
-                    ai_response = find_post_by_keyword(keyword=keyword, user_info=user_info)
-
-                elif action_type == 'get_post_details':
-                    post_id = data.get('post_id')
-                    if not post_id:
-                        # Попробуем извлечь ID из user_input
-                        numbers = re.findall(r'\d+', user_input)
-                        if numbers:
-                            post_id = numbers[0]
-                        else:
-                            return JsonResponse({'error': 'Не указан ID поста'}, status=400)
-                    try:
-                        post_id = int(post_id)
-                        if post_id < 1 or post_id > 999999:  # ✅ Разумные ограничения
-                            return JsonResponse({'error': 'Некорректный ID поста'}, status=400)
-                    except ValueError:
-                        return JsonResponse({'error': 'ID поста должен быть числом'}, status=400)
-                    ai_response = get_post_details(post_id=post_id, user_info=user_info)
-
-                elif action_type == 'find_user_by_username':
-                    # Извлекаем имя пользователя из user_input
-                    username_search = self.extract_username(user_input)
-                    if not username_search:
-                        return JsonResponse({'error': 'Не удалось извлечь имя пользователя'}, status=400)
-                    if len(username_search) > 150:  # ✅ Ограничение длины имени пользователя
-                        return JsonResponse({'error': 'Слишком длинное имя пользователя'}, status=400)
-                    logger.info(f"Extracted username: '{username_search}'")
-                    ai_response = find_user_by_username(username=username_search, user_info=user_info)
-
-                elif action_type == 'get_user_activity':
-                    user_id_target = data.get('user_id_target')
-                    if not user_id_target:
-                        # Попробуем извлечь ID из user_input
-                        numbers = re.findall(r'\d+', user_input)
-                        if numbers:
-                            user_id_target = numbers[0]
-                        else:
-                            return JsonResponse({'error': 'Не указан ID целевого пользователя'}, status=400)
-                    try:
-                        user_id_target = int(user_id_target)
-                        if user_id_target < 1 or user_id_target > 999999:  # ✅ Разумные ограничения
-                            return JsonResponse({'error': 'Некорректный ID пользователя'}, status=400)
-                    except ValueError:
-                        return JsonResponse({'error': 'ID целевого пользователя должен быть числом'}, status=400)
-                    ai_response = get_user_activity(user_id=user_id_target, user_info=user_info)
-
+                action = self.resolve_action(prepared)
+                if isinstance(action, JsonResponse):
+                    return action
+                if isinstance(action, str):
+                    ai_response = action
                 else:
-                    # Обработка естественного языка для неизвестных типов
-                    ai_response = self.handle_natural_language_query(user_input, user_info)
-
+                    handler, handler_kwargs = action
+                    ai_response = handler(**handler_kwargs)
             except Exception as action_error:
-                logger.error(f"Ошибка при выполнении действия {action_type}: {action_error}")
+                logger.error(f"Ошибка при выполнении действия {prepared['action_type']}: {action_error}")
                 ai_response = f"Произошла ошибка при выполнении запроса. Попробуйте позже! 🍊"
 
             # Сохраняем статистику использования (опционально)
-            self.save_usage_stats(action_type, user_info, user_identifier)
-
-            # ✅ Ограничиваем длину ответа
-            if len(ai_response) > 5000:
-                ai_response = ai_response[:4900] + "\n\n... (ответ сокращен)"
-
-            logger.info(f"AI response length: {len(ai_response)} chars for {username}")
+            self.save_usage_stats(prepared['action_type'], prepared['user_info'], prepared['user_identifier'])
 
-            return JsonResponse({
-                'response': ai_response,
-                'timestamp': timezone.now().isoformat()
-            })
+            if prepared['stream']:
+                # Ответы без генерации (поиск, статистика) уходят одной частью
+                chunks = [ai_response] if isinstance(ai_response, str) else ai_response
+                return self.stream_response(event_stream(chunks, f"for {prepared['username']}"))
+            return self.json_response(ai_response, prepared['username'])
 
         except json.JSONDecodeError:
             logger.error("JSON decode error in ChatWithAIView")
@@ -316,6 +117,268 @@ class ChatWithAIView(View):
             logger.error(f"Unexpected error in ChatWithAIView: {e}")
             return JsonResponse({'error': 'Внутренняя ошибка сервера'}, status=500)
 
+    def prepare_request(self, request, user):
+        """
+        Разбор и проверка запроса, rate limiting. Возвращает JsonResponse с
+        ошибкой или словарь с данными запроса для resolve_action.
+        Пользователь передается отдельно: в асинхронном представлении он
+        загружается через request.auser().
+        """
+        # Идентификатор для rate limiting: пользователь или IP
+        if user.is_authenticated:
+            user_identifier = f"user_{user.id}"
+            username = user.username
+        else:
+            # Для анонимных пользователей используем IP
+            user_identifier = f"ip_{self.get_client_ip(request)}"
+            username = "Гость"
+
+        # Загружаем данные из запроса
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+        else:
+            data = request.POST
+
+        action_type = data.get('action_type')
+        user_input = data.get('user_input', '')
+        user_info = data.get('user_info', {})
+
+        # ✅ ЗАЩИТА 2: Умная проверка длины запроса (ПОСЛЕ определения action_type)
+        def validate_request_length(user_input: str, action_type: str, username: str):
+            """Проверяет длину запроса в зависимости от типа действия"""
+            limits = {
+                'check_post_content': 5000,  # Проверка контента поста
+                'post_creation_suggestion': 5000,  # Помощь с созданием поста
+                'analyze_sentiment': 3000,  # Анализ настроения
+                'general_chat': 2000,  # Общий чат
+                'faq': 1000,  # FAQ
+                'feature_explanation': 1000,  # Объяснение функций
+            }
+
+            limit = limits.get(action_type, 1000)  # По умолчанию 1000
+
+            if len(user_input) > limit:
+                logger.warning(
+                    f"Too long request from {username}: {len(user_input)} chars, limit: {limit}, action: {action_type}")
+                return False, f'Слишком длинный запрос! Максимум {limit} символов для данного типа действия.'
+
+            return True, ""
+
+        # Проверяем длину ПОСЛЕ получения action_type
+        is_valid, error_msg = validate_request_length(user_input, action_type, username)
+        if not is_valid:
+            return JsonResponse({'error': error_msg}, status=400)
+
+        # ✅ ЗАЩИТА 3: Базовая валидация action_type
+        allowed_actions = {
+            'faq', 'feature_explanation', 'general_chat', 'interactive_tour_step',
+            'post_creation_suggestion', 'subscription_recommendations', 'check_post_content',
+            'analyze_profile', 'generate_post_ideas', 'analyze_sentiment',
+            'find_post_by_keyword', 'get_post_details', 'find_user_by_username',
+            'get_user_activity'
+        }
+
+        if action_type and action_type not in allowed_actions:
+            logger.warning(f"Invalid action_type from {username}: {action_type}")
+            return JsonResponse({
+                'error': 'Неизвестный тип действия'
+            }, status=400)
+
+        # ✅ ЗАЩИТА 1: Rate Limiting - общая квота помощника и квота действия:
+        # дорогие действия (check_post_content) ограничены сильнее дешевых (faq)
+        rate = ratelimit.check(
+            user_identifier, 'assistant', f"assistant:{action_type or 'general_chat'}"
+        )
+        if not rate.allowed:
+            logger.warning(f"Rate limit exceeded for {user_identifier} ({action_type})")
+            retry_after = max(1, round(rate.retry_after))
+            response = JsonResponse({
+                'error': f'Слишком много запросов! Попробуйте через {retry_after} с.'
+            }, status=429)
+            response['Retry-After'] = retry_after
+            return response
+
+        # Логируем использование для мониторинга
+        logger.info(f"AI request {rate.used} from {username} ({user_identifier}), action={action_type}")
+
+        # Добавляем информацию о текущем пользователе
+        if user.is_authenticated:
+            user_info.update({
+                'user_id': user.id,
+                'username': user.username,
+                'is_authenticated': True
+            })
+        else:
+            user_info.update({
+                'user_id': None,
+                'username': user_info.get('username', 'Гость'),
+                'is_authenticated': False
+            })
+
+        # Логируем запрос для статистики (но не весь user_input для приватности)
+        logger.info(
+            f"AI request: action={action_type}, user={user_info.get('username')}, "
+            f"input_length={len(user_input)}, chars='{user_input[:30]}...'"
+        )
+
+        return {
+            'data': data,
+            'action_type': action_type,
+            'user_input': user_input,
+            'user_info': user_info,
+            'username': username,
+            'user_identifier': user_identifier,
+            # Потоковый режим (SSE): ответы Gemini отдаются частями по мере генерации
+            'stream': wants_stream(request),
+        }
+
+    def resolve_action(self, prepared):
+        """
+        Проверяет параметры действия. Возвращает JsonResponse с ошибкой,
+        готовый ответ-строку или (обработчик, аргументы) - вызов обработчика
+        остается представлению (синхронному или асинхронному).
+        """
+        data = prepared['data']
+        action_type = prepared['action_type']
+        user_input = prepared['user_input']
+        user_info = prepared['user_info']
+        stream = prepared['stream']
+
+        if action_type == 'faq':
+            if not user_input:
+                return JsonResponse({'error': 'Введите ваш вопрос'}, status=400)
+            return get_faq_answer, {'question': user_input, 'user_info': user_info, 'stream': stream}
+
+        elif action_type == 'feature_explanation':
+            if not user_input:
+                return JsonResponse({'error': 'Укажите функцию для объяснения'}, status=400)
+            return get_feature_explanation, {'feature_query': user_input, 'user_info': user_info, 'stream': stream}
+
+        elif action_type == 'general_chat':
+            if not user_input:
+                return f"Привет, {user_info.get('username')}! 👋 Я твой Апельсиновый Помощник! Чем могу помочь?"
+            # Используем обработку естественного языка
+            return self.handle_natural_language_query, {'user_input': user_input, 'user_info': user_info}
+
+        elif action_type == 'interactive_tour_step':
+            step_number = data.get('step_number')
+            if step_number is None:
+                return JsonResponse({'error': 'Не указан номер шага'}, status=400)
+            try:
+                step_number = int(step_number)
+                if step_number < 1 or step_number > 10:  # ✅ Валидация диапазона
+                    return JsonResponse({'error': 'Номер шага должен быть от 1 до 10'}, status=400)
+            except ValueError:
+                return JsonResponse({'error': 'Номер шага должен быть числом'}, status=400)
+            return get_interactive_tour_step, {'step_number': step_number, 'user_info': user_info}
+
+        elif action_type == 'post_creation_suggestion':
+            current_text = data.get('current_text', '')
+            if len(current_text) > 5000:  # ✅ Ограничение для текста поста
+                return JsonResponse({'error': 'Слишком длинный текст поста'}, status=400)
+            return get_post_creation_suggestion, {'current_text': current_text, 'user_info': user_info, 'stream': stream}
+
+        elif action_type == 'subscription_recommendations':
+            current_user_id = user_info.get('user_id') if user_info.get('is_authenticated') else None
+            return get_subscription_recommendations, {'user_info': user_info, 'current_user_id': current_user_id}
+
+        elif action_type == 'check_post_content':
+            if not user_input:
+                return JsonResponse({'error': 'Введите текст для проверки'}, status=400)
+            if len(user_input) > 5000:  # ✅ Ограничение для проверки контента
+                return JsonResponse({'error': 'Слишком длинный текст для проверки'}, status=400)
+            return check_post_content, {'post_text': user_input, 'user_info': user_info, 'stream': stream}
+
+        elif action_type == 'analyze_profile':
+            if not user_info.get('is_authenticated'):
+                return "🔒 Эта функция доступна только авторизованным пользователям!"
+            return analyze_profile_stats, {'user_id': user_info.get('user_id')}
+
+        elif action_type == 'generate_post_ideas':
+            tags = data.get('tags', [])
+            if len(tags) > 10:  # ✅ Ограничение количества тегов
+                return JsonResponse({'error': 'Слишком много тегов (максимум 10)'}, status=400)
+            return generate_post_ideas, {'user_info': user_info, 'tags': tags, 'stream': stream}
+
+        elif action_type == 'analyze_sentiment':
+            if not user_input:
+                return JsonResponse({'error': 'Введите текст для анализа'}, status=400)
+            return analyze_sentiment, {'text': user_input, 'stream': stream}
+
+        elif action_type == 'find_post_by_keyword':
+            # Извлекаем ключевое слово из user_input
+            keyword = self.extract_keyword_for_posts(user_input)
+            if not keyword:
+                return JsonResponse({'error': 'Не удалось извлечь ключевое слово для поиска'}, status=400)
+            if len(keyword) > 100:  # ✅ Ограничение длины ключевого слова
+                return JsonResponse({'error': 'Слишком длинное ключевое слово'}, status=400)
+            logger.info(f"Extracted keyword for post search: '{keyword}'")
+            return find_post_by_keyword, {'keyword': keyword, 'user_info': user_info}
+
+        elif action_type == 'get_post_details':
+            post_id = data.get('post_id')
+            if not post_id:
+                # Попробуем извлечь ID из user_input
+                numbers = re.findall(r'\d+', user_input)
+                if numbers:
+                    post_id = numbers[0]
+                else:
+                    return JsonResponse({'error': 'Не указан ID поста'}, status=400)
+            try:
+                post_id = int(post_id)
+                if post_id < 1 or post_id > 999999:  # ✅ Разумные ограничения
+                    return JsonResponse({'error': 'Некорректный ID поста'}, status=400)
+            except ValueError:
+                return JsonResponse({'error': 'ID поста должен быть числом'}, status=400)
+            return get_post_details, {'post_id': post_id, 'user_info': user_info}
+
+        elif action_type == 'find_user_by_username':
+            # Извлекаем имя пользователя из user_input
+            username_search = self.extract_username(user_input)
+            if not username_search:
+                return JsonResponse({'error': 'Не удалось извлечь имя пользователя'}, status=400)
+            if len(username_search) > 150:  # ✅ Ограничение длины имени пользователя
+                return JsonResponse({'error': 'Слишком длинное имя пользователя'}, status=400)
+            logger.info(f"Extracted username: '{username_search}'")
+            return find_user_by_username, {'username': username_search, 'user_info': user_info}
+
+        elif action_type == 'get_user_activity':
+            user_id_target = data.get('user_id_target')
+            if not user_id_target:
+                # Попробуем извлечь ID из user_input
+                numbers = re.findall(r'\d+', user_input)
+                if numbers:
+                    user_id_target = numbers[0]
+                else:
+                    return JsonResponse({'error': 'Не указан ID целевого пользователя'}, status=400)
+            try:
+                user_id_target = int(user_id_target)
+                if user_id_target < 1 or user_id_target > 999999:  # ✅ Разумные ограничения
+                    return JsonResponse({'error': 'Некорректный ID пользователя'}, status=400)
+            except ValueError:
+                return JsonResponse({'error': 'ID целевого пользователя должен быть числом'}, status=400)
+            return get_user_activity, {'user_id': user_id_target, 'user_info': user_info}
+
+        # Обработка естественного языка для неизвестных типов
+        return self.handle_natural_language_query, {'user_input': user_input, 'user_info': user_info}
+
+    def json_response(self, ai_response, username):
+        # ✅ Ограничиваем длину ответа
+        ai_response = truncate_response(ai_response)
+
+        logger.info(f"AI response length: {len(ai_response)} chars for {username}")
+
+        return JsonResponse({
+            'response': ai_response,
+            'timestamp': timezone.now().isoformat()
+        })
+
+    def stream_response(self, events):
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать поток
+        return response
+
     def get_client_ip(self, request):
         """✅ Получает IP адрес клиента для rate limiting анонимных пользователей"""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -326,211 +389,55 @@ class ChatWithAIView(View):
         return ip
 
     def extract_username(self, user_input):
-        """
-        Извлекает имя пользователя из текста.
-
-        Для начинающих: этот метод использует регулярные выражения (regex)
-        для поиска имен пользователей в тексте запроса.
-        """
-        if not user_input:
-            return None
-
-        text = user_input.lower().strip()
-
-        # Стоп-слова которые НЕ являются именами пользователей
-        stop_words = ['имя', 'логин', 'ник', 'название', 'нейм']
-
-        # Паттерны для поиска имен пользователей
-        # Для начинающих: r'...' - это "сырая" строка, где \ не экранируется
-        patterns = [
-            r'найди?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
-            r'найти?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
-            r'ищи?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
-            r'искать?\s+(?:пользователя|юзера)\s+([a-zA-Z0-9_-]{2,})',
-            r'пользователь\s+([a-zA-Z0-9_-]{2,})',
-            r'профиль\s+([a-zA-Z0-9_-]{2,})',
-            r'@([a-zA-Z0-9_-]{2,})',
-            r'в\s+профиле\s+([a-zA-Z0-9_-]{2,})',
-            r'кто\s+такой\s+([a-zA-Z0-9_-]{2,})',
-            r'кто\s+такая\s+([a-zA-Z0-9_-]{2,})',
-            # ДОБАВЛЕНО: Простой паттерн для таких запросов как "найди user123"
-            r'найди\s+([a-zA-Z0-9_-]{2,})',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                username = match.group(1).lower()
-
-                # Проверки валидности
-                if len(username) < 2:  # Слишком короткое
-                    continue
-                if username.isdigit():  # Только цифры
-                    continue
-                if username in stop_words:  # Стоп-слово
-                    continue
-
-                return username
-
-        return None
+        """Извлекает имя пользователя из текста (см. intents.extract_username)."""
+        return intents.extract_username(user_input)
 
     def extract_keyword_for_posts(self, user_input):
         """
-        Извлекает ключевые слова для поиска постов.
-
-        Для начинающих: этот метод отличает общий поиск постов
-        от поиска постов конкретного пользователя.
+        Извлекает ключевые слова для поиска постов. None - если их нет или
+        это запрос постов конкретного пользователя (см. intents.extract_keyword).
         """
-        if not user_input:
-            return None
-
-        text = user_input.lower().strip()
-
-        # Проверяем, не является ли это запросом постов пользователя
-        user_posts_indicators = [
-            r'статьи\s+у\s+\w+',
-            r'посты\s+у\s+\w+',
-            r'какие\s+(?:статьи|посты)\s+у\s+\w+',
-            r'(?:статьи|посты)\s+пользователя\s+\w+',
-            r'(?:статьи|посты)\s+от\s+\w+',
-            r'что\s+писал\w*\s+\w+',
-        ]
-
-        for indicator in user_posts_indicators:
-            if re.search(indicator, text, re.IGNORECASE):
-                return None  # Это запрос постов пользователя
-
-        # Стоп-слова для ключевых слов
-        stop_words = ['текст', 'слово', 'и', 'или', 'а', 'в']
-
-        # ИСПРАВЛЕНО: Улучшенные паттерны для извлечения ключевых слов
-        patterns = [
-            # В скобках: (Django) или [Python]
-            r'[(\[](.*?)[)\]]',
-
-            # Паттерны с предлогами (захватывают всё до конца строки или знаков препинания)
-            r'(?:посты?|статьи|пост)\s+про\s+(.+?)(?:[!?.,:;]*$)',
-            r'(?:посты?|статьи|пост)\s+о\s+(.+?)(?:[!?.,:;]*$)',
-            r'(?:посты?|статьи|пост)\s+об\s+(.+?)(?:[!?.,:;]*$)',
-            r'найди?\s+(?:статьи|посты?)\s+по\s+теме\s+(.+?)(?:[!?.,:;]*$)',
-            r'покажи?\s+(?:статьи|посты?)\s+на\s+тему\s+(.+?)(?:[!?.,:;]*$)',
-
-            # ИСПРАВЛЕНО: Паттерны для действий с постами (захватывают всё после ключевого слова)
-            r'найди?\s+(?:пост|статьи|посты?)\s+(.+?)(?:[!?.,:;]*$)',
-            r'покажи?\s+(?:пост|статьи|посты?)\s+(.+?)(?:[!?.,:;]*$)',
-            r'ищи?\s+(?:пост|статьи|посты?)\s+(.+?)(?:[!?.,:;]*$)',
-
-            # НОВЫЙ: Простой паттерн для "пост + ключевое слово"
-            r'пост\s+(.+?)(?:[!?.,:;]*$)',
-            r'статьи?\s+(.+?)(?:[!?.,:;]*$)',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                keyword = match.group(1).strip()
-
-                # Очищаем от знаков препинания только в конце
-                keyword = re.sub(r'[!?.,:;]+$', '', keyword).strip()
-
-                # Дополнительная очистка для специфичных паттернов
-                # Убираем лишние предлоги из начала
-                keyword = re.sub(r'^(теме|тему)\s+', '', keyword).strip()
-
-                # Проверки валидности
-                if len(keyword) < 2:
-                    continue
-                if keyword.isdigit():  # Только цифры - не ключевое слово
-                    continue
-                if keyword.lower() in stop_words:
-                    continue
-                # Проверяем что не содержит только цифры с предлогами
-                if re.match(r'^(про|о|об)\s+\d+$', keyword):
-                    continue
-
-                return keyword.lower()
-
-        return None
+        return intents.extract_keyword(user_input)
 
     def handle_natural_language_query(self, user_input: str, user_info: dict) -> str:
         """Обрабатывает запросы на естественном языке."""
+        response, prompt = self.route_natural_language_query(user_input, user_info)
+        return response if prompt is None else get_gemini_response(prompt, 'general_chat')
 
-        lower_input = user_input.lower().strip()
-
+    def route_natural_language_query(self, user_input: str, user_info: dict):
+        """
+        Разбирает запрос на естественном языке. Возвращает (ответ, None), если
+        ответ готов без ИИ (данные сайта или шаблон, см. fast_path), или
+        (None, промпт) для общего чата - запрос к Gemini выполняет
+        вызывающий код.
+        """
         logger.info(f"Processing natural language query: '{user_input}' from {user_info.get('username', 'anonymous')}")
 
-        # ===============================
-        # КРИТИЧЕСКИ ВАЖНО: СНАЧАЛА ПРОВЕРЯЕМ ПОИСК ПОСТОВ ПОЛЬЗОВАТЕЛЯ
-        # ===============================
-
-        # Убираем markdown форматирование в самом начале
-        clean_input = re.sub(r'\*\*(.*?)\*\*', r'\1', user_input)
-        clean_lower = clean_input.lower().strip()
-
-        # СУПЕР-АГРЕССИВНАЯ проверка на поиск постов пользователя
-        user_posts_indicators = [
-            'статьи у', 'посты у', 'какие статьи у', 'какие посты у',
-            'статьи пользователя', 'посты пользователя',
-            'статьи от', 'посты от',
-            'что писал', 'что писала',
-            'статьи у пользователя', 'посты у пользователя'
-        ]
-
-        # Паттерны для извлечения имени (БЕЗ **форматирования**)
-        username_patterns = [
-            r'(?:статьи|посты)\s+у\s+([A-Za-z0-9_А-Яа-я-]+)',
-            r'(?:статьи|посты)\s+пользователя\s+([A-Za-z0-9_А-Яа-я-]+)',
-            r'что\s+(?:писал|писала)\s+([A-Za-z0-9_А-Яа-я-]+)',
-            r'какие\s+(?:статьи|посты)\s+у\s+([A-Za-z0-9_А-Яа-я-]+)',
-            r'(?:статьи|посты)\s+от\s+([A-Za-z0-9_А-Яа-я-]+)',
-            r'(?:статьи|посты)\s+у\s+пользователя\s+([A-Za-z0-9_А-Яа-я-]+)',
-            # Для "какие статьи Orange" (без предлогов)
-            r'какие\s+(?:статьи|посты)\s+([A-Za-z0-9_А-Яа-я-]+)(?:\s|$|\?)',
-        ]
-
-        # ПРОВЕРЯЕМ: содержит ли запрос индикаторы поиска постов пользователя?
-        contains_user_posts_indicator = any(indicator in clean_lower for indicator in user_posts_indicators)
-
-        # ДОПОЛНИТЕЛЬНАЯ проверка для "какие статьи Username"
-        if not contains_user_posts_indicator:
-            if re.search(r'какие\s+(?:статьи|посты)\s+[A-Za-z0-9_А-Яа-я-]+', clean_lower):
-                contains_user_posts_indicator = True
-
-        if contains_user_posts_indicator:
-            logger.info("DETECTED: User posts query - prioritizing user search")
+        # Намерение и его параметры - за один проход (см. intents)
+        intent = intents.classify(user_input)
+        response, prompt = self.answer_intent(intent, user_input, user_info)
+        fast_path.record(intent.name, fast_path.LOCAL if prompt is None else fast_path.LLM)
+        return response, prompt
 
-            # Пытаемся извлечь имя пользователя
-            username = None
-            for pattern in username_patterns:
-                match = re.search(pattern, clean_input, re.IGNORECASE)
-                if match:
-                    username = match.group(1)
-                    logger.info(f"Extracted username: '{username}' via pattern: {pattern}")
-                    break
-
-            # Если не нашли через паттерны, пробуем другой способ
-            if not username:
-                words = clean_input.split()
-                for i, word in enumerate(words):
-                    if word.lower() in ['статьи', 'посты']:
-                        # Ищем следующее слово после статьи/посты, пропуская служебные
-                        for j in range(i + 1, len(words)):
-                            next_word = words[j].strip('?!.,')
-                            if (next_word.lower() not in ['у', 'от', 'пользователя', 'про', 'о', 'об', 'по', 'с'] and
-                                    len(next_word) > 1 and re.match(r'^[A-Za-z0-9_А-Яа-я-]+$', next_word)):
-                                username = next_word
-                                logger.info(f"Extracted username via fallback: '{username}'")
-                                break
-                        if username:
-                            break
+    def answer_intent(self, intent, user_input: str, user_info: dict):
+        """Ответ на распознанное намерение - как у route_natural_language_query."""
+        slots = intent.slots
+
+        # Поиск постов пользователя проверяется первым
+        if intent.name == intents.USER_POSTS:
+            logger.info("DETECTED: User posts query - prioritizing user search")
+            username = slots['username']
 
             # Если найден пользователь - ищем его посты
             if username:
+                logger.info(f"Extracted username: '{username}'")
                 try:
                     from posts.models import Post
-                    from users.models import CustomUser
+                    from users.lookup import lookup_user
 
-                    user = CustomUser.objects.get(username__iexact=username)
+                    user, suggestions = lookup_user(username)
+                    if user is None:
+                        return f"❌ Пользователь '{username}' не найден.{format_username_suggestions(suggestions)}", None
                     user_posts = Post.objects.filter(author=user).order_by('-pub_date')[:10]
 
                     if user_posts.exists():
@@ -544,15 +451,13 @@ class ChatWithAIView(View):
                             posts_info.append(f"• **{post.title}**\n  Ссылка: {post_url}")
 
                         posts_list = "\n\n".join(posts_info)
-                        return f"📝 **Посты пользователя @{username}:**\n\n{posts_list}\n\n💡 Чтобы узнать больше о конкретном посте, напиши: 'Расскажи о посте [ID]'"
+                        return f"📝 **Посты пользователя @{username}:**\n\n{posts_list}\n\n💡 Чтобы узнать больше о конкретном посте, напиши: 'Расскажи о посте [ID]'", None
                     else:
-                        return f"📝 У пользователя @{username} пока нет опубликованных постов."
+                        return f"📝 У пользователя @{username} пока нет опубликованных постов.", None
 
-                except CustomUser.DoesNotExist:
-                    return f"❌ Пользователь '{username}' не найден."
                 except Exception as e:
                     logger.error(f"Error searching posts by user {username}: {e}")
-                    return f"❌ Ошибка при поиске постов пользователя {username}: {e}"
+                    return f"❌ Ошибка при поиске постов пользователя {username}: {e}", None
             else:
                 # Если не удалось извлечь имя пользователя из запроса с индикаторами
                 return """🔍 Не удалось определить пользователя. Попробуйте:
@@ -561,122 +466,62 @@ class ChatWithAIView(View):
     • 'Какие статьи у Orange?'
     • 'Посты пользователя Alek'  
     • 'Что писал Orange?'
-    • 'Статьи от Orange'"""
-
-        # ===============================
-        # ТОЛЬКО ПОСЛЕ проверки пользователей - общий поиск постов
-        # ===============================
+    • 'Статьи от Orange'""", None
 
-        general_post_search_patterns = [
-            'найди пост', 'найти пост', 'ищи пост', 'искать пост',
-            'найди стать', 'найти стать', 'покажи пост',
-            'найди посты про', 'найти посты про', 'ищи посты про'
-        ]
-
-        if any(pattern in lower_input for pattern in general_post_search_patterns):
-            logger.info("Detected general post search query")
-            keyword = self.extract_keyword_for_posts(user_input)
-            if keyword:  # Если ключевое слово найдено (не None)
-                logger.info(f"Searching posts with keyword: '{keyword}'")
-                return find_post_by_keyword(keyword, user_info)
-            # Если keyword is None, ничего не делаем, позволяем запросу пройти к следующим блокам
+        # === ПОИСК ПОСТОВ ===
+        if intent.name == intents.POST_SEARCH:
+            logger.info(f"Searching posts with keyword: '{slots['keyword']}'")
+            return find_post_by_keyword(slots['keyword'], user_info), None
 
         # === ДЕТАЛИ ПОСТА ===
-        post_detail_patterns = [
-            'расскажи о посте', 'пост номер', 'пост id', 'детали поста',
-            'покажи пост', 'что в посте', 'открой пост'
-        ]
-
-        if any(pattern in lower_input for pattern in post_detail_patterns):
-            numbers = re.findall(r'\d+', user_input)
-            if numbers:
-                try:
-                    post_id = int(numbers[0])
-                    logger.info(f"Getting post details for ID: {post_id}")
-                    return get_post_details(post_id, user_info)
-                except ValueError:
-                    pass
-
-            return "🔢 Укажите ID поста. Например: 'Расскажи о посте 5' или 'Покажи пост 123'"
+        if intent.name == intents.POST_DETAILS:
+            if slots['post_id'] is not None:
+                logger.info(f"Getting post details for ID: {slots['post_id']}")
+                return get_post_details(slots['post_id'], user_info), None
+            return "🔢 Укажите ID поста. Например: 'Расскажи о посте 5' или 'Покажи пост 123'", None
 
         # === ПОИСК ПОЛЬЗОВАТЕЛЕЙ ===
-        user_search_patterns = [
-            'найди пользователя', 'найти пользователя', 'ищи пользователя',
-            'найди юзера', 'профиль', 'кто такой'
-        ]
-
-        if any(pattern in lower_input for pattern in user_search_patterns):
-            username = self.extract_username(user_input)
-            if username:
-                logger.info(f"Searching user: '{username}'")
-                return find_user_by_username(username, user_info)
+        if intent.name == intents.USER_SEARCH:
+            if slots['username']:
+                logger.info(f"Searching user: '{slots['username']}'")
+                return find_user_by_username(slots['username'], user_info), None
             else:
-                return "❌ Не удалось извлечь имя пользователя. Попробуйте: 'Найди пользователя [имя]'"
+                return "❌ Не удалось извлечь имя пользователя. Попробуйте: 'Найди пользователя [имя]'", None
 
         # === АКТИВНОСТЬ ПОЛЬЗОВАТЕЛЯ ===
-        activity_patterns = [
-            'что нового у', 'активность пользователя', 'что делает',
-            'последние посты', 'недавняя активность'
-        ]
-
-        if any(pattern in lower_input for pattern in activity_patterns):
-            numbers = re.findall(r'\d+', user_input)
-            if numbers:
+        if intent.name == intents.USER_ACTIVITY:
+            if slots['user_id'] is not None:
+                logger.info(f"Getting user activity for ID: {slots['user_id']}")
+                return get_user_activity(slots['user_id'], user_info), None
+
+            username = slots['username']
+            if username:
                 try:
-                    user_id = int(numbers[0])
-                    logger.info(f"Getting user activity for ID: {user_id}")
-                    return get_user_activity(user_id, user_info)
-                except ValueError:
-                    pass
-
-            username_patterns = [
-                r'что\s+нового\s+у\s+(\w+)',
-                r'активность\s+пользователя\s+(\w+)',
-                r'что\s+делает\s+(\w+)'
-            ]
+                    from users.lookup import lookup_user
+                    user, suggestions = lookup_user(username)
+                    if user is None:
+                        return f"❌ Пользователь '{username}' не найден.{format_username_suggestions(suggestions)}", None
+                    return get_user_activity(user.id, user_info), None
+                except Exception as e:
+                    logger.error(f"Error getting user activity: {e}")
+                    return f"❌ Ошибка: {e}", None
 
-            for pattern in username_patterns:
-                match = re.search(pattern, lower_input)
-                if match:
-                    username = match.group(1)
-                    try:
-                        from users.models import CustomUser
-                        user = CustomUser.objects.get(username__iexact=username)
-                        return get_user_activity(user.id, user_info)
-                    except CustomUser.DoesNotExist:
-                        return f"❌ Пользователь '{username}' не найден."
-                    except Exception as e:
-                        logger.error(f"Error getting user activity: {e}")
-                        return f"❌ Ошибка: {e}"
-
-            return "👤 Укажите пользователя. Например: 'Что нового у пользователя 1?' или 'Активность Orange'"
+            return "👤 Укажите пользователя. Например: 'Что нового у пользователя 1?' или 'Активность Orange'", None
 
         # === РЕКОМЕНДАЦИИ ===
-        recommendation_patterns = [
-            'кого почитать', 'рекомендации', 'посоветуй авторов',
-            'интересные авторы', 'на кого подписаться'
-        ]
-
-        if any(pattern in lower_input for pattern in recommendation_patterns):
+        if intent.name == intents.RECOMMENDATIONS:
             logger.info("Getting subscription recommendations")
             current_user_id = user_info.get('user_id') if user_info.get('is_authenticated') else None
-            return get_subscription_recommendations(user_info, current_user_id)
+            return get_subscription_recommendations(user_info, current_user_id), None
+
+        # === КОРОТКИЕ РЕПЛИКИ ===
+        if intent.name in intents.SMALL_TALK:
+            return fast_path.small_talk_answer(intent.name, user_info), None
 
         # === ОБЩИЙ ЧАТ ===
         logger.info(f"Processing as general chat: '{user_input}'")
 
-        help_suggestions = []
-
-        if 'пользователь' in lower_input or 'юзер' in lower_input:
-            help_suggestions.append("💡 Для поиска пользователя: 'Найди пользователя [имя]'")
-
-        if 'пост' in lower_input or 'стать' in lower_input:
-            help_suggestions.append("💡 Для поиска постов: 'Найди посты про [тема]'")
-            help_suggestions.append("💡 Для деталей поста: 'Расскажи о посте [ID]'")
-            help_suggestions.append("💡 Для поиска в скобках: 'Найди пост (ключевое слово)'")
-
-        if 'рекоменд' in lower_input or 'совет' in lower_input:
-            help_suggestions.append("💡 Для рекомендаций: 'Кого почитать?'")
+        help_suggestions = [suggestion for hint in intent.hints for suggestion in HELP_SUGGESTIONS[hint]]
 
         prompt = f"""Пользователь {user_info.get('username')} пишет: '{user_input}'
         Контекст: социальная сеть Chatty Orange.
@@ -692,7 +537,7 @@ class ChatWithAIView(View):
         - "Кого почитать?" - для рекомендаций
         """
 
-        return get_gemini_response(prompt)
+        return None, prompt
 
     def get(self, request, *args, **kwargs):
         """Информация об API."""
@@ -701,7 +546,7 @@ class ChatWithAIView(View):
             'version': '2.2',  # ✅ Обновили версию
             'status': 'active',
             'security': 'CSRF + Rate Limiting enabled',  # ✅ Показываем что защищено
-            'rate_limit': '15 requests per minute',
+            'rate_limit': '30 requests per minute, 15 per action, 5 for expensive actions',
             'endpoints': {
                 'faq': 'Ответы на вопросы о сайте',
                 'feature_explanation': 'Объяснение функций',
@@ -729,18 +574,102 @@ class ChatWithAIView(View):
         })
 
     def save_usage_stats(self, action_type, user_info, user_identifier):
-        """✅ УЛУЧШЕННАЯ статистика использования ИИ"""
+        """
+        Запись о запросе в лог. Обращения к ИИ (время, размеры, кэш, исход)
+        пишутся в журнал AIUsageLog при самом вызове Gemini, см. usage.
+        """
         try:
-            # Логируем более подробную статистику
             logger.info(
                 f"AI usage: action={action_type}, "
                 f"user={user_info.get('username', 'anonymous')}, "
                 f"identifier={user_identifier}, "
                 f"auth={user_info.get('is_authenticated', False)}"
             )
+        except Exception as e:
+            logger.warning(f"Ошибка при сохранении статистики: {e}")
+
+
+@method_decorator(ensure_csrf_cookie, name='dispatch')
+class AsyncChatWithAIView(ChatWithAIView):
+    """
+    Асинхронный вариант ChatWithAIView для ASGI (настройка ASSISTANT_ASYNC_VIEW).
+
+    Ожидание ответа Gemini не занимает поток, поэтому один процесс держит
+    сотни одновременных чатов. Разбор запроса и выбор действия - общие с
+    синхронным представлением. Поиск постов, активность пользователя и
+    анализ профиля идут через async ORM и асинхронный клиент ИИ; остальные
+    синхронные части (Redis, прочие запросы к БД) - в потоке через
+    sync_to_async.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Минуя синхронный dispatch родителя: ensure_csrf_cookie должен
+        # обернуть корутину, а не синхронную функцию
+        return await View.dispatch(self, request, *args, **kwargs)
 
-            # Здесь можно добавить сохранение в БД для детальной аналитики
-            # Например: AIUsageLog.objects.create(...)
+    async def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            user = await request.auser()
+            prepared = await sync_to_async(self.prepare_request)(request, user)
+            if isinstance(prepared, JsonResponse):
+                return prepared
+            usage.bind_user(prepared['user_info']['user_id'])
 
+            # Обработка различных типов действий
+            try:
+                action = self.resolve_action(prepared)
+                if isinstance(action, JsonResponse):
+                    return action
+                if isinstance(action, str):
+                    ai_response = action
+                else:
+                    handler, handler_kwargs = action
+                    async_handler = self.get_async_handler(prepared['action_type'])
+                    if async_handler is not None:
+                        ai_response = await async_handler(**handler_kwargs)
+                    else:
+                        ai_response = await sync_to_async(handler)(**handler_kwargs)
+            except Exception as action_error:
+                logger.error(f"Ошибка при выполнении действия {prepared['action_type']}: {action_error}")
+                ai_response = f"Произошла ошибка при выполнении запроса. Попробуйте позже! 🍊"
+
+            # Сохраняем статистику использования (опционально)
+            self.save_usage_stats(prepared['action_type'], prepared['user_info'], prepared['user_identifier'])
+
+            if prepared['stream']:
+                return self.stream_response(aevent_stream(ai_response, f"for {prepared['username']}"))
+            return self.json_response(ai_response, prepared['username'])
+
+        except json.JSONDecodeError:
+            logger.error("JSON decode error in AsyncChatWithAIView")
+            return JsonResponse({'error': 'Неверный формат данных'}, status=400)
         except Exception as e:
-            logger.warning(f"Ошибка при сохранении статистики: {e}")
\ No newline at end of file
+            logger.error(f"Unexpected error in AsyncChatWithAIView: {e}")
+            return JsonResponse({'error': 'Внутренняя ошибка сервера'}, status=500)
+
+    def get_async_handler(self, action_type):
+        """
+        Асинхронный обработчик действия с теми же аргументами, что и у
+        синхронного из resolve_action, или None - тогда синхронный
+        обработчик выполняется в потоке.
+        """
+        return {
+            'faq': aget_faq_answer,
+            'feature_explanation': aget_feature_explanation,
+            'general_chat': self.ahandle_natural_language_query,
+            'post_creation_suggestion': aget_post_creation_suggestion,
+            'check_post_content': acheck_post_content,
+            'analyze_profile': aanalyze_profile_stats,
+            'generate_post_ideas': agenerate_post_ideas,
+            'analyze_sentiment': aanalyze_sentiment,
+            'find_post_by_keyword': afind_post_by_keyword,
+            'get_user_activity': aget_user_activity,
+        }.get(action_type or 'general_chat')
+
+    async def ahandle_natural_language_query(self, user_input: str, user_info: dict) -> str:
+        """Асинхронный вариант handle_natural_language_query: разбор - в потоке, Gemini - асинхронно."""
+        response, prompt = await sync_to_async(self.route_natural_language_query)(user_input, user_info)
+        return response if prompt is None else await aget_gemini_response(prompt, 'general_chat')
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from .models import Post, Comment, Tag, PostImage # Добавлен PostImage
+from .counters import refresh_counters
 
 # Используем CKEditor виджет для поля text в админке
 from django.db import models
@@ -80,15 +81,15 @@ class PostAdmin(admin.ModelAdmin):
     display_first_image_thumbnail.short_description = "Превью"
 
     def comment_count_display(self, obj):
-        return obj.comments.count()
+        return obj.comments_count
     comment_count_display.short_description = "Коммент."
 
     def like_count_display(self, obj):
-        return obj.likes.count()
+        return obj.likes_count
     like_count_display.short_description = "Лайки"
 
     def dislike_count_display(self, obj):
-        return obj.dislikes.count()
+        return obj.dislikes_count
     dislike_count_display.short_description = "Дизлайки"
 
     def tag_list_display(self, obj):
@@ -137,10 +138,13 @@ class CommentAdmin(admin.ModelAdmin):
 
     def mark_as_active(self, request, queryset):
         queryset.update(is_active=True)
+        # update() не вызывает сигналы - пересчитываем счетчики вручную
+        refresh_counters(queryset.values_list('post_id', flat=True), fields=('comments_count',))
     mark_as_active.short_description = "Одобрить выбранные комментарии"
 
     def mark_as_inactive(self, request, queryset):
         queryset.update(is_active=False)
+        refresh_counters(queryset.values_list('post_id', flat=True), fields=('comments_count',))
     mark_as_inactive.short_description = "Отклонить выбранные комментарии"
 
 # Не забываем зарегистрировать PostImage, если хотим управлять ими отдельно
@@ -0,0 +1,141 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# posts/cards.py
+"""
+Данные карточек постов в лентах (post_list.html, subscriptions/feed.html)
+и в профиле: всё, что шаблон карточки берет у поста, загружается для
+страницы целиком постоянным числом запросов, а не запросами на каждый пост.
+
+- автор - select_related в запросе страницы (card_queryset); полный
+  текст, его очищенный HTML, текст без разметки и поисковый вектор из БД
+  не читаются - карточка показывает Post.excerpt;
+- изображения по порядку и теги - по одному запросу на страницу
+  (Prefetch с to_attr: post.card_images, post.card_tags), число
+  изображений - post.images_count;
+- состояние кнопок зрителя - post.viewer_reaction, одним запросом на
+  страницу (posts.reactions.reaction_context).
+
+Лайки, дизлайки и комментарии карточка показывает из колонок-счетчиков поста.
+
+В лентах тело карточки (заголовок с подсветкой поиска, начало текста, теги,
+галерея изображений) одинаково для всех зрителей, поэтому рендерится один
+раз и хранится в кэше fragments под ключом (шаблон, id поста,
+Post.card_version, параметры страницы - фильтр). Карточки страниц поиска
+с подсветкой запроса не кэшируются: набор запросов не ограничен. Все
+тела страницы читаются одним get_many; изображения и теги загружаются
+только для промахов. Версия карточки увеличивается при сохранении поста и
+изменении его изображений и тегов (posts.signals), так что устаревшие тела
+просто перестают запрашиваться. Шапка с автором и кнопкой редактирования и
+подвал со счетчиками и реакциями зрителя рендерятся поверх на каждый запрос.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Post, PostImage, Tag
+from .reactions import reaction_context
+
+CACHE_ALIAS = 'fragments'
+POST_CARD_CACHE_TIMEOUT = 60 * 10
+CARD_DEFERRED_FIELDS = ('text', 'text_html', 'text_plain', 'search_vector')
+
+
+def card_queryset(queryset):
+    return queryset.select_related('author').defer(*CARD_DEFERRED_FIELDS)
+
+
+def card_prefetches():
+    return (
+        Prefetch('images', queryset=PostImage.objects.order_by('order', 'pk'), to_attr='card_images'),
+        Prefetch('tags', queryset=Tag.objects.order_by('name'), to_attr='card_tags'),
+    )
+
+
+def load_post_cards(posts):
+    """
+    Догружает данные карточек для страницы posts (список постов с
+    автором из card_queryset) и возвращает этот же список. Реакции
+    зрителя не загружаются - они у каждого свои, см. reaction_context.
+    """
+    posts = list(posts)
+    prefetch_related_objects(posts, *card_prefetches())
+    for post in posts:
+        post.images_count = len(post.card_images)
+    return posts
+
+
+def bump_card_version(post_ids):
+    """Карточки постов post_ids изменились - закэшированные тела больше не подходят."""
+    Post.objects.filter(pk__in=post_ids).update(card_version=F('card_version') + 1)
+
+
+def _card_key(template_name, post, page_params):
+    params = hashlib.sha256(json.dumps(page_params, sort_keys=True).encode()).hexdigest()[:16]
+    return f'post_card:{template_name}:{post.pk}:{post.card_version}:{params}'
+
+
+def render_card_bodies(posts, template_name, page_params):
+    """
+    Тела карточек постов posts (шаблон template_name с post и page_params в
+    контексте) - в post.card_body. Возвращает список posts.
+    """
+    posts = list(posts)
+    if page_params.get('search_query'):
+        # Подсветка зависит от произвольного запроса - такие тела не кэшируются
+        for post in load_post_cards(posts):
+            post.card_body = mark_safe(render_to_string(template_name, {'post': post, **page_params}))
+        return posts
+
+    cache = caches[CACHE_ALIAS]
+    keys = {post.pk: _card_key(template_name, post, page_params) for post in posts}
+    bodies = cache.get_many(list(keys.values()))
+
+    missing = load_post_cards(post for post in posts if keys[post.pk] not in bodies)
+    rendered = {
+        keys[post.pk]: render_to_string(template_name, {'post': post, **page_params})
+        for post in missing
+    }
+    if rendered:
+        cache.set_many(rendered, getattr(settings, 'POST_CARD_CACHE_TIMEOUT', POST_CARD_CACHE_TIMEOUT))
+    bodies.update(rendered)
+
+    for post in posts:
+        post.card_body = mark_safe(bodies[keys[post.pk]])
+    return posts
+
+
+class PostCardsMixin:
+    """
+    Подмешивается к ListView постов: тела карточек страницы - через
+    render_card_bodies (шаблон card_body_template), реакции зрителя -
+    через reaction_context.
+    """
+    card_body_template = None
+
+    def get_card_params(self):
+        """Параметры страницы, от которых зависит тело карточки (не от зрителя)."""
+        return {}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        posts = render_card_bodies(context['object_list'], self.card_body_template, self.get_card_params())
+        context.update(reaction_context(self.request.user, posts))
+        return context
@@ -0,0 +1,120 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# posts/content.py
+"""
+Обработка текста поста при записи.
+
+Post.text приходит из CKEditor (allowedContent: True - редактор пропускает
+любую разметку). Исходный HTML автора хранится как есть, а при сохранении
+поста (Post.save) из него вычисляются:
+
+- Post.text_html - HTML, очищенный bleach до разметки, которую умеет
+  выдавать панель инструментов; его показывает страница поста;
+- Post.text_plain - текст без разметки, по нему ищут посты (posts.search);
+- Post.excerpt - начало текста фиксированной длины для карточек в лентах.
+
+Стили (цвет, фон, выравнивание, шрифт) проверяет CSSSanitizer bleach - он
+требует tinycss2 (bleach[css] в requirements.txt).
+"""
+import threading
+from html.parser import HTMLParser
+
+import bleach
+from django.utils.text import Truncator
+
+from bleach.css_sanitizer import CSSSanitizer
+
+EXCERPT_LENGTH = 300
+
+ALLOWED_TAGS = {
+    'p', 'br', 'div', 'span', 'hr', 'pre', 'code', 'blockquote',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'strong', 'b', 'em', 'i', 'u', 's', 'strike', 'sub', 'sup',
+    'a', 'ul', 'ol', 'li', 'img',
+    'table', 'caption', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': ['class', 'style'],
+    'a': ['href', 'title', 'target', 'rel'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'table': ['border', 'cellpadding', 'cellspacing'],
+    'td': ['colspan', 'rowspan'],
+    'th': ['colspan', 'rowspan', 'scope'],
+}
+ALLOWED_PROTOCOLS = {'http', 'https', 'mailto'}
+ALLOWED_CSS_PROPERTIES = {
+    'color', 'background-color', 'text-align', 'font-family', 'font-size',
+    'margin-left', 'width', 'height', 'float',
+}
+
+# Теги, которые в тексте без разметки отделяются пробелом от соседних слов
+BLOCK_TAGS = {
+    'p', 'br', 'div', 'hr', 'pre', 'blockquote', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li', 'table', 'caption', 'tr', 'th', 'td',
+}
+
+
+def _make_cleaner():
+    return bleach.Cleaner(
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=ALLOWED_PROTOCOLS,
+        css_sanitizer=CSSSanitizer(allowed_css_properties=ALLOWED_CSS_PROPERTIES),
+        strip=True,
+    )
+
+
+# bleach.Cleaner не рассчитан на общий доступ из нескольких потоков -
+# у каждого потока свой
+_local = threading.local()
+
+
+class _TextExtractor(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def sanitize_html(html):
+    """HTML текста поста только с разрешенными тегами, атрибутами и ссылками."""
+    if not hasattr(_local, 'cleaner'):
+        _local.cleaner = _make_cleaner()
+    return _local.cleaner.clean(html or '')
+
+
+def html_to_text(html):
+    """Текст без разметки: блоки разделены пробелами, пробелы схлопнуты."""
+    extractor = _TextExtractor()
+    extractor.feed(html or '')
+    extractor.close()
+    return ' '.join(''.join(extractor.parts).split())
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """Начало текста не длиннее length символов (с многоточием, если обрезано)."""
+    return Truncator(text).chars(length, truncate='…')
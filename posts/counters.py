@@ -0,0 +1,67 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# posts/counters.py
+"""
+Денормализованные счетчики поста (лайки, дизлайки, активные комментарии).
+
+Списки постов читают готовые колонки Post.likes_count / dislikes_count /
+comments_count вместо Count() по трем связанным таблицам. Здесь собраны
+выражения для точного пересчета и функции, которыми пользуются сигналы,
+админка и команда reconcile_post_counters.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Post, Comment, POST_COUNTER_FIELDS as COUNTER_FIELDS
+
+
+def _count_subquery(queryset, field):
+    """Коррелированный подзапрос COUNT(*) по строкам, относящимся к посту."""
+    counted = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        total=Count('*')
+    ).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def expected_counters():
+    """Выражения с «правильными» значениями счетчиков для annotate()/update()."""
+    return {
+        'likes_count': _count_subquery(Post.likes.through.objects.all(), 'post'),
+        'dislikes_count': _count_subquery(Post.dislikes.through.objects.all(), 'post'),
+        'comments_count': _count_subquery(Comment.objects.filter(is_active=True), 'post'),
+    }
+
+
+def refresh_counters(post_ids=None, fields=COUNTER_FIELDS):
+    """
+    Пересчитывает счетчики одним UPDATE с подзапросами.
+    Если post_ids не передан, пересчитываются все посты.
+    """
+    queryset = Post.objects.all()
+    if post_ids is not None:
+        queryset = queryset.filter(pk__in=list(post_ids))
+    expressions = expected_counters()
+    return queryset.update(**{field: expressions[field] for field in fields})
+
+
+def increment_counter(post_ids, field, delta=1):
+    """Атомарно сдвигает счетчик через F-выражение (без чтения строки в Python)."""
+    expression = F(field) + delta
+    if delta < 0:
+        # Не уходим в минус, даже если счетчик успел разойтись с реальностью
+        expression = Greatest(expression, Value(0))
+    return Post.objects.filter(pk__in=list(post_ids)).update(**{field: expression})
@@ -0,0 +1,81 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# posts/highlight.py
+"""
+Подсветка слов поискового запроса в HTML (фильтр highlight в
+posts/templatetags/highlight.py).
+
+Все слова запроса (и фраза целиком, если слов несколько) собираются в одно
+регулярное выражение-альтернацию, скомпилированное один раз на запрос
+(lru_cache). Текст проходится за один проход: тег или HTML-сущность на
+очередной позиции выражение пропускает целиком, поэтому подсвечивается только
+текст между тегами - атрибуты, имена тегов и &amp; не портятся, а уже
+вставленная подсветка повторно не сканируется. Длинные варианты стоят в
+альтернации раньше коротких, так что фраза выигрывает у своих слов.
+"""
+import re
+from functools import lru_cache
+from html import escape
+
+HIGHLIGHT_TEMPLATE = '<mark class="highlight">{}</mark>'
+# Тег или сущность - их пропускаем целиком
+MARKUP = r'<[^>]*>|&#?\w+;'
+
+
+def search_terms(query):
+    """
+    Что подсвечивать: слова запроса длиннее одной буквы (числа - любые) и
+    фраза целиком, если слов несколько. Без повторов, длинные первыми.
+    """
+    words = [word for word in re.findall(r'\w+', query) if len(word) > 1 or word.isdigit()]
+    phrase = ' '.join(query.split())
+    terms = {term.casefold(): term for term in ([phrase] if len(words) > 1 else []) + words}
+    return sorted(terms.values(), key=len, reverse=True)
+
+
+@lru_cache(maxsize=256)
+def highlight_pattern(query):
+    """Скомпилированное выражение для запроса или None, если подсвечивать нечего."""
+    terms = search_terms(query)
+    if not terms:
+        return None
+    # Текст, в котором ищем, экранирован conditional_escape (вместе с
+    # кавычками) - экранируем слова так же
+    escaped = [escape(term) for term in terms]
+    alternation = '|'.join(re.escape(term) for term in escaped)
+    # Опережающая проверка первого символа отсекает большинство позиций,
+    # не перебирая альтернативы. Слова проверяются раньше разметки: фраза
+    # может начинаться с сущности (&quot;), а с «<» экранированное слово не начнется
+    first_chars = ''.join(sorted({re.escape(term[0]) for term in escaped}))
+    return re.compile(f'(?=[<&{first_chars}])(?:({alternation})|(?:{MARKUP})+)', re.IGNORECASE)
+
+
+def _replace(match):
+    if match.group(1) is None:  # теги и сущности подряд - без изменений
+        return match.group(0)
+    return HIGHLIGHT_TEMPLATE.format(match.group(0))
+
+
+def highlight_html(html, query):
+    """HTML html с подсвеченными словами query (строка или список слов)."""
+    if not html or not query:
+        return html
+    if not isinstance(query, str):
+        query = ' '.join(str(part) for part in query)
+    pattern = highlight_pattern(query)
+    if pattern is None:
+        return html
+    return pattern.sub(_replace, html)
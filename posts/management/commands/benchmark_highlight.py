@@ -0,0 +1,130 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import random
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.highlight import highlight_html, highlight_pattern
+
+MARKUP_TAG = re.compile(r'<[^>]*>')
+HIGHLIGHT_TAGS = {'<mark class="highlight">', '</mark>', '<span class="highlight">', '</span>'}
+
+WORDS = (
+    "апельсин мандарин сок утро город река путешествие поезд море рецепт пирог "
+    "сахар мука python django redis запрос сервер страница автор подписка лента "
+    "orange chatty music лето осень зима весна книга фильм кофе чай код тест"
+).split()
+
+
+def legacy_highlight_tags(text, query):
+    """Прежний фильтр из highlight_tags.py: по re.sub на каждое слово."""
+    if len(query) == 1 and not query.isdigit():
+        return text
+    words = [word for word in re.findall(r'\b\w+\b', query) if len(word) > 1 or word.isdigit()]
+    highlighted = str(text)
+    for word in words:
+        pattern = re.compile(re.escape(word), re.IGNORECASE)
+        highlighted = pattern.sub(lambda m: f'<span class="highlight">{m.group(0)}</span>', highlighted)
+    return highlighted
+
+
+def legacy_highlight(text, query):
+    """Прежний фильтр из highlight.py: фраза, затем по re.sub на каждое слово."""
+    highlighted = re.sub(
+        f'({re.escape(query)})', r'<mark class="highlight">\1</mark>', str(text), flags=re.IGNORECASE
+    )
+    for word in query.split():
+        highlighted = re.sub(
+            f'({re.escape(word)})', r'<mark class="highlight">\1</mark>', highlighted, flags=re.IGNORECASE
+        )
+    return highlighted
+
+
+def synthetic_post(rng, size):
+    """HTML в духе CKEditor: абзацы, выделения, ссылки и сущности."""
+    parts = []
+    length = 0
+    while length < size:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 60))]
+        words[rng.randrange(len(words))] = f'<strong>{rng.choice(WORDS)}</strong>'
+        words[rng.randrange(len(words))] = f'<a href="/posts/tag/{rng.choice(WORDS)}/">{rng.choice(WORDS)}</a>'
+        words[rng.randrange(len(words))] = '&amp;'
+        paragraph = f'<p class="text-{rng.choice(WORDS)}">{" ".join(words)}</p>'
+        parts.append(paragraph)
+        length += len(paragraph)
+    return ''.join(parts)
+
+
+def markup(html):
+    """Теги поста без вставленной подсветки - у корректной подсветки совпадают с исходными."""
+    return [tag for tag in MARKUP_TAG.findall(html) if tag not in HIGHLIGHT_TAGS]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет подсветку поискового запроса (posts.highlight) на больших "
+        "постах в сравнении с прежними фильтрами highlight и highlight_tags."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50, help='Сколько синтетических постов')
+        parser.add_argument('--size', type=int, default=50_000, help='Размер поста в символах')
+        parser.add_argument('--terms', type=int, default=10, help='Слов в запросе')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        posts = [synthetic_post(rng, options['size']) for _ in range(options['posts'])]
+        queries = [' '.join(rng.sample(WORDS, options['terms'])) for _ in posts]
+        self.stdout.write(
+            f"{len(posts)} постов по ~{options['size'] // 1000} КБ, запросы по {options['terms']} слов"
+        )
+
+        highlight_pattern.cache_clear()
+        medians = {}
+        for title, highlighter in (
+            ('highlight_tags (прежний)', legacy_highlight_tags),
+            ('highlight (прежний)', legacy_highlight),
+            ('posts.highlight', highlight_html),
+        ):
+            medians[title] = self._report(title, posts, queries, highlighter)
+
+        current = medians['posts.highlight']
+        for title, median in medians.items():
+            if title != 'posts.highlight':
+                self.stdout.write(f"posts.highlight быстрее, чем {title}, в {median / current:.1f} раза")
+
+    def _report(self, title, posts, queries, highlighter):
+        timings = []
+        broken = 0
+        for post, query in zip(posts, queries):
+            started = time.perf_counter()
+            result = highlighter(post, query)
+            timings.append((time.perf_counter() - started) * 1000)
+            broken += markup(result) != markup(post)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        median = statistics.median(timings)
+        self.stdout.write(
+            f"{title}: медиана {median:.2f} мс, p95 {p95:.2f} мс, максимум {timings[-1]:.2f} мс "
+            f"({len(timings)} постов, испорчена разметка в {broken})"
+        )
+        return median
@@ -0,0 +1,63 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from posts.counters import COUNTER_FIELDS, expected_counters, refresh_counters
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет денормализованные счетчики постов (лайки, дизлайки, комментарии) "
+        "с реальными данными и исправляет расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать посты с расхождениями, ничего не изменяя',
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            f'expected_{field}': expression
+            for field, expression in expected_counters().items()
+        }
+        mismatch = Q()
+        for field in COUNTER_FIELDS:
+            mismatch |= ~Q(**{field: F(f'expected_{field}')})
+
+        drifted_ids = list(
+            Post.objects.annotate(**expected).filter(mismatch).values_list('pk', flat=True)
+        )
+
+        if not drifted_ids:
+            self.stdout.write(self.style.SUCCESS("Все счетчики постов актуальны."))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"Расхождения найдены у {len(drifted_ids)} постов: "
+                f"{', '.join(str(pk) for pk in drifted_ids[:50])}"
+                f"{'...' if len(drifted_ids) > 50 else ''}"
+            )
+            return
+
+        updated = refresh_counters(drifted_ids)
+        self.stdout.write(self.style.SUCCESS(f"Исправлены счетчики у {updated} постов."))
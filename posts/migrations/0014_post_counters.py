@@ -0,0 +1,49 @@
+# Generated by Django 5.1.5 on 2025-06-02 10:14
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет новые колонки реальными значениями для уже существующих постов."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+
+    def count_of(queryset):
+        counted = queryset.filter(post=OuterRef('pk')).order_by().values('post').annotate(
+            total=Count('*')
+        ).values('total')
+        return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+    Post.objects.update(
+        likes_count=count_of(Post.likes.through.objects.all()),
+        dislikes_count=count_of(Post.dislikes.through.objects.all()),
+        comments_count=count_of(Comment.objects.filter(is_active=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество лайков'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество дизлайков'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.5 on 2025-06-04 18:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Вектор строится из заголовка (вес A) и текста без HTML-разметки CKEditor (вес B)
+CREATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION posts_post_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.russian',
+            coalesce(regexp_replace(NEW.text, '<[^>]*>', ' ', 'g'), '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_post_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, text ON posts_post
+    FOR EACH ROW EXECUTE FUNCTION posts_post_search_vector_update();
+
+CREATE INDEX posts_post_search_vector_gin ON posts_post USING gin (search_vector);
+
+UPDATE posts_post SET title = title;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP INDEX IF EXISTS posts_post_search_vector_gin;
+DROP TRIGGER IF EXISTS posts_post_search_vector_trigger ON posts_post;
+DROP FUNCTION IF EXISTS posts_post_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # Полнотекстовый поиск есть только в PostgreSQL; на SQLite колонка остается пустой
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
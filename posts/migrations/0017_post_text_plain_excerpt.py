@@ -0,0 +1,146 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:42
+
+from html.parser import HTMLParser
+
+import bleach
+from bleach.css_sanitizer import CSSSanitizer
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+# Копия правил posts/content.py на момент миграции: дальнейшие изменения
+# модуля не должны менять то, что делает эта миграция
+EXCERPT_LENGTH = 300
+ALLOWED_TAGS = {
+    'p', 'br', 'div', 'span', 'hr', 'pre', 'code', 'blockquote',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'strong', 'b', 'em', 'i', 'u', 's', 'strike', 'sub', 'sup',
+    'a', 'ul', 'ol', 'li', 'img',
+    'table', 'caption', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': ['class', 'style'],
+    'a': ['href', 'title', 'target', 'rel'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'table': ['border', 'cellpadding', 'cellspacing'],
+    'td': ['colspan', 'rowspan'],
+    'th': ['colspan', 'rowspan', 'scope'],
+}
+ALLOWED_PROTOCOLS = {'http', 'https', 'mailto'}
+ALLOWED_CSS_PROPERTIES = {
+    'color', 'background-color', 'text-align', 'font-family', 'font-size',
+    'margin-left', 'width', 'height', 'float',
+}
+BLOCK_TAGS = {
+    'p', 'br', 'div', 'hr', 'pre', 'blockquote', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li', 'table', 'caption', 'tr', 'th', 'td',
+}
+
+
+class TextExtractor(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def html_to_text(html):
+    extractor = TextExtractor()
+    extractor.feed(html or '')
+    extractor.close()
+    return ' '.join(''.join(extractor.parts).split())
+
+
+# Вектор строится из заголовка (вес A) и уже очищенного от разметки текста (вес B)
+TRIGGER_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION posts_post_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.russian', coalesce({text}, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS posts_post_search_vector_trigger ON posts_post;
+CREATE TRIGGER posts_post_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, {column} ON posts_post
+    FOR EACH ROW EXECUTE FUNCTION posts_post_search_vector_update();
+
+UPDATE posts_post SET title = title;
+"""
+
+PLAIN_TEXT_TRIGGER_SQL = TRIGGER_FUNCTION_SQL.format(text='NEW.text_plain', column='text_plain')
+HTML_TEXT_TRIGGER_SQL = TRIGGER_FUNCTION_SQL.format(
+    text="regexp_replace(NEW.text, '<[^>]*>', ' ', 'g')", column='text'
+)
+
+
+def fill_text_fields(apps, schema_editor):
+    """Заполняет новые колонки уже существующих постов; сам Post.text не меняется."""
+    Post = apps.get_model('posts', 'Post')
+    cleaner = bleach.Cleaner(
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=ALLOWED_PROTOCOLS,
+        css_sanitizer=CSSSanitizer(allowed_css_properties=ALLOWED_CSS_PROPERTIES),
+        strip=True,
+    )
+    fields = ['text_html', 'text_plain', 'excerpt']
+    batch = []
+    for post in Post.objects.only('pk', 'text').order_by('pk').iterator(chunk_size=500):
+        post.text_html = cleaner.clean(post.text or '')
+        post.text_plain = html_to_text(post.text_html)
+        post.excerpt = Truncator(post.text_plain).chars(EXCERPT_LENGTH, truncate='…')
+        batch.append(post)
+        if len(batch) == 500:
+            Post.objects.bulk_update(batch, fields)
+            batch = []
+    Post.objects.bulk_update(batch, fields)
+
+
+def use_plain_text_in_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PLAIN_TEXT_TRIGGER_SQL)
+
+
+def use_html_text_in_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(HTML_TEXT_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_card_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Начало текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Очищенный HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_plain',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст без разметки'),
+        ),
+        migrations.RunPython(fill_text_fields, migrations.RunPython.noop),
+        migrations.RunPython(use_plain_text_in_search, use_html_text_in_search),
+    ]
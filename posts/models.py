@@ -21,8 +21,22 @@ from django.utils.text import slugify
 from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Count
+from django.contrib.postgres.search import SearchVectorField
 from ckeditor.fields import RichTextField  # Импортируем RichTextField
 
+from .content import EXCERPT_LENGTH, html_to_text, make_excerpt, sanitize_html
+
+# Денормализованные счетчики: обновляются сигналами (posts/signals.py),
+# а не формой, поэтому не перезаписываются при обычном save()
+POST_COUNTER_FIELDS = ('likes_count', 'dislikes_count', 'comments_count')
+# Колонки, которые заполняет сама БД (триггер поиска, см. posts/search.py)
+POST_DB_MANAGED_FIELDS = ('search_vector',)
+# Версия закэшированной карточки (posts/cards.py): увеличивается сигналами
+POST_VERSION_FIELDS = ('card_version',)
+# Вычисляются из text при сохранении (posts/content.py)
+POST_TEXT_DERIVED_FIELDS = ('text_html', 'text_plain', 'excerpt')
+
+
 class Post(models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -31,6 +45,15 @@ class Post(models.Model):
     )
     title = models.CharField(max_length=200, verbose_name="Заголовок")
     text = RichTextField(verbose_name="Текст")  # Заменяем TextField на RichTextField
+    # Производные от text (исходный HTML автора не меняется), см. posts/content.py
+    text_html = models.TextField(blank=True, editable=False, verbose_name="Очищенный HTML текста")
+    text_plain = models.TextField(blank=True, editable=False, verbose_name="Текст без разметки")
+    excerpt = models.CharField(
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name="Начало текста"
+    )
     pub_date = models.DateTimeField(
         default=timezone.now,
         verbose_name="Дата публикации"
@@ -58,6 +81,31 @@ class Post(models.Model):
         blank=True,                 # Разрешить пустое значение
         null=True                   # Разрешить NULL в базе данных
     )
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество лайков"
+    )
+    dislikes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество дизлайков"
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество комментариев"
+    )
+    # Поисковый вектор по заголовку и тексту. На PostgreSQL поддерживается
+    # триггером и GIN-индексом, на других СУБД остается пустым
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Меняется при каждом изменении того, что показывает карточка поста в
+    # лентах (текст, изображения, теги) - входит в ключ кэша карточки
+    card_version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name="Версия карточки"
+    )
 
     def total_likes(self):
         # """Возвращает общее количество лайков для поста, включая анонимные."""
@@ -69,6 +117,12 @@ class Post(models.Model):
     def __str__(self):
         return self.title
 
+    def fill_text_fields(self):
+        """Очищенный HTML, текст без разметки и начало текста из text (posts.content)."""
+        self.text_html = sanitize_html(self.text)
+        self.text_plain = html_to_text(self.text_html)
+        self.excerpt = make_excerpt(self.text_plain)
+
     # --- ДОБАВИТЬ ЭТОТ МЕТОД ---
     def get_absolute_url(self):
         """Возвращает URL для просмотра конкретного поста."""
@@ -87,6 +141,23 @@ class Post(models.Model):
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
+        update_fields = kwargs.get('update_fields')
+        if 'text' not in self.get_deferred_fields() and (update_fields is None or 'text' in update_fields):
+            self.fill_text_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *POST_TEXT_DERIVED_FIELDS}
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Счетчики в памяти могут быть устаревшими (пока пост редактировали,
+            # его успели лайкнуть) - не затираем их значениями из формы.
+            # То же для колонок, которые вычисляет сама БД, и версии карточки.
+            # Отложенные поля (card_queryset) не загружены - их тоже не пишем
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in POST_COUNTER_FIELDS + POST_DB_MANAGED_FIELDS + POST_VERSION_FIELDS
+            ]
         super().save(*args, **kwargs) # Вызываем родительский метод save
 
     class Meta:
@@ -0,0 +1,261 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# posts/pagination.py
+"""
+Keyset-пагинация (по курсору) для лент постов.
+
+Вместо Paginator (COUNT(*) по всему запросу + OFFSET, который на дальних
+страницах линейно дорожает) страница выбирается условием «после ключа
+последнего показанного поста», например (pub_date, id) < (:date, :id), и
+читается по индексу. Курсор в URL непрозрачный: base64 от направления и
+значений ключа. Общее число страниц не известно и не считается.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import BooleanField, Expression, F, Q, Value
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(values, direction=NEXT):
+    """Курсор из значений ключа сортировки и направления листания."""
+    payload = [direction] + [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(direction, values) из курсора или None, если курсор пустой или испорчен."""
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(payload, list) or len(payload) < 2 or payload[0] not in (NEXT, PREVIOUS):
+        return None
+    return payload[0], payload[1:]
+
+
+def _expanded_condition(keys, reverse):
+    """(a < x) OR (a = x AND b < y) OR ... - годится для любых направлений."""
+    condition = Q()
+    equal = {}
+    for field, value in keys:
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+        equal[name] = value
+    return condition
+
+
+class KeysetCondition(Expression):
+    """
+    Условие keyset_condition. На PostgreSQL, если все поля ключа сортируются
+    в одну сторону, - сравнение строк (pub_date, id) < (%s, %s): планировщик
+    читает его одним диапазоном составного индекса. Иначе (разные
+    направления, другие СУБД) - то же условие, разложенное в OR из AND.
+    """
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, keys, reverse=False):
+        super().__init__()
+        self.keys = keys
+        self.reverse = reverse
+        self.expanded = None
+        self.columns = []
+
+    def get_source_expressions(self):
+        return [] if self.expanded is None else [self.expanded, *self.columns]
+
+    def set_source_expressions(self, exprs):
+        if exprs:
+            self.expanded, *self.columns = exprs
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False):
+        resolved = self.copy()
+        resolved.is_summary = summarize
+        resolved.expanded = _expanded_condition(self.keys, self.reverse).resolve_expression(
+            query, allow_joins, reuse, summarize
+        )
+        resolved.columns = [
+            F(field.lstrip('-')).resolve_expression(query, allow_joins, reuse, summarize)
+            for field, _ in self.keys
+        ]
+        return resolved
+
+    def as_sql(self, compiler, connection):
+        return compiler.compile(self.expanded)
+
+    def as_postgresql(self, compiler, connection):
+        directions = {field.startswith('-') != self.reverse for field, _ in self.keys}
+        if len(directions) != 1:
+            return self.as_sql(compiler, connection)
+        columns, values, params = [], [], []
+        for column, (_, value) in zip(self.columns, self.keys):
+            sql, column_params = compiler.compile(column)
+            columns.append(sql)
+            params.extend(column_params)
+        for column, (_, value) in zip(self.columns, self.keys):
+            sql, value_params = compiler.compile(Value(value, output_field=column.output_field))
+            values.append(sql)
+            params.extend(value_params)
+        operator = '<' if directions.pop() else '>'
+        return f'({", ".join(columns)}) {operator} ({", ".join(values)})', params
+
+
+def keyset_condition(ordering, values, reverse=False):
+    """
+    Условие «строго после ключа values» для сортировки ordering
+    (например ('-likes_count', '-pub_date', '-pk')) - для queryset.filter().
+    При reverse=True - «строго до ключа», для листания назад.
+    """
+    keys = list(zip(ordering, values))
+    if not keys:
+        return Q()
+    return KeysetCondition(keys, reverse)
+
+
+def _reversed(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class CursorPage:
+    """Страница keyset-пагинации: список объектов и курсоры соседних страниц."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Делит queryset на страницы по ключу сортировки ordering. Последним полем
+    ключа должен быть уникальный столбец (обычно pk) - он добавляется сам.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.ordering = list(ordering)
+        if self.ordering[-1].lstrip('-') not in ('pk', 'id'):
+            self.ordering.append('-pk')
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+
+    def _output_field(self, name):
+        query = self.queryset.query
+        if name in query.annotations:
+            return query.annotations[name].output_field
+        if name == 'pk':
+            return self.queryset.model._meta.pk
+        return self.queryset.model._meta.get_field(name)
+
+    def decode(self, cursor):
+        """(direction, key) из курсора с приведением значений к типам полей."""
+        decoded = decode_cursor(cursor)
+        if decoded is None or len(decoded[1]) != len(self.ordering):
+            return None
+        direction, values = decoded
+        try:
+            key = [
+                self._output_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            return None
+        return direction, key
+
+    def key_of(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def get_page(self, cursor=None):
+        decoded = self.decode(cursor)
+        if decoded is None:
+            objects = list(self.queryset[:self.per_page + 1])
+            has_more = len(objects) > self.per_page
+            objects = objects[:self.per_page]
+            return CursorPage(
+                objects,
+                next_cursor=encode_cursor(self.key_of(objects[-1])) if has_more else None,
+            )
+
+        direction, key = decoded
+        if direction == NEXT:
+            objects = list(self.queryset.filter(keyset_condition(self.ordering, key))[:self.per_page + 1])
+            has_more = len(objects) > self.per_page
+            objects = objects[:self.per_page]
+            # Раз пришли по курсору, впереди есть хотя бы пост, на котором остановились
+            return CursorPage(
+                objects,
+                next_cursor=encode_cursor(self.key_of(objects[-1])) if has_more else None,
+                previous_cursor=encode_cursor(self.key_of(objects[0]) if objects else key, PREVIOUS),
+            )
+
+        objects = list(
+            self.queryset.filter(keyset_condition(self.ordering, key, reverse=True))
+            .order_by(*_reversed(self.ordering))[:self.per_page + 1]
+        )
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page][::-1]
+        return CursorPage(
+            objects,
+            next_cursor=encode_cursor(self.key_of(objects[-1]) if objects else key),
+            previous_cursor=encode_cursor(self.key_of(objects[0]), PREVIOUS) if has_more else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Подмешивается к ListView вместо paginate_by + Paginator. Курсор берется из
+    GET-параметра cursor, сортировку задает get_cursor_ordering(). В шаблон
+    попадают page_obj (CursorPage с next_cursor/previous_cursor) и is_paginated.
+    """
+    paginate_by = 10
+    cursor_kwarg = 'cursor'
+    cursor_ordering = ('-pub_date', '-pk')
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, self.get_cursor_ordering(), page_size)
+        page = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,274 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# posts/reactions.py
+"""
+Переключение лайка/дизлайка поста.
+
+На PostgreSQL переключатель занимает два запроса в одной транзакции:
+блокировка строки поста (SELECT ... FOR UPDATE) и один SQL-запрос, который
+удаляет противоположную реакцию, удаляет или вставляет текущую
+(ON CONFLICT DO NOTHING) и обновляет счетчики поста с RETURNING свежих
+значений. Блокировка сериализует клики по одному посту, поэтому лайк и
+дизлайк одного пользователя не могут оказаться выставлены одновременно,
+а счетчики не теряют обновлений.
+
+На остальных СУБД (SQLite в разработке и тестах) используется эквивалентная
+последовательность ORM-запросов внутри транзакции.
+
+Здесь же - реакции зрителя на посты страницы ({post_id: 'like' | 'dislike' |
+None}) для активного состояния кнопок: один запрос UNION ALL к таблицам
+лайков и дизлайков по индексам (post_id, user_id), без загрузки всех
+лайкнувших. При VIEWER_REACTIONS_CACHE_TIMEOUT > 0 все реакции
+пользователя держатся в двух множествах Redis и страница проверяется по
+ним одним SMISMEMBER на множество; изменение реакций сбрасывает их
+(toggle_reaction и сигналы m2m_changed в posts.signals).
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, connection, transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Greatest
+from django.http import Http404
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+LIKE = 'like'
+DISLIKE = 'dislike'
+
+CACHE_ALIAS = 'default'
+# Член обоих множеств реакций (id постов начинаются с 1): без него множество
+# не отличить от ненагруженного или вытесненного из Redis
+LOADED_MARKER = 0
+
+# reaction -> (M2M-поле реакции, счетчик, противоположное M2M-поле, его счетчик)
+REACTIONS = {
+    LIKE: ('likes', 'likes_count', 'dislikes', 'dislikes_count'),
+    DISLIKE: ('dislikes', 'dislikes_count', 'likes', 'likes_count'),
+}
+
+TOGGLE_SQL = """
+WITH removed_opposite AS (
+    DELETE FROM {opposite_table}
+    WHERE {post_column} = %(post_id)s AND {user_column} = %(user_id)s
+    RETURNING 1
+), removed_same AS (
+    DELETE FROM {same_table}
+    WHERE {post_column} = %(post_id)s AND {user_column} = %(user_id)s
+    RETURNING 1
+), inserted AS (
+    INSERT INTO {same_table} ({post_column}, {user_column})
+    SELECT %(post_id)s, %(user_id)s
+    WHERE NOT EXISTS (SELECT 1 FROM removed_same)
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+)
+UPDATE {post_table}
+SET {same_counter} = GREATEST(
+        {same_counter} + (SELECT COUNT(*) FROM inserted) - (SELECT COUNT(*) FROM removed_same), 0
+    ),
+    {opposite_counter} = GREATEST({opposite_counter} - (SELECT COUNT(*) FROM removed_opposite), 0)
+WHERE {post_pk} = %(post_id)s
+RETURNING
+    {same_counter},
+    {opposite_counter},
+    (SELECT COUNT(*) FROM removed_same),
+    (SELECT COUNT(*) FROM removed_opposite)
+"""
+
+
+def _toggle_postgresql(post_id, user_id, same_field, same_counter, opposite_field, opposite_counter):
+    same = Post._meta.get_field(same_field)
+    opposite = Post._meta.get_field(opposite_field)
+    quote = connection.ops.quote_name
+    sql = TOGGLE_SQL.format(
+        post_table=quote(Post._meta.db_table),
+        post_pk=quote(Post._meta.pk.column),
+        same_table=quote(same.remote_field.through._meta.db_table),
+        opposite_table=quote(opposite.remote_field.through._meta.db_table),
+        post_column=quote(same.m2m_column_name()),
+        user_column=quote(same.m2m_reverse_name()),
+        same_counter=quote(same_counter),
+        opposite_counter=quote(opposite_counter),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT 1 FROM {quote(Post._meta.db_table)} "
+            f"WHERE {quote(Post._meta.pk.column)} = %s FOR UPDATE",
+            [post_id]
+        )
+        if cursor.fetchone() is None:
+            raise Http404("Пост не найден")
+        cursor.execute(sql, {'post_id': post_id, 'user_id': user_id})
+        row = cursor.fetchone()
+    same_total, opposite_total, removed_same, removed_opposite = row
+    return same_total, opposite_total, bool(removed_same), bool(removed_opposite)
+
+
+def _toggle_generic(post_id, user_id, same_field, same_counter, opposite_field, opposite_counter):
+    same_through = Post._meta.get_field(same_field).remote_field.through
+    opposite_through = Post._meta.get_field(opposite_field).remote_field.through
+    user_column = Post._meta.get_field(same_field).m2m_reverse_name()
+    lookup = {'post_id': post_id, user_column: user_id}
+
+    with transaction.atomic():
+        if not Post.objects.select_for_update().filter(pk=post_id).exists():
+            raise Http404("Пост не найден")
+        removed_opposite = opposite_through.objects.filter(**lookup).delete()[0]
+        removed_same = same_through.objects.filter(**lookup).delete()[0]
+        inserted = 0
+        if not removed_same:
+            try:
+                with transaction.atomic():
+                    same_through.objects.create(**lookup)
+                inserted = 1
+            except IntegrityError:
+                # Параллельный клик уже поставил эту реакцию
+                pass
+
+        Post.objects.filter(pk=post_id).update(**{
+            same_counter: Greatest(F(same_counter) + inserted - removed_same, Value(0)),
+            opposite_counter: Greatest(F(opposite_counter) - removed_opposite, Value(0)),
+        })
+        same_total, opposite_total = Post.objects.filter(pk=post_id).values_list(
+            same_counter, opposite_counter
+        ).get()
+    return same_total, opposite_total, bool(removed_same), bool(removed_opposite)
+
+
+def toggle_reaction(post_id, user_id, reaction):
+    """
+    Переключает реакцию ('like' или 'dislike') пользователя на пост.
+
+    Противоположная реакция снимается автоматически. Возвращает словарь:
+    active - стоит ли теперь реакция, removed_opposite - была ли снята
+    противоположная, likes_count / dislikes_count - свежие значения счетчиков.
+    Если поста нет, выбрасывает Http404.
+    """
+    same_field, same_counter, opposite_field, opposite_counter = REACTIONS[reaction]
+    toggle = _toggle_postgresql if connection.vendor == 'postgresql' else _toggle_generic
+    same_total, opposite_total, removed_same, removed_opposite = toggle(
+        post_id, user_id, same_field, same_counter, opposite_field, opposite_counter
+    )
+    transaction.on_commit(lambda: invalidate_viewer_reactions(user_id))
+    counts = {same_counter: same_total, opposite_counter: opposite_total}
+    return {
+        # Если нечего было удалять, реакция стоит - поставили ее мы или параллельный запрос
+        'active': not removed_same,
+        'removed_opposite': removed_opposite,
+        'likes_count': counts['likes_count'],
+        'dislikes_count': counts['dislikes_count'],
+    }
+
+
+def _reaction_rows(user_id, post_ids=None):
+    """Запрос пар (post_id, реакция) пользователя: UNION ALL лайков и дизлайков."""
+    queries = []
+    for reaction, (field_name, *_) in REACTIONS.items():
+        field = Post._meta.get_field(field_name)
+        queryset = field.remote_field.through.objects.filter(**{field.m2m_reverse_name(): user_id})
+        if post_ids is not None:
+            queryset = queryset.filter(post_id__in=post_ids)
+        queries.append(queryset.values_list('post_id', Value(reaction, output_field=CharField())))
+    return queries[0].union(*queries[1:], all=True)
+
+
+def _cache_timeout():
+    return getattr(settings, 'VIEWER_REACTIONS_CACHE_TIMEOUT', 0)
+
+
+def _cache_keys(user_id):
+    cache = caches[CACHE_ALIAS]
+    return {reaction: cache.make_key(f'viewer_reactions:{user_id}:{reaction}') for reaction in REACTIONS}
+
+
+def _cached_reactions(user_id, post_ids):
+    """Реакции из множеств Redis или None, если множеств нет."""
+    keys = _cache_keys(user_id)
+    pipe = get_redis_connection(CACHE_ALIAS).pipeline(transaction=False)
+    for key in keys.values():
+        pipe.smismember(key, [LOADED_MARKER, *post_ids])
+    memberships = dict(zip(keys, pipe.execute()))
+    if not all(flags[0] for flags in memberships.values()):
+        return None
+    return {
+        post_id: next((reaction for reaction, flags in memberships.items() if flags[index]), None)
+        for index, post_id in enumerate(post_ids, start=1)
+    }
+
+
+def _fill_cache(user_id, rows):
+    keys = _cache_keys(user_id)
+    members = {reaction: [LOADED_MARKER] for reaction in keys}
+    for post_id, reaction in rows:
+        members[reaction].append(post_id)
+    pipe = get_redis_connection(CACHE_ALIAS).pipeline()
+    pipe.delete(*keys.values())
+    for reaction, key in keys.items():
+        pipe.sadd(key, *members[reaction])
+        pipe.expire(key, _cache_timeout())
+    pipe.execute()
+
+
+def get_viewer_reactions(user, post_ids):
+    """{post_id: 'like' | 'dislike' | None} для постов post_ids с точки зрения user."""
+    post_ids = list(post_ids)
+    reactions = dict.fromkeys(post_ids)
+    if not user.is_authenticated or not post_ids:
+        return reactions
+
+    if _cache_timeout():
+        try:
+            cached = _cached_reactions(user.pk, post_ids)
+            if cached is None:
+                # Множества заполняются всеми реакциями пользователя
+                _fill_cache(user.pk, list(_reaction_rows(user.pk)))
+                cached = _cached_reactions(user.pk, post_ids)
+            if cached is not None:
+                return cached
+        except RedisError as e:
+            logger.warning(f"Кэш реакций зрителя недоступен: {e}")
+
+    reactions.update(_reaction_rows(user.pk, post_ids))
+    return reactions
+
+
+def invalidate_viewer_reactions(*user_ids):
+    if not _cache_timeout() or not user_ids:
+        return
+    try:
+        get_redis_connection(CACHE_ALIAS).delete(
+            *[key for user_id in user_ids for key in _cache_keys(user_id).values()]
+        )
+    except RedisError as e:
+        logger.warning(f"Не удалось сбросить кэш реакций зрителя: {e}")
+
+
+def reaction_context(user, posts):
+    """
+    Реакции зрителя для шаблона: у каждого поста появляется viewer_reaction
+    ('like', 'dislike' или None), в контекст - словарь viewer_reactions.
+    """
+    reactions = get_viewer_reactions(user, [post.pk for post in posts])
+    for post in posts:
+        post.viewer_reaction = reactions[post.pk]
+    return {'viewer_reactions': reactions}
@@ -0,0 +1,108 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# posts/search.py
+"""
+Поиск по постам с подключаемыми бэкендами.
+
+- PostgresSearchBackend: полнотекстовый поиск по колонке Post.search_vector
+  (tsvector с русской конфигурацией по заголовку и Post.text_plain,
+  GIN-индекс, поддерживается триггером - см. миграции 0015 и 0017) с
+  ранжированием результатов;
+- IcontainsSearchBackend: прежний поиск через icontains для SQLite в
+  разработке и тестах.
+
+Бэкенд выбирается автоматически по СУБД, либо явно через настройку
+POSTS_SEARCH_BACKEND (путь к классу).
+"""
+from functools import reduce
+import operator
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+SEARCH_CONFIG = 'russian'
+
+
+class BaseSearchBackend:
+    """Интерфейс бэкенда поиска постов."""
+
+    # Умеет ли бэкенд сортировать по релевантности (аннотация search_rank)
+    ranks = False
+
+    def split_terms(self, query):
+        """Отдельные слова запроса (слишком короткие игнорируются)."""
+        return [term for term in query.split() if len(term) > 1]
+
+    def filter(self, queryset, query):
+        raise NotImplementedError
+
+    def relevance_ordering(self):
+        """Сортировка результатов поиска: по релевантности, затем по дате."""
+        if self.ranks:
+            return ('-search_rank', '-pub_date')
+        return ('-pub_date',)
+
+    def order_by_relevance(self, queryset):
+        return queryset.order_by(*self.relevance_ordering())
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """
+    Поиск подстроки в заголовке и тексте без разметки (Post.text_plain):
+    вся фраза ИЛИ любое из слов.
+    """
+
+    def filter(self, queryset, query):
+        conditions = Q(title__icontains=query) | Q(text_plain__icontains=query)
+        for term in self.split_terms(query):
+            conditions |= Q(title__icontains=term) | Q(text_plain__icontains=term)
+        return queryset.filter(conditions)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Полнотекстовый поиск PostgreSQL по предрасчитанному tsvector."""
+
+    ranks = True
+
+    def build_query(self, query):
+        # Как и раньше, находим посты с фразой целиком ИЛИ с любым из слов,
+        # но с учетом словоформ (русский стеммер) и с ранжированием
+        queries = [SearchQuery(query, config=SEARCH_CONFIG, search_type='phrase')]
+        queries += [SearchQuery(term, config=SEARCH_CONFIG) for term in self.split_terms(query)]
+        return reduce(operator.or_, queries)
+
+    def filter(self, queryset, query):
+        search_query = self.build_query(query)
+        # ts_rank возвращает real; приводим к double precision, чтобы значение
+        # из курсора пагинации точно совпадало с пересчитанным в запросе
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+        )
+
+
+def get_search_backend():
+    """Возвращает бэкенд поиска согласно настройкам и текущей СУБД."""
+    backend_path = getattr(settings, 'POSTS_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return IcontainsSearchBackend()
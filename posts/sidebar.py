@@ -0,0 +1,81 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# posts/sidebar.py
+"""
+Данные сайдбара лент: популярные теги и «на кого подписаться».
+
+Оба рейтинга - агрегаты по всей таблице (Count по тегам постов и по
+подписчикам всех пользователей), поэтому считаются один раз и хранятся в
+кэше с TTL. При изменении тегов постов и подписок кэш сбрасывается
+сигналами (см. posts.signals и subscriptions.signals).
+
+Рекомендации пользователю берутся из общего топ-K авторов (запрос - из
+subscriptions.recommendations, со статистикой авторов): из него
+исключаются сам пользователь и те, на кого он уже подписан.
+"""
+from django.core.cache import cache
+
+from subscriptions import recommendations
+from .models import Tag
+
+POPULAR_TAGS_CACHE_KEY = 'sidebar:popular_tags'
+TOP_AUTHORS_CACHE_KEY = 'sidebar:top_authors'
+SIDEBAR_CACHE_TIMEOUT = 300
+
+# Сколько позиций рейтинга хранится в кэше
+POPULAR_TAGS_CACHED = 10
+TOP_AUTHORS_CACHED = 50
+
+
+def get_popular_tags(limit=5):
+    """Популярные теги с количеством постов (атрибут posts_count)."""
+    tags = cache.get_or_set(
+        POPULAR_TAGS_CACHE_KEY,
+        lambda: list(Tag.get_popular_tags(limit=POPULAR_TAGS_CACHED)),
+        SIDEBAR_CACHE_TIMEOUT
+    )
+    return tags[:limit]
+
+
+def get_top_authors():
+    """
+    Общий рейтинг пользователей по числу подписчиков (атрибуты
+    subscribers_count, posts_count, latest_post_title).
+    """
+    return cache.get_or_set(
+        TOP_AUTHORS_CACHE_KEY,
+        lambda: recommendations.top_authors(TOP_AUTHORS_CACHED),
+        SIDEBAR_CACHE_TIMEOUT
+    )
+
+
+def get_suggested_users(viewer, limit=3):
+    """Рекомендации «на кого подписаться» для viewer из кэшированного топа."""
+    top_authors = get_top_authors()
+    if not viewer.is_authenticated:
+        return top_authors[:limit]
+    followed = recommendations.followed_author_ids(viewer.pk, [author.pk for author in top_authors])
+    followed.add(viewer.pk)
+    return [author for author in top_authors if author.pk not in followed][:limit]
+
+
+def invalidate_popular_tags():
+    cache.delete(POPULAR_TAGS_CACHE_KEY)
+
+
+def invalidate_top_authors():
+    cache.delete(TOP_AUTHORS_CACHE_KEY)
@@ -0,0 +1,183 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# posts/signals.py
+"""
+Поддержка денормализованных счетчиков Post в актуальном состоянии.
+
+- добавление лайка/дизлайка: F-выражение +N (pk_set содержит только новые связи);
+- удаление/очистка: точный пересчет подзапросом, т.к. Django передает в pk_set
+  все запрошенные id, даже если части связей не было;
+- комментарии: +1/-1 при создании/удалении, пересчет при изменении is_active;
+- удаление пользователя: каскад через таблицы M2M идет без m2m_changed,
+  поэтому заранее вычитаем его голоса.
+
+Здесь же сбрасываются кэш популярных тегов сайдбара (posts.sidebar),
+статистика профилей авторов (users.profile_stats) и кэш реакций зрителя
+(posts.reactions), а при изменении поста, его изображений и тегов
+увеличивается версия карточки (posts.cards).
+"""
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.profile_stats import invalidate_profile_stats
+from .cards import bump_card_version
+from .counters import increment_counter, refresh_counters
+from .models import Post, PostImage, Comment, Tag
+from .reactions import invalidate_viewer_reactions
+from .sidebar import invalidate_popular_tags, invalidate_top_authors
+
+
+def _handle_reaction_change(field, instance, action, reverse, pk_set):
+    """Общая логика для Post.likes и Post.dislikes."""
+    if action == 'post_add' and pk_set:
+        if reverse:
+            # user.liked_posts.add(post1, post2): каждому посту +1
+            increment_counter(pk_set, field, 1)
+        else:
+            # post.likes.add(user1, user2): одному посту +len(pk_set)
+            increment_counter([instance.pk], field, len(pk_set))
+
+    elif action == 'post_remove' and pk_set:
+        post_ids = pk_set if reverse else [instance.pk]
+        refresh_counters(post_ids, fields=(field,))
+
+    elif action == 'pre_clear' and reverse:
+        # Запоминаем посты до очистки - после нее связь уже не найти
+        related_name = 'liked_posts' if field == 'likes_count' else 'disliked_posts'
+        instance._cleared_post_ids = list(
+            getattr(instance, related_name).values_list('pk', flat=True)
+        )
+
+    elif action == 'post_clear':
+        if reverse:
+            refresh_counters(getattr(instance, '_cleared_post_ids', []), fields=(field,))
+        else:
+            Post.objects.filter(pk=instance.pk).update(**{field: 0})
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    _handle_reaction_change('likes_count', instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Post.dislikes.through)
+def update_dislikes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    _handle_reaction_change('dislikes_count', instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+@receiver(m2m_changed, sender=Post.dislikes.through)
+def reset_viewer_reactions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not getattr(settings, 'VIEWER_REACTIONS_CACHE_TIMEOUT', 0):
+        return
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_viewer_reactions(instance.pk)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        invalidate_viewer_reactions(*pk_set)
+    elif action == 'pre_clear':
+        # После очистки не узнать, чьи реакции были у поста
+        user_column = sender._meta.get_field('customuser').attname
+        invalidate_viewer_reactions(
+            *sender.objects.filter(post_id=instance.pk).values_list(user_column, flat=True)
+        )
+
+
+@receiver(post_save, sender=Comment)
+def update_comments_count_on_save(sender, instance, created, **kwargs):
+    if created:
+        if instance.is_active:
+            increment_counter([instance.post_id], 'comments_count', 1)
+    else:
+        # Могли включить/выключить модерацию - пересчитываем точно
+        refresh_counters([instance.post_id], fields=('comments_count',))
+
+
+@receiver(post_delete, sender=Comment)
+def update_comments_count_on_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        increment_counter([instance.post_id], 'comments_count', -1)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def release_user_reactions(sender, instance, **kwargs):
+    increment_counter(
+        Post.objects.filter(likes=instance).values_list('pk', flat=True), 'likes_count', -1
+    )
+    increment_counter(
+        Post.objects.filter(dislikes=instance).values_list('pk', flat=True), 'dislikes_count', -1
+    )
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def reset_popular_tags_on_tagging(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_popular_tags()
+
+
+@receiver(post_save, sender=Post)
+def bump_card_version_on_edit(sender, instance, created, **kwargs):
+    if not created:
+        bump_card_version([instance.pk])
+
+
+@receiver(post_save, sender=PostImage)
+@receiver(post_delete, sender=PostImage)
+def bump_card_version_on_images(sender, instance, **kwargs):
+    bump_card_version([instance.post_id])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def bump_card_version_on_tagging(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_card_version([instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        bump_card_version(pk_set)
+    elif action == 'pre_clear':
+        bump_card_version(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def bump_card_version_on_tag_change(sender, instance, created=False, **kwargs):
+    # Название и slug тега есть в теле карточки; при удалении связи с постами
+    # удаляются без m2m_changed, поэтому посты берутся до удаления
+    if not created:
+        bump_card_version(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_popular_tags(sender, **kwargs):
+    invalidate_popular_tags()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_author_profile_stats(sender, instance, created=True, **kwargs):
+    if created:
+        invalidate_profile_stats(instance.author_id)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def reset_top_authors_on_user_delete(sender, **kwargs):
+    invalidate_top_authors()
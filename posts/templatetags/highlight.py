@@ -1,34 +1,18 @@
 # templatetags/highlight.py
 from django import template
+from django.utils.html import conditional_escape
 from django.utils.safestring import mark_safe
-import re
+
+from posts.highlight import highlight_html
 
 register = template.Library()
 
 
-@register.filter
-def highlight(text, query):
-    if not query or not text:
+@register.filter(needs_autoescape=True)
+def highlight(text, query, autoescape=True):
+    """Подсвечивает слова запроса query в тексте (см. posts.highlight)."""
+    if not text:
         return text
-
-    words = query.split()
-    highlighted = str(text)
-
-    # Сначала выделяем полную фразу
-    highlighted = re.sub(
-        f'({re.escape(query)})',
-        r'<mark class="highlight">\1</mark>',
-        highlighted,
-        flags=re.IGNORECASE
-    )
-
-    # Затем выделяем отдельные слова
-    for word in words:
-        highlighted = re.sub(
-            f'({re.escape(word)})',
-            r'<mark class="highlight">\1</mark>',
-            highlighted,
-            flags=re.IGNORECASE
-        )
-
-    return mark_safe(highlighted)
\ No newline at end of file
+    if autoescape:
+        text = conditional_escape(text)
+    return mark_safe(highlight_html(str(text), query))
@@ -15,7 +15,6 @@
 
 
 # posts/views.py
-from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
@@ -25,13 +24,20 @@ from django.contrib.auth import get_user_model
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator
 from django.http import JsonResponse
-from django.db.models import Count, Q
+from django.db.models import Count
 from django.views.generic.detail import SingleObjectMixin
 from django.views import View
 from django.core.mail import send_mail
 
+from Chatty_orange.ratelimit import rate_limit
+from .cards import PostCardsMixin, card_queryset
 from .models import Post, Comment, Tag, PostImage
+from .pagination import CursorPaginationMixin
 from .forms import PostForm, CommentForm, PostImageFormSet
+from .reactions import reaction_context, toggle_reaction
+from .search import get_search_backend
+from .sidebar import get_popular_tags, get_suggested_users
+from users.profile_stats import get_profile_stats
 from subscriptions.models import Subscription  # Добавляем импорт модели подписок
 
 from django.shortcuts import render
@@ -39,24 +45,23 @@ from django.shortcuts import render
 User = get_user_model()  # Получаем модель пользователя
 
 
-class PostListView(ListView):
+class PostListView(PostCardsMixin, CursorPaginationMixin, ListView):
     model = Post
     template_name = 'posts/post_list.html'
     context_object_name = 'posts'
     paginate_by = 10
+    card_body_template = 'posts/includes/post_card_body.html'
 
     def get_queryset(self):
         # Инициализация атрибутов для поиска по умолчанию
         self.search_query = self.request.GET.get('q', '').strip()
         self.search_terms = []
+        # Ключ keyset-пагинации совпадает с сортировкой ленты
+        self.cursor_ordering = ('-pub_date', '-pk')
 
-        # Базовый запрос с предварительной загрузкой автора и аннотациями
-        queryset = Post.objects.select_related('author').annotate(
-            num_comments=Count('comments', filter=Q(comments__is_active=True) | Q(comments__isnull=True),
-                               distinct=True),  # Скорректировано для корректного подсчета
-            num_likes=Count('likes', distinct=True),
-            num_dislikes=Count('dislikes', distinct=True)
-        )
+        # Базовый запрос с предварительной загрузкой автора. Изображения,
+        # теги и реакции зрителя догружаются для страницы (PostCardsMixin)
+        queryset = card_queryset(Post.objects.all())
 
         # Логика поиска
         if self.search_query:
@@ -66,23 +71,11 @@ class PostListView(ListView):
                 self.search_terms = []  # ID поиск не использует search_terms в шаблоне
                 return queryset.filter(pk=int(self.search_query))
             else:
-                # Текстовый поиск
+                # Текстовый поиск через подключаемый бэкенд
+                # (полнотекстовый на PostgreSQL, icontains на SQLite)
+                self.search_backend = get_search_backend()
                 self.search_terms = self.search_query.split()
-                search_query_obj = Q()
-                # Поиск по целой фразе
-                search_query_obj |= Q(title__icontains=self.search_query)
-                search_query_obj |= Q(text__icontains=self.search_query)
-
-                # Поиск по отдельным словам (если фраза не дала результатов или для расширения)
-                # Можно добавить более сложную логику, как была ранее, если потребуется
-                # Например, поиск по всем словам, или по части слов.
-                # Текущая реализация ищет фразу целиком ИЛИ отдельные слова.
-                for term in self.search_terms:
-                    if len(term) > 1:  # Игнорируем слишком короткие слова
-                        search_query_obj |= Q(title__icontains=term)
-                        search_query_obj |= Q(text__icontains=term)
-
-                queryset = queryset.filter(search_query_obj).distinct()
+                queryset = self.search_backend.filter(queryset, self.search_query)
 
         # Логика фильтрации (применяется к результатам поиска или ко всем постам)
         filter_param = self.request.GET.get('filter', 'latest')
@@ -92,42 +85,39 @@ class PostListView(ListView):
                 subscribed_author_ids = Subscription.objects.filter(
                     subscriber=self.request.user
                 ).values_list('author_id', flat=True)
-                queryset = queryset.filter(author_id__in=subscribed_author_ids).order_by('-pub_date')
+                queryset = queryset.filter(author_id__in=subscribed_author_ids)
             else:
                 queryset = Post.objects.none()
         elif filter_param == 'popular':
-            queryset = queryset.order_by('-num_likes', '-pub_date')
-        else:  # 'latest' или любой другой/не указанный параметр
-            queryset = queryset.order_by('-pub_date')
+            self.cursor_ordering = ('-likes_count', '-pub_date', '-pk')
+        elif self.search_query:
+            # Результаты поиска - сначала самые релевантные
+            self.cursor_ordering = self.search_backend.relevance_ordering() + ('-pk',)
 
+        # Сама сортировка применяется пагинатором (CursorPaginationMixin)
         return queryset
 
+    def get_card_params(self):
+        # Параметры входят в ключ кэша карточек - неизвестный фильтр считаем 'latest'
+        current_filter = self.request.GET.get('filter', 'latest')
+        return {
+            'current_filter': current_filter if current_filter in ('subscriptions', 'popular') else 'latest',
+            'search_query': self.search_query,
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
             'current_filter': self.request.GET.get('filter', 'latest'),
-            'popular_tags': Tag.get_popular_tags(),
+            'popular_tags': get_popular_tags(),
             'search_query': getattr(self, 'search_query', ''),
             'search_terms': getattr(self, 'search_terms', [])
         })
 
         if self.request.user.is_authenticated:
-            try:
-                # Получаем ID пользователей, на которых подписан текущий пользователь
-                subscribed_to = Subscription.objects.filter(
-                    subscriber=self.request.user
-                ).values_list('author_id', flat=True)
-
-                # Получаем рекомендуемых пользователей (не включая тех, на кого уже подписан, и себя)
-                context['suggested_users'] = User.objects.exclude(
-                    id__in=list(subscribed_to) + [self.request.user.id]
-                ).annotate(
-                    subscribers_count=Count('subscribers')
-                ).order_by('-subscribers_count')[:3]  # Показываем 3 самых популярных пользователя
-            except Exception as e:
-                # В случае ошибки просто не добавляем рекомендации
-                context['suggested_users'] = []
-                print(f"Error getting suggested users: {e}")
+            # 3 самых популярных автора из кэшированного рейтинга, кроме себя и уже подписок
+            context['suggested_users'] = get_suggested_users(self.request.user)
+            context['viewer_stats'] = get_profile_stats(self.request.user.pk)
 
         return context
 
@@ -153,8 +143,11 @@ class PostDetailView(DetailView):
         page_number = self.request.GET.get('comment_page')
         context['comments'] = paginator.get_page(page_number)
 
+        # Активное состояние кнопок лайка/дизлайка
+        context.update(reaction_context(user, [self.object]))
+
         # Добавляем популярные теги
-        context['popular_tags'] = Tag.get_popular_tags()
+        context['popular_tags'] = get_popular_tags()
 
         return context
 
@@ -333,81 +326,51 @@ class CommentDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 
 # posts/views.py (PostLikeView)
 @method_decorator(ensure_csrf_cookie, name='dispatch')
+@method_decorator(rate_limit('post_reaction'), name='post')
 class PostLikeView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
-        post = get_object_or_404(Post, pk=kwargs.get('pk'))
-        user = request.user
-
-        with transaction.atomic():
-            # Удаляем дизлайк если есть
-            if post.dislikes.filter(id=user.id).exists():
-                post.dislikes.remove(user)
-                removed_dislike = True
-            else:
-                removed_dislike = False
-
-            # Обрабатываем лайк
-            if post.likes.filter(id=user.id).exists():
-                post.likes.remove(user)
-                liked = False
-            else:
-                post.likes.add(user)
-                liked = True
+        # Снятие дизлайка, переключение лайка и свежие счетчики - одним запросом
+        result = toggle_reaction(kwargs.get('pk'), request.user.pk, 'like')
 
         return JsonResponse({
             'status': 'ok',
-            'liked': liked,
-            'removed_dislike': removed_dislike,
-            'total_likes': post.likes.count(),
-            'total_dislikes': post.dislikes.count()
+            'liked': result['active'],
+            'removed_dislike': result['removed_opposite'],
+            'total_likes': result['likes_count'],
+            'total_dislikes': result['dislikes_count']
         })
 
 
 # posts/views.py (PostDislikeView)
 @method_decorator(ensure_csrf_cookie, name='dispatch')
+@method_decorator(rate_limit('post_reaction'), name='post')
 class PostDislikeView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
-        post = get_object_or_404(Post, pk=kwargs.get('pk'))
-        user = request.user
-
-        with transaction.atomic():
-            # Удаляем лайк если есть
-            if post.likes.filter(id=user.id).exists():
-                post.likes.remove(user)
-                removed_like = True
-            else:
-                removed_like = False
-
-            # Обрабатываем дизлайк
-            if post.dislikes.filter(id=user.id).exists():
-                post.dislikes.remove(user)
-                disliked = False
-            else:
-                post.dislikes.add(user)
-                disliked = True
+        # Снятие лайка, переключение дизлайка и свежие счетчики - одним запросом
+        result = toggle_reaction(kwargs.get('pk'), request.user.pk, 'dislike')
 
         return JsonResponse({
             'status': 'ok',
-            'disliked': disliked,
-            'removed_like': removed_like,
-            'total_dislikes': post.dislikes.count(),
-            'total_likes': post.likes.count()
+            'disliked': result['active'],
+            'removed_like': result['removed_opposite'],
+            'total_dislikes': result['dislikes_count'],
+            'total_likes': result['likes_count']
         })
 
 
-class TagPostListView(ListView):
+class TagPostListView(PostCardsMixin, CursorPaginationMixin, ListView):
     model = Post
     template_name = 'posts/post_list.html'
     context_object_name = 'posts'
     paginate_by = 10
+    card_body_template = 'posts/includes/post_card_body.html'
 
     def get_queryset(self):
         self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
-        queryset = Post.objects.filter(tags=self.tag).annotate(
-            num_comments=Count('comments', distinct=True),
-            num_likes=Count('likes', distinct=True)
-        ).select_related('author').order_by('-pub_date')
-        return queryset
+        return card_queryset(Post.objects.filter(tags=self.tag))
+
+    def get_card_params(self):
+        return {'current_filter': 'tag', 'search_query': ''}
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -417,22 +380,11 @@ class TagPostListView(ListView):
 
         # Рекомендуемые пользователи как в PostListView
         if self.request.user.is_authenticated:
-            try:
-                subscribed_to = Subscription.objects.filter(
-                    subscriber=self.request.user
-                ).values_list('author_id', flat=True)
-
-                context['suggested_users'] = User.objects.exclude(
-                    id__in=list(subscribed_to) + [self.request.user.id]
-                ).annotate(
-                    subscribers_count=Count('subscribers')
-                ).order_by('-subscribers_count')[:3]
-            except Exception as e:
-                context['suggested_users'] = []
-                print(f"Error getting suggested users: {e}")
+            context['suggested_users'] = get_suggested_users(self.request.user)
+            context['viewer_stats'] = get_profile_stats(self.request.user.pk)
 
         # Добавляем популярные теги
-        context['popular_tags'] = Tag.get_popular_tags()
+        context['popular_tags'] = get_popular_tags()
         return context
 
 
@@ -459,6 +411,7 @@ def feed_view(request):
         num_comments=Count('comments', distinct=True)
     )
 
+@rate_limit('submit_advice')
 def submit_advice(request):
     if request.method == 'POST':
         name = request.POST.get('name', '').strip()
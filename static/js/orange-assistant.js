@@ -945,6 +945,54 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // ✅ Потоковые ответы (SSE): заголовки запроса и разбор событий chunk/done
+    function createStreamingHeaders() {
+        return { ...createSecureHeaders(), 'Accept': 'text/event-stream' };
+    }
+
+    function isEventStream(response) {
+        return (response.headers.get('Content-Type') || '').includes('text/event-stream');
+    }
+
+    async function readEventStream(response, onChunk) {
+        /**
+         * Читает поток событий по мере поступления. onChunk получает весь
+         * накопленный текст ответа после каждой части. Возвращает итоговый текст.
+         */
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+
+                if (eventName === 'chunk' && data) {
+                    text += JSON.parse(data).text;
+                    onChunk(text);
+                }
+            }
+        }
+        return text;
+    }
+
     // ✅ ИСПРАВЛЕННАЯ ФУНКЦИЯ sendChatMessage - с CSRF защитой
     async function sendChatMessage() {
         if (!aiChatMessageInput) return;
@@ -982,10 +1030,10 @@ document.addEventListener('DOMContentLoaded', function() {
         aiChatBody.appendChild(thinkingMessage);
 
         try {
-            // ✅ ИСПОЛЬЗОВАНИЕ БЕЗОПАСНЫХ ЗАГОЛОВКОВ
+            // ✅ ИСПОЛЬЗОВАНИЕ БЕЗОПАСНЫХ ЗАГОЛОВКОВ (+ просим потоковый ответ)
             const response = await fetch('/assistant/api/chat/', {
                 method: 'POST',
-                headers: createSecureHeaders(), // ✅ CSRF токен включен!
+                headers: createStreamingHeaders(), // ✅ CSRF токен включен!
                 body: JSON.stringify(requestData)
             });
 
@@ -1008,8 +1056,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
 
-            const responseData = await response.json();
-            appendMessageToChat(responseData.response, 'ai', true);
+            if (isEventStream(response)) {
+                // Ответ появляется по мере генерации; в историю - целиком в конце
+                const messageDiv = appendMessageToChat('', 'ai', true, false);
+                const fullText = await readEventStream(response, text => {
+                    messageDiv.innerHTML = formatMessage(text);
+                });
+                addMessageToHistory(fullText, 'ai');
+            } else {
+                const responseData = await response.json();
+                appendMessageToChat(responseData.response, 'ai', true);
+            }
 
         } catch (error) {
             thinkingMessage.remove();
@@ -1368,12 +1425,17 @@ ${stats.lastUpdate ? `📅 Последнее обновление: ${stats.last
                 // ✅ ИСПОЛЬЗОВАНИЕ БЕЗОПАСНЫХ ЗАГОЛОВКОВ
                 const response = await fetch('/assistant/api/chat/', {
                     method: 'POST',
-                    headers: createSecureHeaders(), // ✅ CSRF токен включен!
+                    headers: createStreamingHeaders(), // ✅ CSRF токен включен!
                     body: JSON.stringify(requestData)
                 });
 
                 if (!response.ok) {
                     postSuggestionArea.innerHTML = '<p class="text-danger">Произошла ошибка</p>';
+                } else if (isEventStream(response)) {
+                    postSuggestionArea.style.display = 'block';
+                    await readEventStream(response, text => {
+                        postSuggestionArea.innerHTML = formatMessage(text);
+                    });
                 } else {
                     const responseData = await response.json();
                     postSuggestionArea.innerHTML = formatMessage(responseData.response);
@@ -1439,17 +1501,25 @@ ${stats.lastUpdate ? `📅 Последнее обновление: ${stats.last
                 // ✅ ИСПОЛЬЗОВАНИЕ БЕЗОПАСНЫХ ЗАГОЛОВКОВ
                 const response = await fetch('/assistant/api/chat/', {
                     method: 'POST',
-                    headers: createSecureHeaders(), // ✅ CSRF токен включен!
+                    headers: createStreamingHeaders(), // ✅ CSRF токен включен!
                     body: JSON.stringify(requestData)
                 });
 
                 if (!response.ok) {
                     postCheckResultArea.innerHTML = '<p class="text-danger">Ошибка проверки</p>';
                 } else {
-                    const responseData = await response.json();
-                    postCheckResultArea.innerHTML = formatMessage(responseData.response);
+                    let resultText;
+                    if (isEventStream(response)) {
+                        postCheckResultArea.style.display = 'block';
+                        resultText = await readEventStream(response, text => {
+                            postCheckResultArea.innerHTML = formatMessage(text);
+                        });
+                    } else {
+                        resultText = (await response.json()).response;
+                        postCheckResultArea.innerHTML = formatMessage(resultText);
+                    }
 
-                    if (responseData.response.includes('✅')) {
+                    if (resultText.includes('✅')) {
                         postCheckResultArea.className = 'mt-2 p-3 border rounded alert-success';
                     } else {
                         postCheckResultArea.className = 'mt-2 p-3 border rounded alert-warning';
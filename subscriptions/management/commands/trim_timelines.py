@@ -0,0 +1,43 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from subscriptions.models import TimelineEntry
+from subscriptions.timeline import fan_out_former_celebrities, timeline_length, trim_timeline
+
+
+class Command(BaseCommand):
+    help = (
+        "Раскладывает по лентам посты авторов, переставших быть популярными, и "
+        "срезает ленты подписок до FEED_TIMELINE_LENGTH записей. Новые посты "
+        "раскладываются по лентам без обрезки, поэтому команду нужно запускать "
+        "по расписанию."
+    )
+
+    def handle(self, *args, **options):
+        former = fan_out_former_celebrities()
+        owner_ids = list(
+            TimelineEntry.objects.values('owner').annotate(
+                entries=Count('id')
+            ).filter(entries__gt=timeline_length()).values_list('owner', flat=True)
+        )
+        removed = sum(trim_timeline(owner_id) for owner_id in owner_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Разложены посты бывших популярных авторов: {former}. "
+            f"Обрезано лент: {len(owner_ids)}, удалено записей: {removed}."
+        ))
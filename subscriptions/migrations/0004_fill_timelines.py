@@ -0,0 +1,66 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:05
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Q
+
+# Копия правил subscriptions/timeline.py на момент миграции
+FAN_OUT_BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """
+    Раскладывает по лентам последние посты авторов, на которых подписались до
+    появления материализованной ленты. Посты популярных авторов не
+    раскладываются - они подмешиваются при чтении.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Subscription = apps.get_model('subscriptions', 'Subscription')
+    TimelineEntry = apps.get_model('subscriptions', 'TimelineEntry')
+    length = getattr(settings, 'FEED_TIMELINE_LENGTH', 500)
+    threshold = getattr(settings, 'FEED_CELEBRITY_FOLLOWERS', 10000)
+
+    author_ids = Subscription.objects.values('author').annotate(
+        followers=Count('id')
+    ).filter(followers__lt=threshold).values_list('author', flat=True)
+    for author_id in author_ids.order_by('author'):
+        posts = list(
+            Post.objects.filter(author_id=author_id).order_by('-pub_date', '-pk').values_list(
+                'pk', 'pub_date'
+            )[:length]
+        )
+        if not posts:
+            continue
+        follower_ids = list(
+            Subscription.objects.filter(author_id=author_id).values_list('subscriber_id', flat=True)
+        )
+        batch_size = max(FAN_OUT_BATCH_SIZE // len(posts), 1)
+        for start in range(0, len(follower_ids), batch_size):
+            TimelineEntry.objects.bulk_create([
+                TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, pub_date=pub_date)
+                for owner_id in follower_ids[start:start + batch_size]
+                for post_id, pub_date in posts
+            ], ignore_conflicts=True)
+
+    # Оставляем в каждой ленте не больше length самых свежих записей
+    owner_ids = TimelineEntry.objects.values('owner').annotate(
+        entries=Count('id')
+    ).filter(entries__gt=length).values_list('owner', flat=True)
+    for owner_id in list(owner_ids):
+        entries = TimelineEntry.objects.filter(owner_id=owner_id)
+        pub_date, post_id = entries.order_by('-pub_date', '-post_id').values_list(
+            'pub_date', 'post_id'
+        )[length]
+        entries.filter(Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lte=post_id)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0003_timelineentry'),
+    ]
+
+    operations = [
+        # Записи ленты производны от подписок и постов - откат их не трогает
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
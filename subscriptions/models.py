@@ -44,4 +44,46 @@ class Subscription(models.Model):
         ordering = ['-created_at']  # От новых к старым
 
     def __str__(self):
-        return f"{self.subscriber.username} → {self.author.username}"
\ No newline at end of file
+        return f"{self.subscriber.username} → {self.author.username}"
+
+class TimelineEntry(models.Model):
+    """
+    Запись материализованной ленты подписок (fan-out-on-write): при публикации
+    пост раскладывается по лентам подписчиков автора. Дата публикации
+    продублирована, чтобы лента читалась keyset-пагинацией по индексу
+    (owner, -pub_date, -post) без обращения к таблице постов.
+    """
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name="Владелец ленты"
+    )
+    post = models.ForeignKey(
+        'posts.Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name="Пост"
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Автор поста"
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        unique_together = ['owner', 'post']
+        indexes = [
+            models.Index(
+                'owner', models.F('pub_date').desc(), models.F('post').desc(),
+                name='subscriptions_timeline_idx'
+            ),
+            models.Index(fields=['owner', 'author'], name='subscriptions_timeline_author'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}: пост {self.post_id}"
@@ -0,0 +1,84 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# subscriptions/recommendations.py
+"""
+Рекомендации авторов для подписки.
+
+Кандидаты, число их постов и подписчиков и заголовок последнего поста
+выбираются одним запросом: счетчики и заголовок - коррелированные
+подзапросы (по индексам author_id в постах и подписках), а не JOIN с
+GROUP BY, который перемножил бы строки постов и подписок. Те, на кого
+зритель уже подписан, исключаются условием NOT EXISTS в том же запросе.
+
+Используется ИИ-помощником (orange_assistant.ai_services) и сайдбаром
+лент (posts.sidebar).
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Post
+from .models import Subscription
+
+
+def _count_by_author(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        total=Count('pk')
+    ).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def with_author_stats(queryset):
+    """Пользователи с атрибутами posts_count, subscribers_count и latest_post_title."""
+    latest_post = Post.objects.filter(author=OuterRef('pk')).order_by('-pub_date', '-pk')
+    return queryset.annotate(
+        posts_count=_count_by_author(Post.objects.all(), 'author'),
+        subscribers_count=_count_by_author(Subscription.objects.all(), 'author'),
+        latest_post_title=Subquery(latest_post.values('title')[:1]),
+    )
+
+
+def exclude_followed(queryset, viewer_id):
+    """Без самого зрителя и тех, на кого он уже подписан."""
+    followed = Subscription.objects.filter(subscriber_id=viewer_id, author=OuterRef('pk'))
+    return queryset.exclude(pk=viewer_id).exclude(Exists(followed))
+
+
+def followed_author_ids(viewer_id, author_ids):
+    """Те из author_ids, на кого подписан зритель."""
+    return set(
+        Subscription.objects.filter(
+            subscriber_id=viewer_id, author_id__in=author_ids
+        ).values_list('author_id', flat=True)
+    )
+
+
+def top_authors(limit, ordering=('-subscribers_count', 'pk')):
+    """Активные пользователи со статистикой, лучшие по ordering."""
+    queryset = with_author_stats(get_user_model().objects.filter(is_active=True))
+    return list(queryset.order_by(*ordering)[:limit])
+
+
+def recommend_authors(viewer_id=None, limit=5):
+    """
+    Самые пишущие авторы (хотя бы один пост) со статистикой - один запрос.
+    Для зрителя исключаются он сам и его подписки.
+    """
+    queryset = with_author_stats(get_user_model().objects.filter(is_active=True)).filter(posts_count__gt=0)
+    if viewer_id:
+        queryset = exclude_followed(queryset, viewer_id)
+    return list(queryset.order_by('-posts_count', 'pk')[:limit])
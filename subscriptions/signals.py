@@ -0,0 +1,66 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# subscriptions/signals.py
+"""
+Поддержка материализованных лент подписок (см. subscriptions.timeline)
+и сброс кэшированного рейтинга авторов сайдбара (posts.sidebar) и
+статистики профилей (users.profile_stats).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts.models import Post
+from posts.sidebar import invalidate_top_authors
+from users.profile_stats import invalidate_profile_stats
+from .models import Subscription, TimelineEntry
+from .timeline import backfill_timeline, fan_out_post, remove_author_from_timeline
+
+
+@receiver(post_save, sender=Post)
+def distribute_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        fan_out_post(instance)
+    else:
+        # Дату публикации могли поменять в админке - ключ сортировки лент тоже
+        TimelineEntry.objects.filter(post=instance).exclude(
+            pub_date=instance.pub_date
+        ).update(pub_date=instance.pub_date)
+
+
+@receiver(post_save, sender=Subscription)
+def fill_timeline_on_subscribe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        backfill_timeline(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def clean_timeline_on_unsubscribe(sender, instance, **kwargs):
+    remove_author_from_timeline(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def reset_top_authors(sender, **kwargs):
+    invalidate_top_authors()
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def reset_profile_stats(sender, instance, **kwargs):
+    invalidate_profile_stats(instance.subscriber_id, instance.author_id)
@@ -0,0 +1,230 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# subscriptions/timeline.py
+"""
+Материализованная лента подписок (fan-out-on-write).
+
+- при публикации пост раскладывается в TimelineEntry всех подписчиков автора;
+- при подписке в ленту сразу попадают последние посты автора, при отписке
+  они удаляются;
+- лента хранит не больше FEED_TIMELINE_LENGTH записей: лишние срезаются при
+  подписке и командой trim_timelines (по расписанию), чтение ленту не пишет;
+- посты авторов с FEED_CELEBRITY_FOLLOWERS и более подписчиками не
+  раскладываются, а подмешиваются при чтении (fan-out-on-read); когда их
+  становится меньше порога, последние посты автора раскладывает по лентам
+  команда trim_timelines;
+- когда записей в ленте не хватает на страницу (лента обрезана или еще не
+  заполнена), страница читается прежним запросом по подпискам.
+
+Лента читается keyset-пагинацией по (pub_date, id) без OFFSET и COUNT.
+Листание назад (редкий сценарий) идет прямым запросом по подпискам.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from posts.cards import card_queryset
+from posts.models import Post
+from posts.pagination import PREVIOUS, CursorPage, CursorPaginator, encode_cursor, keyset_condition
+from .models import Subscription, TimelineEntry
+
+CELEBRITIES_CACHE_KEY = 'feed:celebrity_authors'
+# Популярные авторы, чьи посты еще не разложены по лентам: набор без срока
+# жизни, выпавших из него раскладывает fan_out_former_celebrities (trim_timelines)
+KNOWN_CELEBRITIES_CACHE_KEY = 'feed:celebrity_authors:known'
+CELEBRITIES_CACHE_TIMEOUT = 600
+FAN_OUT_BATCH_SIZE = 1000
+
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+POST_ORDERING = ('-pub_date', '-pk')
+
+
+def timeline_length():
+    return getattr(settings, 'FEED_TIMELINE_LENGTH', 500)
+
+
+def _compute_celebrity_author_ids():
+    threshold = getattr(settings, 'FEED_CELEBRITY_FOLLOWERS', 10000)
+    return set(
+        Subscription.objects.values('author').annotate(
+            followers=Count('id')
+        ).filter(followers__gte=threshold).values_list('author', flat=True)
+    )
+
+
+def celebrity_author_ids():
+    """
+    Авторы, чьи посты читаются при показе ленты, а не раскладываются по лентам.
+    Автор, переставший быть популярным, остается в наборе, пока
+    fan_out_former_celebrities не разложит его посты по лентам подписчиков.
+    """
+    def compute():
+        celebrities = _compute_celebrity_author_ids()
+        known = cache.get(KNOWN_CELEBRITIES_CACHE_KEY, set())
+        if not celebrities <= known:
+            # Новых популярных запоминаем сразу: когда они выпадут из набора,
+            # их посты, не разложенные по лентам, разложит trim_timelines
+            cache.set(KNOWN_CELEBRITIES_CACHE_KEY, known | celebrities, None)
+        return celebrities | known
+    return cache.get_or_set(CELEBRITIES_CACHE_KEY, compute, CELEBRITIES_CACHE_TIMEOUT)
+
+
+def fan_out_former_celebrities():
+    """
+    Раскладывает по лентам подписчиков последние посты авторов, переставших
+    быть популярными, и запоминает текущий набор популярных. Выполняется
+    командой trim_timelines, а не в запросе: на автора это до
+    FEED_TIMELINE_LENGTH записей на каждого подписчика. Возвращает число авторов.
+    """
+    celebrities = _compute_celebrity_author_ids()
+    former = cache.get(KNOWN_CELEBRITIES_CACHE_KEY, set()) - celebrities
+    # Сначала набор, потом раскладка: новые посты этих авторов с этого
+    # момента раскладывает fan_out_post, повторы отсекает ignore_conflicts
+    cache.set(KNOWN_CELEBRITIES_CACHE_KEY, celebrities, None)
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    for author_id in former:
+        fan_out_recent_posts(author_id)
+    return len(former)
+
+
+def _entries_for(post, owner_ids):
+    return [
+        TimelineEntry(owner_id=owner_id, post_id=post.pk, author_id=post.author_id, pub_date=post.pub_date)
+        for owner_id in owner_ids
+    ]
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in celebrity_author_ids():
+        return 0
+    follower_ids = list(
+        Subscription.objects.filter(author_id=post.author_id).values_list('subscriber_id', flat=True)
+    )
+    for start in range(0, len(follower_ids), FAN_OUT_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            _entries_for(post, follower_ids[start:start + FAN_OUT_BATCH_SIZE]),
+            ignore_conflicts=True
+        )
+    return len(follower_ids)
+
+
+def _recent_posts(author_id):
+    return list(
+        Post.objects.filter(author_id=author_id).order_by(*POST_ORDERING).only(
+            'pk', 'author_id', 'pub_date'
+        )[:timeline_length()]
+    )
+
+
+def fan_out_recent_posts(author_id):
+    """
+    Раскладывает последние посты автора по лентам всех его подписчиков -
+    когда автор перестал быть популярным. Ленты срезает trim_timelines.
+    """
+    posts = _recent_posts(author_id)
+    follower_ids = list(
+        Subscription.objects.filter(author_id=author_id).values_list('subscriber_id', flat=True)
+    )
+    batch_size = max(FAN_OUT_BATCH_SIZE // max(len(posts), 1), 1)
+    for start in range(0, len(follower_ids), batch_size):
+        owner_ids = follower_ids[start:start + batch_size]
+        TimelineEntry.objects.bulk_create(
+            [entry for post in posts for entry in _entries_for(post, owner_ids)],
+            ignore_conflicts=True
+        )
+
+
+def backfill_timeline(owner_id, author_id):
+    """Добавляет в ленту нового подписчика последние посты автора."""
+    if author_id in celebrity_author_ids():
+        return
+    entries = [entry for post in _recent_posts(author_id) for entry in _entries_for(post, [owner_id])]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    trim_timeline(owner_id)
+
+
+def remove_author_from_timeline(owner_id, author_id):
+    TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+
+def trim_timeline(owner_id):
+    """Срезает ленту до FEED_TIMELINE_LENGTH самых свежих записей."""
+    length = timeline_length()
+    entries = TimelineEntry.objects.filter(owner_id=owner_id)
+    # Первая лишняя запись находится по индексу (owner, -pub_date, -post)
+    cutoff = entries.order_by('-pub_date', '-post_id').values_list('pub_date', 'post_id')[length:length + 1]
+    cutoff = list(cutoff)
+    if not cutoff:
+        return 0
+    pub_date, post_id = cutoff[0]
+    return entries.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lte=post_id)
+    ).delete()[0]
+
+
+def get_feed_page(user, cursor=None, limit=10):
+    """
+    Страница ленты подписок пользователя (CursorPage) по курсору из
+    posts.pagination: посты от новых к старым и курсоры соседних страниц.
+    """
+    followed_ids = list(
+        Subscription.objects.filter(subscriber=user).values_list('author_id', flat=True)
+    )
+    if not followed_ids:
+        return CursorPage([])
+
+    direct = CursorPaginator(
+        card_queryset(Post.objects.filter(author_id__in=followed_ids)),
+        POST_ORDERING,
+        limit
+    )
+    decoded = direct.decode(cursor)
+    if decoded is not None and decoded[0] == PREVIOUS:
+        return direct.get_page(cursor)
+
+    cursor_key = tuple(decoded[1]) if decoded else None
+    keys = list(
+        TimelineEntry.objects.filter(owner=user).filter(
+            keyset_condition(TIMELINE_ORDERING, cursor_key or ())
+        ).order_by(*TIMELINE_ORDERING).values_list('pub_date', 'post_id')[:limit + 1]
+    )
+    if len(keys) <= limit:
+        # Лента закончилась раньше страницы (обрезана или еще не заполнена) -
+        # вся страница читается прямым запросом по подпискам
+        return direct.get_page(cursor)
+
+    celebrities = celebrity_author_ids().intersection(followed_ids)
+    if celebrities:
+        # Посты старше последней записи ленты подмешиваются на следующих
+        # страницах - вместе с постами остальных авторов той же давности
+        oldest = keys[-1]
+        keys += [
+            key for key in Post.objects.filter(author_id__in=celebrities).filter(
+                keyset_condition(POST_ORDERING, cursor_key or ())
+            ).order_by(*POST_ORDERING).values_list('pub_date', 'pk')[:limit + 1]
+            if key >= oldest
+        ]
+    keys = sorted(set(keys), reverse=True)[:limit + 1]
+
+    page_keys = keys[:limit]
+    posts_by_id = {post.pk: post for post in direct.queryset.filter(pk__in=[pk for _, pk in page_keys])}
+    posts = [posts_by_id[pk] for _, pk in page_keys if pk in posts_by_id]
+
+    # В ленте есть запись за страницей - следующая страница точно есть
+    previous_cursor = encode_cursor(page_keys[0], PREVIOUS) if cursor_key is not None else None
+    return CursorPage(posts, next_cursor=encode_cursor(page_keys[-1]), previous_cursor=previous_cursor)
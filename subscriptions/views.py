@@ -22,19 +22,22 @@ from django.shortcuts import get_object_or_404, redirect
 from django.http import JsonResponse
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
-from django.db.models import Count, Exists, OuterRef
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
 import logging
 
+from Chatty_orange.ratelimit import rate_limit
+from posts.cards import PostCardsMixin
 from posts.models import Post
 from .models import Subscription
+from .timeline import get_feed_page
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
 @method_decorator(ensure_csrf_cookie, name='dispatch')  # ✅ CSRF защита
+@method_decorator(rate_limit('subscription_toggle'), name='post')
 class SubscriptionToggleView(LoginRequiredMixin, View):
     """
     Представление для подписки/отписки от пользователя.
@@ -179,35 +182,22 @@ class FollowingListView(ListView):
         return context
 
 
-class FeedView(LoginRequiredMixin, ListView):
+class FeedView(LoginRequiredMixin, PostCardsMixin, ListView):
     """
     Отображает ленту постов от пользователей, на которых подписан текущий пользователь.
+    Лента читается из материализованной ленты (subscriptions.timeline)
+    постранично по курсору ?cursor=..., без OFFSET и подсчета общего числа постов.
     """
     model = Post
     template_name = 'subscriptions/feed.html'
     context_object_name = 'posts'
     paginate_by = 10
+    card_body_template = 'subscriptions/includes/feed_card_body.html'
 
     def get_queryset(self):
-        if not self.request.user.is_authenticated:
-            return Post.objects.none()
-
-        # Получаем ID пользователей, на которых подписан текущий пользователь
-        following_users = Subscription.objects.filter(
-            subscriber=self.request.user
-        ).values_list('author_id', flat=True)
-
-        # Возвращаем посты от этих пользователей с аннотациями и предзагрузкой связанных данных
-        return Post.objects.filter(
-            author_id__in=following_users
-        ).select_related(
-            'author'  # Загружаем информацию об авторе одним запросом
-        ).prefetch_related(
-            'images',  # ВАЖНО! Загружаем все изображения для постов
-            'likes',  # Загружаем лайки для проверки, лайкнул ли текущий пользователь
-            'tags',  # Загружаем теги, если они отображаются в ленте
-            'comments'  # Загружаем комментарии для подсчета
-        ).annotate(
-            num_comments=Count('comments', distinct=True),
-            num_likes=Count('likes', distinct=True)
-        ).order_by('-pub_date')
\ No newline at end of file
+        # Сами посты страницы выбирает get_feed_page в paginate_queryset
+        return Post.objects.none()
+
+    def paginate_queryset(self, queryset, page_size):
+        page = get_feed_page(self.request.user, self.request.GET.get('cursor'), limit=page_size)
+        return None, page, page.object_list, page.has_other_pages()
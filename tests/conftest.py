@@ -15,6 +15,7 @@
 
 
 import pytest
+from django.core.cache import caches
 from django.test import Client
 
 
@@ -155,4 +156,17 @@ def media_storage(settings, tmpdir):
     """
     Настраивает временное хранилище для медиа-файлов в тестах.
     """
-    settings.MEDIA_ROOT = tmpdir.strpath
\ No newline at end of file
+    settings.MEDIA_ROOT = tmpdir.strpath
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Очищает все кэши до и после теста: кэшированные данные сайдбара и ленты,
+    счетчики rate limiting и сессии не должны переходить из одного теста в
+    другой (fakeredis хранит их в памяти процесса между тестами).
+    """
+    for alias in caches:
+        caches[alias].clear()
+    yield
+    for alias in caches:
+        caches[alias].clear()
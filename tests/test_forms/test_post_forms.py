@@ -17,6 +17,18 @@ class TestPostForm:
         form = PostForm(data=form_data, user=user)
         assert form.is_valid()
 
+    def test_text_is_sanitized(self, user):
+        """Форма сохраняет исходный HTML, пост показывает очищенный."""
+        text = '<p style="color: red" onmouseover="steal()">Текст поста с разметкой</p><iframe src="//evil"></iframe>'
+        form = PostForm(data={'title': 'Test Post Title', 'text': text, 'agree_to_rules': True}, user=user)
+        assert form.is_valid()
+
+        post = form.save(commit=False)
+        post.author = user
+        post.save()
+        assert post.text == text
+        assert post.text_html == '<p style="color: red;">Текст поста с разметкой</p>'
+
     def test_title_too_short(self, user):
         """Тест слишком короткого заголовка."""
         form_data = {
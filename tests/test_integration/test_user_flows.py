@@ -167,4 +167,103 @@ class TestUserFlows:
         assert response.status_code == 200
         assert 'I am a Chatty user!' in response.content.decode()
         assert 'Twitter: @chattyuser' in response.content.decode()
-        assert 'updated@example.com' in response.content.decode()
\ No newline at end of file
+        assert 'updated@example.com' in response.content.decode()
+
+@pytest.mark.django_db
+class TestCacheAliases:
+    """Алиасы кэша на Redis (в тестах - fakeredis)."""
+
+    def test_aliases_are_isolated(self):
+        """Алиасы живут в разных БД Redis и не видят ключи друг друга."""
+        from django.core.cache import caches
+
+        caches['default'].set('shared-key', 'default')
+        caches['ratelimit'].set('shared-key', 'ratelimit')
+
+        assert caches['default'].get('shared-key') == 'default'
+        assert caches['ratelimit'].get('shared-key') == 'ratelimit'
+        assert caches['fragments'].get('shared-key') is None
+
+    def test_session_is_cached_in_sessions_alias(self, authenticated_client):
+        """Сессия после входа читается из кэша sessions."""
+        from django.contrib.sessions.backends.cached_db import KEY_PREFIX
+        from django.core.cache import caches
+
+        session_key = authenticated_client.cookies['sessionid'].value
+        assert caches['sessions'].get(KEY_PREFIX + session_key) is not None
+        assert caches['default'].get(KEY_PREFIX + session_key) is None
+
+    def test_rate_limit_counters_use_ratelimit_alias(self):
+        """Счетчики ассистента хранятся в алиасе ratelimit."""
+        from django.core.cache import caches
+        from Chatty_orange import ratelimit
+
+        ratelimit.check('ip_10.0.0.1', 'assistant', 'assistant:general_chat')
+
+        assert caches['ratelimit'].get('assistant:ip_10.0.0.1') is not None
+        assert caches['ratelimit'].get('assistant:general_chat:ip_10.0.0.1') is not None
+        assert caches['default'].get('assistant:ip_10.0.0.1') is None
+
+
+@pytest.mark.django_db
+class TestRateLimiter:
+    """Атомарный rate limiter (GCRA в Lua-скрипте) и декоратор rate_limit."""
+
+    def test_burst_then_block_with_retry_after(self):
+        """Пропускает всплеск до лимита, затем отказывает и сообщает, когда повторить."""
+        from Chatty_orange.ratelimit import consume
+
+        results = [consume('user_1', [('test', 3, 60)]) for _ in range(4)]
+
+        assert [result.allowed for result in results] == [True, True, True, False]
+        assert [result.used for result in results] == [1, 2, 3, 3]
+        # Следующий запрос освободится через period / limit = 20 секунд
+        assert 19 < results[-1].retry_after <= 20
+
+    def test_denied_request_is_not_charged_to_other_quotas(self):
+        """Запрос списывается со всех квот сразу или ни с одной."""
+        from Chatty_orange.ratelimit import consume
+
+        assert consume('user_1', [('narrow', 1, 60)]).allowed
+        assert not consume('user_1', [('wide', 5, 60), ('narrow', 1, 60)]).allowed
+
+        assert consume('user_1', [('wide', 5, 60)]).used == 1
+
+    def test_parallel_requests_do_not_exceed_limit(self):
+        """Параллельные запросы не проскакивают лимит (нет потерянных обновлений)."""
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from Chatty_orange.ratelimit import consume
+
+        barrier = threading.Barrier(20)
+
+        def worker(_):
+            barrier.wait()
+            return consume('user_1', [('parallel', 5, 60)]).allowed
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            allowed = list(executor.map(worker, range(20)))
+
+        assert allowed.count(True) == 5
+
+    @override_settings(RATE_LIMITS={'post_reaction': (2, 60)})
+    def test_decorator_limits_post_likes(self, authenticated_client, post):
+        """PostLikeView отвечает 429 с Retry-After после исчерпания квоты."""
+        url = reverse('posts:post-like', kwargs={'pk': post.pk})
+
+        assert authenticated_client.post(url).status_code == 200
+        assert authenticated_client.post(url).status_code == 200
+        response = authenticated_client.post(url)
+
+        assert response.status_code == 429
+        assert response.json()['status'] == 'error'
+        assert int(response['Retry-After']) == 30
+
+    @override_settings(RATE_LIMITS={'subscription_toggle': (1, 60)})
+    def test_decorator_limits_subscription_toggle(self, authenticated_client, another_user):
+        """Квота подписок считается по пользователю."""
+        url = reverse('subscriptions:toggle', kwargs={'username': another_user.username})
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+        assert authenticated_client.post(url, **headers).status_code == 200
+        assert authenticated_client.post(url, **headers).status_code == 429
@@ -1,4 +1,5 @@
 import pytest
+from django.core.management import call_command
 from django.urls import reverse
 from posts.models import Post, Comment, Tag
 from tests.factories import PostFactory, UserFactory, TagFactory
@@ -63,6 +64,32 @@ class TestPostModel:
         post.likes.remove(user)
         assert post.total_likes() == 1
 
+    def test_text_sanitized_on_save(self, user):
+        """Рядом с исходным текстом - очищенный HTML, текст без разметки и начало."""
+        text = (
+            '<p onclick="alert(1)" style="color: red; position: fixed">Привет, <strong>мир</strong></p>'
+            '<script>x()</script><a href="javascript:alert(1)">ссылка</a><ul><li>один</li><li>два</li></ul>'
+            + 'слово ' * 100
+        )
+        post = Post.objects.create(author=user, title='Test Post', text=text)
+
+        assert post.text == text
+        assert 'onclick' not in post.text_html
+        assert '<script>' not in post.text_html
+        assert 'javascript:' not in post.text_html
+        assert '<p style="color: red;">Привет, <strong>мир</strong></p>' in post.text_html
+        assert post.text_plain.startswith('Привет, мир')
+        assert 'ссылка один два слово' in post.text_plain
+        assert len(post.excerpt) <= 300
+        assert post.excerpt.endswith('…')
+
+        post.text = '<p>Новый &amp; текст</p>'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        assert (post.text_html, post.text_plain, post.excerpt) == (
+            '<p>Новый &amp; текст</p>', 'Новый & текст', 'Новый & текст'
+        )
+
     def test_post_tags(self, post, tag):
         """Тест работы с тегами."""
         post.tags.add(tag)
@@ -140,4 +167,95 @@ class TestTagModel:
         assert len(popular) == 3
         # Проверяем, что теги отсортированы по популярности
         assert popular[0].posts_count >= popular[1].posts_count
-        assert popular[1].posts_count >= popular[2].posts_count
\ No newline at end of file
+        assert popular[1].posts_count >= popular[2].posts_count
+
+@pytest.mark.django_db
+class TestPostCounters:
+    """Тесты денормализованных счетчиков поста."""
+
+    def test_likes_and_dislikes_counters(self, post, user, another_user):
+        """Счетчики следуют за добавлением и удалением реакций с обеих сторон связи."""
+        post.likes.add(user, another_user)
+        another_user.disliked_posts.add(post)
+        post.refresh_from_db()
+        assert post.likes_count == 2
+        assert post.dislikes_count == 1
+
+        post.likes.remove(user)
+        post.likes.remove(user)  # повторное удаление не должно уводить счетчик в минус
+        another_user.disliked_posts.clear()
+        post.refresh_from_db()
+        assert post.likes_count == 1
+        assert post.dislikes_count == 0
+
+        post.likes.clear()
+        post.refresh_from_db()
+        assert post.likes_count == 0
+
+    def test_comments_counter_counts_only_active(self, post, user):
+        """Счетчик комментариев учитывает только активные комментарии."""
+        comment = Comment.objects.create(post=post, author=user, text='Первый')
+        Comment.objects.create(post=post, author=user, text='Скрытый', is_active=False)
+        post.refresh_from_db()
+        assert post.comments_count == 1
+
+        comment.is_active = False
+        comment.save()
+        post.refresh_from_db()
+        assert post.comments_count == 0
+
+        comment.is_active = True
+        comment.save()
+        comment.delete()
+        post.refresh_from_db()
+        assert post.comments_count == 0
+
+    def test_save_does_not_overwrite_counters(self, post, user):
+        """Сохранение устаревшего экземпляра не затирает свежие счетчики."""
+        stale = Post.objects.get(pk=post.pk)
+        post.likes.add(user)
+
+        stale.title = 'Обновленный заголовок'
+        stale.save()
+
+        post.refresh_from_db()
+        assert post.title == 'Обновленный заголовок'
+        assert post.likes_count == 1
+
+    def test_save_skips_deferred_fields(self, post):
+        """Сохранение экземпляра из card_queryset не догружает и не пишет отложенные поля."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from posts.cards import card_queryset
+        card = card_queryset(Post.objects.filter(pk=post.pk)).get()
+
+        card.title = 'Заголовок из карточки'
+        with CaptureQueriesContext(connection) as queries:
+            card.save()
+
+        post_queries = [query['sql'] for query in queries.captured_queries if 'posts_post"' in query['sql']]
+        assert not any('"text' in sql for sql in post_queries)
+        post.refresh_from_db()
+        assert post.title == 'Заголовок из карточки'
+        assert post.text_plain
+
+    def test_user_deletion_releases_reactions(self, post, another_user):
+        """При удалении пользователя его лайк перестает учитываться."""
+        post.likes.add(another_user)
+        another_user.delete()
+        post.refresh_from_db()
+        assert post.likes_count == 0
+
+    def test_reconcile_command_fixes_drift(self, post, user):
+        """Команда reconcile_post_counters исправляет разошедшиеся счетчики."""
+        post.likes.add(user)
+        Post.objects.filter(pk=post.pk).update(likes_count=42, comments_count=7)
+
+        call_command('reconcile_post_counters', '--dry-run')
+        post.refresh_from_db()
+        assert post.likes_count == 42
+
+        call_command('reconcile_post_counters')
+        post.refresh_from_db()
+        assert post.likes_count == 1
+        assert post.comments_count == 0
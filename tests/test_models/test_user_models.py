@@ -1,7 +1,11 @@
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.urls import reverse
 
+from tests.factories import UserFactory
+from users.lookup import get_user_by_username, lookup_user, suggest_usernames
+
 User = get_user_model()
 
 
@@ -52,4 +56,49 @@ class TestCustomUserModel:
 
         saved_user = User.objects.get(pk=user.pk)
         assert saved_user.bio == "Test bio"
-        assert saved_user.contacts == "Test contacts"
\ No newline at end of file
+        assert saved_user.contacts == "Test contacts"
+
+@pytest.mark.django_db
+class TestUsernameLookup:
+    """Тесты поиска пользователя по имени."""
+
+    def test_exact_lookup_ignores_case(self):
+        """Точный поиск не зависит от регистра."""
+        user = UserFactory(username='OrangeFan')
+        assert get_user_by_username('orangefan') == user
+        assert lookup_user('ORANGEFAN') == (user, [])
+
+    def test_suggestions_for_typo(self):
+        """Для имени с опечаткой предлагаются похожие имена, самое похожее первым."""
+        UserFactory(username='orange_fan')
+        UserFactory(username='orange_lover')
+        UserFactory(username='orangutan_42')
+        UserFactory(username='banana')
+        UserFactory(username='orange_fun', is_active=False)
+
+        user, suggestions = lookup_user('@orang_fan')
+
+        assert user is None
+        assert suggestions[0] == 'orange_fan'
+        assert 'banana' not in suggestions
+        assert 'orange_fun' not in suggestions  # неактивные не предлагаются
+
+    @pytest.mark.parametrize('query', ['range_fan', 'ornage_fan', 'orxnge_fan', 'oorange_fan'])
+    def test_suggestions_for_typo_in_prefix(self, query):
+        """Без pg_trgm опечатка в первых символах имени тоже находит похожие имена."""
+        from unittest.mock import patch
+        UserFactory(username='orange_fan')
+        UserFactory(username='banana_fan')
+
+        with patch('users.lookup.has_trigram_support', return_value=False):
+            assert suggest_usernames(query)[0] == 'orange_fan'
+
+    def test_no_suggestions_for_empty_query(self):
+        """Пустой запрос не порождает подсказок."""
+        assert suggest_usernames('  ') == []
+
+    def test_benchmark_command_rolls_back(self):
+        """Бенчмарк работает на маленькой таблице и не оставляет синтетических пользователей."""
+        UserFactory()
+        call_command('benchmark_username_lookup', '--users', '50', '--queries', '5')
+        assert User.objects.count() == 1
@@ -1,21 +1,32 @@
 import pytest
 from unittest.mock import patch, Mock
 from django.test import override_settings
-from django.core.cache import cache
+from django.core.cache import caches
 
 
 @pytest.fixture(autouse=True)
 def clear_cache():
-    """Автоматически очищает кеш перед каждым тестом Orange Assistant."""
-    cache.clear()
+    """Автоматически очищает все кеши перед каждым тестом Orange Assistant."""
+    for alias in caches:
+        caches[alias].clear()
     yield
-    cache.clear()
+    for alias in caches:
+        caches[alias].clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_ai_client():
+    """Клиент ИИ общий для процесса: каждый тест начинает с нового."""
+    from orange_assistant.ai_client import reset_client
+    reset_client()
+    yield
+    reset_client()
 
 
 @pytest.fixture
 def mock_gemini_api():
     """Мок для Google Gemini API с различными типами ответов."""
-    with patch('orange_assistant.ai_services.genai') as mock_genai:
+    with patch('orange_assistant.ai_client.genai') as mock_genai:
         # Настраиваем мок модели
         mock_model = Mock()
         mock_response = Mock()
@@ -50,7 +61,7 @@ def mock_gemini_response():
 @pytest.fixture
 def mock_gemini_error():
     """Мок для тестирования ошибок Gemini API."""
-    with patch('orange_assistant.ai_services.genai') as mock_genai:
+    with patch('orange_assistant.ai_client.genai') as mock_genai:
         mock_genai.configure.side_effect = Exception("API connection error")
         yield mock_genai
 
@@ -32,11 +32,13 @@ from orange_assistant.ai_services import (
     get_faq_answer,
     get_feature_explanation,
     get_interactive_tour_step,
-    get_post_creation_suggestion
+    get_post_creation_suggestion,
+    profile_analysis_prompt,
 )
 from posts.models import Post, Comment, Tag
 from subscriptions.models import Subscription
 from tests.factories import UserFactory, PostFactory, TagFactory
+from users.profile_stats import get_profile_stats
 
 User = get_user_model()
 
@@ -46,7 +48,7 @@ class TestAIServices:
     """Тесты для AI сервисов Orange Assistant."""
 
     @override_settings(GOOGLE_API_KEY='test-api-key')
-    @patch('orange_assistant.ai_services.genai')
+    @patch('orange_assistant.ai_client.genai')
     def test_get_gemini_response_success(self, mock_genai):
         """Тест успешного получения ответа от Gemini AI."""
         # Мокаем ответ от Gemini
@@ -64,7 +66,7 @@ class TestAIServices:
         mock_genai.GenerativeModel.assert_called_once_with('gemini-2.0-flash')
 
     @override_settings(GOOGLE_API_KEY='test-api-key')
-    @patch('orange_assistant.ai_services.genai')
+    @patch('orange_assistant.ai_client.genai')
     def test_get_gemini_response_with_candidates(self, mock_genai):
         """Тест получения ответа через candidates."""
         mock_model = Mock()
@@ -95,7 +97,7 @@ class TestAIServices:
         assert "Ключ API для сервиса ИИ не настроен" in result
 
     @override_settings(GOOGLE_API_KEY="test_key")
-    @patch('orange_assistant.ai_services.genai.configure')
+    @patch('orange_assistant.ai_client.genai.configure')
     def test_get_gemini_response_api_error(self, mock_genai_configure):
         """ИСПРАВЛЕНО: Тест обработки ошибки API."""
         # Мокируем ошибку при вызове configure
@@ -167,6 +169,18 @@ class TestAIServices:
 
         assert "не найден" in result
 
+    def test_find_user_by_username_suggests_similar_names(self):
+        """Тест подсказки похожих имен при опечатке."""
+        UserFactory(username="orange_blogger")
+
+        result = find_user_by_username(
+            username="orange_bloger",
+            user_info={"username": "searcher"}
+        )
+
+        assert "не найден" in result
+        assert "@orange_blogger" in result
+
     def test_get_subscription_recommendations_with_users(self):
         """Тест получения рекомендаций подписок."""
         # Создаем пользователей и посты
@@ -186,6 +200,25 @@ class TestAIServices:
         assert "Рекомендую подписаться" in result
         assert popular_user1.username in result
 
+    def test_get_subscription_recommendations_excludes_subscriptions(self, django_assert_num_queries):
+        """Подписки исключаются, а статистика авторов берется одним запросом (без N+1)."""
+        current_user = UserFactory()
+        followed = UserFactory(username="followed_author")
+        PostFactory.create_batch(4, author=followed)
+        Subscription.objects.create(subscriber=current_user, author=followed)
+        for index in range(5):
+            PostFactory(author=UserFactory(username=f"author_{index}"), title=f"Заголовок {index}")
+
+        with django_assert_num_queries(1):
+            result = get_subscription_recommendations(
+                user_info={"username": current_user.username},
+                current_user_id=current_user.id
+            )
+
+        assert "followed_author" not in result
+        assert "author_4" in result
+        assert 'Последний пост: "Заголовок 4...' in result
+
     def test_get_subscription_recommendations_no_users(self):
         """Тест рекомендаций при отсутствии пользователей."""
         result = get_subscription_recommendations(
@@ -235,6 +268,21 @@ class TestAIServices:
         assert user.username in result
         assert "Вот что я нашел" in result
 
+    def test_get_post_details_reads_counters(self, django_assert_num_queries):
+        """Реакции и комментарии берутся из счетчиков поста, без COUNT по связям."""
+        post = PostFactory()
+        post.likes.add(UserFactory(), UserFactory())
+        post.dislikes.add(UserFactory())
+        Comment.objects.create(post=post, author=UserFactory(), text="Комментарий")
+
+        # пост с автором, последние комментарии с авторами
+        with django_assert_num_queries(2):
+            result = get_post_details(post_id=post.id, user_info={"username": "searcher"})
+
+        assert "Лайков: 2" in result
+        assert "Дизлайков: 1" in result
+        assert "Комментариев: 1" in result
+
     def test_get_post_details_not_found(self):
         """Тест получения деталей несуществующего поста."""
         result = get_post_details(
@@ -285,6 +333,41 @@ class TestAIServices:
 
         assert "не найден" in result
 
+    def test_profile_stats_in_one_query(self, django_assert_num_queries):
+        """Вся статистика профиля - одним запросом, подписчики считаются по author."""
+        user = UserFactory()
+        fan, other = UserFactory(), UserFactory()
+        posts = PostFactory.create_batch(3, author=user)
+        posts[0].likes.add(fan, other)
+        posts[1].likes.add(fan)
+        Comment.objects.create(post=posts[0], author=user, text='Спасибо!')
+        Subscription.objects.create(subscriber=fan, author=user)
+        Subscription.objects.create(subscriber=user, author=other)
+
+        with django_assert_num_queries(1):
+            prompt = profile_analysis_prompt(user.id)
+
+        assert "Постов: 3" in prompt
+        assert "Комментариев: 1" in prompt
+        assert "Получено лайков: 3" in prompt
+        assert "Подписчиков: 1" in prompt
+        assert "Подписок: 1" in prompt
+
+    def test_profile_stats_cache_reset_on_changes(self, django_assert_num_queries):
+        """Статистика берется из кэша и сбрасывается при новых постах и подписках."""
+        user = UserFactory()
+        PostFactory(author=user)
+        assert get_profile_stats(user.id)['posts_count'] == 1
+
+        with django_assert_num_queries(0):
+            assert get_profile_stats(user.id)['posts_count'] == 1
+
+        PostFactory(author=user)
+        Subscription.objects.create(subscriber=UserFactory(), author=user)
+        stats = get_profile_stats(user.id)
+        assert stats['posts_count'] == 2
+        assert stats['subscribers_count'] == 1
+
     @patch('orange_assistant.ai_services.get_gemini_response')
     def test_generate_post_ideas(self, mock_gemini):
         """Тест генерации идей для постов."""
@@ -593,4 +676,474 @@ class TestAIServicesIntegration:
         find_user_by_username(user.username, {"username": "test"})
 
         # Должно быть несколько вызовов логирования
-        assert mock_logger.info.call_count >= 3
\ No newline at end of file
+        assert mock_logger.info.call_count >= 3
+
+@pytest.mark.django_db
+class TestGeminiResponseCache:
+    """Кэш ответов Gemini для неперсональных действий."""
+
+    @patch('orange_assistant.ai_services.get_gemini_response')
+    def test_faq_answer_is_shared_between_users(self, mock_gemini):
+        """Одинаковый вопрос разных пользователей уходит в Gemini один раз."""
+        mock_gemini.return_value = "Ответ на FAQ"
+
+        first = get_faq_answer("Как создать пост?", {"username": "alice"})
+        second = get_faq_answer("  как   создать ПОСТ? ", {"username": "bob"})
+
+        assert first == second == "Ответ на FAQ"
+        mock_gemini.assert_called_once()
+        assert "alice" not in mock_gemini.call_args[0][0]
+
+    @patch('orange_assistant.ai_services.get_gemini_response')
+    def test_error_responses_are_not_cached(self, mock_gemini):
+        """Ответ-ошибка не кэшируется: следующий запрос снова идет в Gemini."""
+        mock_gemini.side_effect = [
+            "Произошла ошибка при обращении к сервису ИИ. Подробности: timeout",
+            "Идеи для постов",
+        ]
+
+        generate_post_ideas({"username": "alice"}, tags=["Python"])
+        result = generate_post_ideas({"username": "alice"}, tags=["Python"])
+
+        assert result == "Идеи для постов"
+        assert mock_gemini.call_count == 2
+
+    @override_settings(AI_RESPONSE_CACHE_MAX_ENTRIES=2)
+    @patch('orange_assistant.ai_services.get_gemini_response')
+    def test_least_recently_used_answer_is_evicted(self, mock_gemini):
+        """Сверх лимита вытесняется ответ, к которому дольше всего не обращались."""
+        mock_gemini.side_effect = lambda prompt, action=None: f"Ответ {mock_gemini.call_count}"
+
+        get_faq_answer("вопрос 1", {})
+        get_faq_answer("вопрос 2", {})
+        get_faq_answer("вопрос 1", {})  # попадание освежает первый ответ
+        get_faq_answer("вопрос 3", {})  # вытесняет второй
+        assert mock_gemini.call_count == 3
+
+        get_faq_answer("вопрос 1", {})
+        assert mock_gemini.call_count == 3
+        get_faq_answer("вопрос 2", {})
+        assert mock_gemini.call_count == 4
+
+    @patch('orange_assistant.ai_services.get_gemini_response')
+    def test_hit_and_miss_metrics(self, mock_gemini):
+        """Попадания и промахи считаются по действиям."""
+        from orange_assistant import response_cache
+
+        mock_gemini.return_value = "Объяснение"
+        for _ in range(3):
+            get_feature_explanation("как работают лайки", {"username": "alice"})
+
+        stats = response_cache.get_stats()
+        assert stats['entries'] == 1
+        assert stats['actions']['feature_explanation'] == {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3}
+
+
+class TestAIClient:
+    """Общий для процесса клиент ИИ."""
+
+    @override_settings(GOOGLE_API_KEY='test-api-key')
+    @patch('orange_assistant.ai_client.genai')
+    def test_client_is_configured_once_per_process(self, mock_genai):
+        """configure и GenerativeModel вызываются один раз на несколько запросов."""
+        mock_model = Mock()
+        mock_model.generate_content.return_value = Mock(parts=[Mock(text="Ответ")])
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        for _ in range(3):
+            assert get_gemini_response("Промпт") == "Ответ"
+
+        mock_genai.configure.assert_called_once_with(api_key='test-api-key')
+        mock_genai.GenerativeModel.assert_called_once_with('gemini-2.0-flash')
+        assert mock_model.generate_content.call_count == 3
+
+    @override_settings(AI_CLIENT_BACKEND='orange_assistant.ai_client.StubBackend', GOOGLE_API_KEY=None)
+    def test_stub_backend_works_offline(self):
+        """Заглушка отвечает без ключа API и сети, синхронно и асинхронно."""
+        from asgiref.sync import async_to_sync
+        from orange_assistant.ai_services import aget_gemini_response
+
+        sync_result = get_gemini_response("Как  создать пост?")
+        async_result = async_to_sync(aget_gemini_response)("Как  создать пост?")
+
+        assert sync_result == async_result
+        assert "Как создать пост?" in sync_result
+
+
+class FlakyBackend:
+    """Бэкенд, отвечающий заданными ошибками, а затем текстом."""
+
+    def __init__(self, *errors, text="Ответ"):
+        self.errors = list(errors)
+        self.text = text
+        self.timeouts = []
+
+    def generate(self, prompt, timeout=None):
+        self.timeouts.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.text
+
+    def stream(self, prompt, timeout=None):
+        self.timeouts.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        yield from self.text.split(' ')
+
+
+@pytest.mark.django_db
+class TestResilience:
+    """Дедлайны, повторы и circuit breaker вокруг вызовов Gemini."""
+
+    @pytest.fixture(autouse=True)
+    def fast_retries(self, settings):
+        settings.AI_RETRY_BASE_DELAY = 0
+        settings.AI_CIRCUIT_FAILURE_THRESHOLD = 3
+        settings.AI_RETRY_ATTEMPTS = 3
+
+    def respond(self, backend, prompt="Промпт", action=None):
+        with patch('orange_assistant.ai_client.get_client', return_value=backend):
+            return get_gemini_response(prompt, action)
+
+    def test_transient_errors_are_retried(self):
+        from google.api_core.exceptions import ServiceUnavailable, TooManyRequests
+        backend = FlakyBackend(ServiceUnavailable("503"), TooManyRequests("429"))
+
+        assert self.respond(backend) == "Ответ"
+        assert len(backend.timeouts) == 3
+
+    def test_permanent_errors_are_not_retried(self):
+        backend = FlakyBackend(ValueError("Неверный запрос"))
+
+        assert "Неверный запрос" in self.respond(backend)
+        assert len(backend.timeouts) == 1
+
+    @override_settings(AI_DEADLINES={'default': 15, 'faq': 3})
+    def test_remaining_deadline_is_passed_to_client(self):
+        backend = FlakyBackend()
+
+        self.respond(backend, action='faq')
+
+        assert 0 < backend.timeouts[0] <= 3
+
+    @override_settings(AI_RETRY_BASE_DELAY=100, AI_RETRY_MAX_DELAY=100)
+    def test_no_retry_past_deadline(self):
+        """Пауза, не укладывающаяся в дедлайн, не делается - сразу ответ об ошибке."""
+        from google.api_core.exceptions import DeadlineExceeded
+        from orange_assistant.ai_services import TIMEOUT_RESPONSE
+        backend = FlakyBackend(DeadlineExceeded("timeout"), DeadlineExceeded("timeout"), DeadlineExceeded("timeout"))
+
+        with patch('orange_assistant.resilience.random.uniform', return_value=100):
+            assert self.respond(backend) == TIMEOUT_RESPONSE
+        assert len(backend.timeouts) == 1
+
+    @override_settings(AI_RETRY_ATTEMPTS=1)
+    def test_circuit_opens_and_serves_degraded_response(self):
+        from google.api_core.exceptions import ServiceUnavailable
+        from orange_assistant.ai_services import DEGRADED_RESPONSE
+        from orange_assistant.resilience import gemini_breaker
+        backend = FlakyBackend(*[ServiceUnavailable("503")] * 3)
+
+        for _ in range(3):
+            self.respond(backend)
+        assert gemini_breaker.state() == 'open'
+
+        assert self.respond(backend) == DEGRADED_RESPONSE
+        assert len(backend.timeouts) == 3
+
+    @override_settings(AI_RETRY_ATTEMPTS=1)
+    def test_half_open_probe_closes_circuit(self):
+        import time
+        from orange_assistant.resilience import gemini_breaker
+        gemini_breaker.open()
+
+        with patch('orange_assistant.resilience.time.time', return_value=time.time() + 60):
+            assert gemini_breaker.state() == 'half_open'
+            assert self.respond(FlakyBackend()) == "Ответ"
+
+        assert gemini_breaker.state() == 'closed'
+
+    def test_half_open_allows_single_probe(self):
+        """Пока пробный запрос не завершился, остальные получают заглушку."""
+        import time
+        from orange_assistant.resilience import gemini_breaker
+        gemini_breaker.open()
+
+        with patch('orange_assistant.resilience.time.time', return_value=time.time() + 60):
+            assert gemini_breaker.allow()
+            assert not gemini_breaker.allow()
+            gemini_breaker.record_failure()
+            assert gemini_breaker.state() == 'open'
+
+    def test_degraded_response_is_not_cached(self):
+        from orange_assistant import resilience
+        from orange_assistant.ai_services import DEGRADED_RESPONSE
+        resilience.gemini_breaker.open()
+
+        with patch('orange_assistant.ai_client.get_client', return_value=FlakyBackend()):
+            assert get_faq_answer("Как создать пост?", {}) == DEGRADED_RESPONSE
+            resilience.gemini_breaker.record_success()
+            assert get_faq_answer("Как создать пост?", {}) == "Ответ"
+
+    def test_stream_is_retried_before_first_chunk(self):
+        from google.api_core.exceptions import ServiceUnavailable
+        from orange_assistant.ai_services import stream_gemini_response
+        backend = FlakyBackend(ServiceUnavailable("503"), text="Ответ по частям")
+
+        with patch('orange_assistant.ai_client.get_client', return_value=backend):
+            assert list(stream_gemini_response("Промпт")) == ["Ответ", "по", "частям"]
+
+    @override_settings(AI_DEADLINES={'default': 0.05}, AI_RETRY_ATTEMPTS=1)
+    def test_async_call_is_cut_at_deadline(self):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from orange_assistant.ai_services import TIMEOUT_RESPONSE, aget_gemini_response
+
+        class SlowBackend:
+            async def agenerate(self, prompt, timeout=None):
+                await asyncio.sleep(5)
+
+        with patch('orange_assistant.ai_client.get_client', return_value=SlowBackend()):
+            assert async_to_sync(aget_gemini_response)("Промпт") == TIMEOUT_RESPONSE
+
+    @override_settings(GOOGLE_API_KEY='test-api-key')
+    @patch('orange_assistant.ai_client.genai')
+    def test_gemini_backend_disables_client_retries(self, mock_genai):
+        mock_model = Mock()
+        mock_model.generate_content.return_value = Mock(parts=[Mock(text="Ответ")])
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        get_gemini_response("Промпт", 'faq')
+
+        options = mock_model.generate_content.call_args.kwargs['request_options']
+        assert options['retry'] is None
+        assert 0 < options['timeout'] <= 10
+
+
+class SlowBackend:
+    """Бэкенд, отвечающий с задержкой и считающий запросы."""
+
+    def __init__(self, delay=0.3, text="Ответ"):
+        self.delay = delay
+        self.text = text
+        self.calls = 0
+
+    def generate(self, prompt, timeout=None):
+        import time
+        self.calls += 1
+        time.sleep(self.delay)
+        return f"{self.text} {self.calls}"
+
+    async def agenerate(self, prompt, timeout=None):
+        import asyncio
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"{self.text} {self.calls}"
+
+    def stream(self, prompt, timeout=None):
+        yield self.generate(prompt, timeout)
+
+
+class TestSingleFlight:
+    """Объединение одинаковых одновременных запросов к Gemini."""
+
+    @pytest.fixture(autouse=True)
+    def fast_polling(self, settings):
+        settings.AI_SINGLEFLIGHT_POLL_INTERVAL = 0.01
+
+    def run_concurrently(self, backend, prompts, respond=get_gemini_response):
+        from concurrent.futures import ThreadPoolExecutor
+        with patch('orange_assistant.ai_client.get_client', return_value=backend):
+            with ThreadPoolExecutor(len(prompts)) as pool:
+                return list(pool.map(respond, prompts))
+
+    def test_identical_concurrent_prompts_share_one_call(self):
+        from orange_assistant import singleflight
+        backend = SlowBackend()
+
+        results = self.run_concurrently(backend, ["Как создать пост?", "как  создать ПОСТ?", "Как создать пост?"])
+
+        assert backend.calls == 1
+        assert results == ["Ответ 1"] * 3
+        assert singleflight.get_stats()['default'] == {'led': 1, 'joined': 2}
+
+    def test_different_prompts_are_not_coalesced(self):
+        backend = SlowBackend(delay=0.1)
+
+        self.run_concurrently(backend, ["Первый промпт", "Второй промпт"])
+
+        assert backend.calls == 2
+
+    def test_sequential_prompts_are_not_shared(self):
+        """Результат полета не кэш: следующий запрос снова идет к сервису."""
+        backend = SlowBackend(delay=0)
+
+        with patch('orange_assistant.ai_client.get_client', return_value=backend):
+            assert get_gemini_response("Промпт") == "Ответ 1"
+            assert get_gemini_response("Промпт") == "Ответ 2"
+
+    def test_follower_runs_itself_when_leader_vanishes(self):
+        """Если ведущий пропал без результата, ждущий запрос выполняется сам."""
+        from django_redis import get_redis_connection
+        from orange_assistant import singleflight
+        key = singleflight.flight_key(None, "Промпт")
+        get_redis_connection('default').set(key, 'ушедший-ведущий', px=100)
+
+        with patch('orange_assistant.ai_client.get_client', return_value=SlowBackend(delay=0)):
+            assert get_gemini_response("Промпт") == "Ответ 1"
+
+    def test_follower_of_stream_gets_whole_answer(self):
+        from orange_assistant.ai_services import stream_gemini_response
+        backend = SlowBackend()
+
+        results = self.run_concurrently(
+            backend, ["Промпт", "Промпт"], lambda prompt: list(stream_gemini_response(prompt))
+        )
+
+        assert backend.calls == 1
+        assert results == [["Ответ 1"], ["Ответ 1"]]
+
+    def test_async_identical_prompts_share_one_call(self):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from orange_assistant.ai_services import aget_gemini_response
+        backend = SlowBackend()
+
+        async def ask_three_times():
+            return await asyncio.gather(*[aget_gemini_response("Промпт", 'faq') for _ in range(3)])
+
+        with patch('orange_assistant.ai_client.get_client', return_value=backend):
+            results = async_to_sync(ask_three_times)()
+
+        assert backend.calls == 1
+        assert results == ["Ответ 1"] * 3
+
+    def test_redis_failure_falls_back_to_direct_call(self):
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        with patch('orange_assistant.singleflight._join', side_effect=RedisConnectionError("down")):
+            with patch('orange_assistant.ai_client.get_client', return_value=SlowBackend(delay=0)):
+                assert get_gemini_response("Промпт") == "Ответ 1"
+
+    def test_publish_failure_keeps_leader_answer(self):
+        """Ответ ведущего возвращается, даже если Redis не принял его результат."""
+        from django_redis import get_redis_connection
+        from redis.exceptions import ConnectionError as RedisConnectionError
+        from orange_assistant import singleflight
+        from orange_assistant.ai_services import stream_gemini_response
+        connection = get_redis_connection('default')
+
+        with patch.object(connection, 'set', side_effect=RedisConnectionError("down")):
+            with patch('orange_assistant.ai_client.get_client', return_value=SlowBackend(delay=0)):
+                assert get_gemini_response("Промпт") == "Ответ 1"
+                assert list(stream_gemini_response("Промпт")) == ["Ответ 2"]
+
+        assert connection.get(singleflight.flight_key(None, "Промпт")) is None
+
+
+@pytest.mark.django_db
+class TestAIUsageLog:
+    """Журнал обращений к ИИ: буфер в Redis, запись пачками, отчет."""
+
+    @pytest.fixture(autouse=True)
+    def small_batches(self, settings):
+        from orange_assistant import usage
+        settings.AI_USAGE_BATCH_SIZE = 3
+        usage.bind_user(None)
+
+    def test_calls_are_written_in_batches(self, django_assert_num_queries):
+        from orange_assistant import usage
+        from orange_assistant.models import AIUsageLog
+        user = UserFactory()
+        usage.bind_user(user.id)
+
+        with patch('orange_assistant.ai_client.get_client', return_value=FlakyBackend()):
+            with django_assert_num_queries(0):
+                get_gemini_response("Первый промпт", 'analyze_sentiment')
+                get_gemini_response("Второй", 'analyze_sentiment')
+            assert usage.buffered_count() == 2
+
+            get_gemini_response("Третий", 'analyze_sentiment')
+
+        assert usage.buffered_count() == 0
+        logs = list(AIUsageLog.objects.order_by('created_at'))
+        assert len(logs) == 3
+        assert {log.user_id for log in logs} == {user.id}
+        assert logs[0].action == 'analyze_sentiment'
+        assert logs[0].prompt_chars == len("Первый промпт")
+        assert logs[0].response_chars == len("Ответ")
+        assert logs[0].upstream_status == AIUsageLog.STATUS_OK
+
+    def test_cache_hits_failures_and_streams_are_logged(self):
+        from google.api_core.exceptions import PermissionDenied
+        from orange_assistant import usage
+        from orange_assistant.ai_services import stream_gemini_response
+        from orange_assistant.models import AIUsageLog
+
+        with patch('orange_assistant.ai_client.get_client', return_value=FlakyBackend(PermissionDenied("403"))):
+            get_gemini_response("Промпт", 'analyze_sentiment')
+        with patch('orange_assistant.ai_client.get_client', return_value=FlakyBackend(text="Ответ по частям")):
+            get_faq_answer("Как создать пост?", {})
+            get_faq_answer("Как создать пост?", {})
+            assert list(stream_gemini_response("Промпт", 'generate_post_ideas')) == ["Ответ", "по", "частям"]
+        usage.flush()
+
+        assert AIUsageLog.objects.get(action='analyze_sentiment').upstream_status == AIUsageLog.STATUS_ERROR
+        faq = AIUsageLog.objects.filter(action='faq')
+        assert faq.filter(cache_hit=False, upstream_status=AIUsageLog.STATUS_OK).count() == 1
+        assert faq.filter(cache_hit=True, upstream_status=AIUsageLog.STATUS_SKIPPED).count() == 1
+        assert AIUsageLog.objects.get(action='generate_post_ideas').response_chars == len("Ответпочастям")
+
+    def test_failed_batch_returns_to_buffer(self):
+        """Пачка, которую не удалось сохранить, остается в буфере в прежнем порядке."""
+        from django.db import DatabaseError
+        from orange_assistant import usage
+        from orange_assistant.models import AIUsageLog
+        for prompt in ("Первый", "Второй"):
+            usage.finish(usage.start('faq', prompt), "Ответ")
+
+        with patch.object(AIUsageLog.objects, 'bulk_create', side_effect=DatabaseError("down")):
+            assert usage.flush() == 0
+        assert usage.buffered_count() == 2
+
+        assert usage.flush() == 2
+        assert list(AIUsageLog.objects.order_by('created_at').values_list('prompt_chars', flat=True)) == [
+            len("Первый"), len("Второй")
+        ]
+
+    def test_report_aggregates_cost_and_latency_percentiles(self):
+        from orange_assistant import usage
+        from orange_assistant.models import AIUsageLog
+        AIUsageLog.objects.bulk_create([
+            AIUsageLog(
+                action='faq', latency_ms=latency, prompt_chars=100, response_chars=50,
+                upstream_status=AIUsageLog.STATUS_OK
+            )
+            for latency in range(10, 101, 10)
+        ] + [
+            AIUsageLog(
+                action='faq', latency_ms=1, prompt_chars=100, response_chars=50, cache_hit=True,
+                upstream_status=AIUsageLog.STATUS_SKIPPED
+            ),
+        ])
+
+        [row] = usage.report()
+
+        assert row['requests'] == 11
+        assert row['cache_hits'] == 1
+        assert row['upstream_calls'] == 10
+        assert row['prompt_chars'] == 1000
+        assert row['response_chars'] == 500
+        assert row['p50'] == pytest.approx(50)
+        assert row['p95'] == pytest.approx(95)
+
+    def test_admin_report_flushes_buffer(self, admin_client):
+        from django.urls import reverse
+
+        with patch('orange_assistant.ai_client.get_client', return_value=FlakyBackend()):
+            get_gemini_response("Промпт", 'analyze_sentiment')
+
+        response = admin_client.get(reverse('admin:orange_assistant_aiusagelog_report'))
+
+        assert response.status_code == 200
+        assert [row['action'] for row in response.context['rows']] == ['analyze_sentiment']
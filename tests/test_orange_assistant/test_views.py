@@ -18,12 +18,15 @@ import pytest
 import json
 import time
 from unittest.mock import patch, Mock
-from django.urls import reverse
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import RequestFactory
-from orange_assistant.views import ChatWithAIView, check_rate_limit
-from tests.factories import UserFactory, PostFactory
+from django.test import AsyncRequestFactory, RequestFactory
+from django.contrib.auth.models import AnonymousUser
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from Chatty_orange import ratelimit
+from orange_assistant.views import AsyncChatWithAIView, ChatWithAIView
+from tests.factories import UserFactory, PostFactory, CommentFactory
 
 User = get_user_model()
 
@@ -70,26 +73,25 @@ class TestChatWithAIView:
         assert 'timestamp' in response_data
 
     def test_rate_limiting_functionality(self):
-        """Тест функции rate limiting."""
+        """Тест квот помощника, которые применяет prepare_request."""
         user_id = "test_user"
 
-        # Первые 15 запросов должны проходить
+        # Первые 15 запросов одного действия должны проходить
         for i in range(15):
-            allowed, count = check_rate_limit(user_id, max_requests=15, window=60)
-            assert allowed == True
-            assert count == i + 1
+            result = ratelimit.check(user_id, 'assistant', 'assistant:general_chat')
+            assert result.allowed
+            assert result.used == i + 1
 
-        # 16-й запрос должен быть заблокирован
-        allowed, count = check_rate_limit(user_id, max_requests=15, window=60)
-        assert allowed == False
-        assert count == 15
+        # 16-й запрос того же действия должен быть заблокирован
+        result = ratelimit.check(user_id, 'assistant', 'assistant:general_chat')
+        assert not result.allowed
+        assert result.used == 15
 
     def test_rate_limiting_in_view(self, client):
         """Тест rate limiting в представлении."""
-        # Заполняем кеш до лимита
-        user_identifier = "ip_127.0.0.1"
-        requests = [time.time()] * 15
-        cache.set(f"ai_requests_{user_identifier}", requests, 60)
+        # Исчерпываем квоту действия general_chat
+        for _ in range(15):
+            assert ratelimit.check("ip_127.0.0.1", 'assistant', 'assistant:general_chat').allowed
 
         data = {
             'user_input': 'Тест',
@@ -104,6 +106,23 @@ class TestChatWithAIView:
 
         assert response.status_code == 429
         assert 'Слишком много запросов' in response.json()['error']
+        assert int(response['Retry-After']) >= 1
+
+    def test_expensive_action_has_smaller_quota(self, client):
+        """check_post_content ограничен сильнее, и его лимит не мешает дешевым действиям."""
+        def ask(action_type):
+            with patch('orange_assistant.views.check_post_content', return_value='ok'), \
+                    patch('orange_assistant.views.get_faq_answer', return_value='ok'):
+                return client.post(
+                    self.url,
+                    data=json.dumps({'user_input': 'Тест', 'action_type': action_type}),
+                    content_type='application/json'
+                )
+
+        for _ in range(5):
+            assert ask('check_post_content').status_code == 200
+        assert ask('check_post_content').status_code == 429
+        assert ask('faq').status_code == 200
 
     def test_invalid_json_handling(self, client):
         """Тест обработки невалидного JSON."""
@@ -1100,6 +1119,126 @@ class TestExtractionMethodsComprehensive:
             assert result == expected, f"Cleaning failed for '{input_text}': expected {expected}, got {result}"
 
 
+class TestIntentRouter:
+    """Предкомпилированное распознавание намерений (orange_assistant.intents)."""
+
+    @pytest.mark.parametrize('query, name, slots', [
+        ("Какие статьи у Orange?", 'user_posts', {'username': 'Orange'}),
+        ("какие статьи от alek", 'user_posts', {'username': 'alek'}),
+        ("Найди посты про Django", 'post_search', {'keyword': 'django'}),
+        ("найди пост (Python)", 'post_search', {'keyword': 'python'}),
+        ("покажи пост 5", 'post_details', {'post_id': 5}),
+        ("Расскажи о посте", 'post_details', {'post_id': None}),
+        ("Найди пользователя alek", 'user_search', {'username': 'alek'}),
+        ("что нового у orange", 'user_activity', {'user_id': None, 'username': 'orange'}),
+        ("Кого почитать?", 'recommendations', {}),
+    ])
+    def test_intent_and_slots_in_one_call(self, query, name, slots):
+        from orange_assistant import intents
+
+        intent = intents.classify(query)
+
+        assert (intent.name, intent.slots) == (name, slots)
+
+    def test_overlapping_indicators(self):
+        """'покажи пост' - индикатор и поиска, и деталей поста; без ключевого слова - детали."""
+        from orange_assistant import intents
+
+        assert intents.find_indicators("покажи пост 5") >= {intents.POST_SEARCH, intents.POST_DETAILS}
+        assert intents.find_indicators("найди посты про котиков") >= {intents.POST_SEARCH, intents.HINT_POSTS}
+
+    def test_pattern_priority_is_list_order(self):
+        """Берется первый по списку шаблон, даже если другой совпал левее."""
+        from orange_assistant import intents
+
+        # "какие статьи от" левее, но "статьи от X" в списке раньше
+        assert intents.extract_posts_author("какие статьи от alek") == 'alek'
+        # Первый шаблон дал число - берется следующий по списку
+        assert intents.extract_keyword("найди пост про 5 (django)") == 'django'
+
+    def test_general_chat_hints(self):
+        from orange_assistant import intents
+
+        intent = intents.classify("Можешь дать совет по оформлению статьи?")
+
+        assert intent.name == intents.GENERAL_CHAT
+        assert intent.hints == (intents.HINT_POSTS, intents.HINT_RECOMMENDATIONS)
+
+    def test_markdown_is_ignored_for_all_intents(self):
+        from orange_assistant import intents
+
+        assert intents.classify("**Найди** пост django").slots == {'keyword': 'django'}
+
+    def test_benchmark_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('benchmark_intent_router', '--rounds', '1', stdout=out)
+
+        assert 'медиана' in out.getvalue()
+        assert 'general_chat' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestLocalFastPath:
+    """Ответы без обращения к Gemini и доля таких ответов."""
+
+    def setup_method(self):
+        self.view = ChatWithAIView()
+        self.user_info = {'username': 'alice', 'is_authenticated': True, 'user_id': 1}
+
+    @pytest.mark.parametrize('query, expected', [
+        ("Привет!", "Привет, alice!"),
+        ("спасибо большое 🍊", "Пожалуйста, alice!"),
+        ("Что ты умеешь?", "Расскажи о посте [ID]"),
+        ("пока", "До встречи, alice!"),
+    ])
+    @patch('orange_assistant.views.get_gemini_response')
+    def test_small_talk_is_answered_by_template(self, mock_gemini, query, expected):
+        response = self.view.handle_natural_language_query(query, self.user_info)
+
+        assert expected in response
+        mock_gemini.assert_not_called()
+
+    @patch('orange_assistant.views.get_gemini_response')
+    @patch('orange_assistant.views.get_post_details', return_value="Детали поста")
+    def test_post_id_without_keyword_is_answered_from_db(self, mock_details, mock_gemini):
+        """'Найди пост 5' раньше уходил в Gemini: число не ключевое слово."""
+        assert self.view.handle_natural_language_query("Найди пост 5", self.user_info) == "Детали поста"
+
+        mock_details.assert_called_once_with(5, self.user_info)
+        mock_gemini.assert_not_called()
+
+    @patch('orange_assistant.views.find_user_by_username', return_value="Профиль")
+    def test_mention_is_user_search(self, mock_find_user):
+        assert self.view.handle_natural_language_query("@Orange", self.user_info) == "Профиль"
+        mock_find_user.assert_called_once_with('orange', self.user_info)
+
+    @patch('orange_assistant.views.get_gemini_response', return_value="Ответ ИИ")
+    def test_conversation_still_goes_to_gemini(self, mock_gemini):
+        assert self.view.handle_natural_language_query("Привет! Как дела?", self.user_info) == "Ответ ИИ"
+
+    @patch('orange_assistant.views.get_gemini_response', return_value="Ответ ИИ")
+    @patch('orange_assistant.views.get_subscription_recommendations', return_value="Рекомендации")
+    def test_local_share_metrics(self, mock_recommendations, mock_gemini):
+        from io import StringIO
+        from django.core.management import call_command
+        from orange_assistant import fast_path
+
+        for query in ["Кого почитать?", "Привет", "Спасибо", "Напиши стих про осень"]:
+            self.view.handle_natural_language_query(query, self.user_info)
+
+        stats = fast_path.get_stats()
+        assert (stats['local'], stats['total'], stats['local_share']) == (3, 4, 0.75)
+        assert stats['intents']['general_chat'] == {'local': 0, 'llm': 1}
+        assert stats['intents']['greeting'] == {'local': 1, 'llm': 0}
+
+        out = StringIO()
+        call_command('ai_response_cache', stdout=out)
+        assert "без ИИ: 3 из 4 (75%)" in out.getvalue()
+
+
 @pytest.mark.django_db
 class TestViewMethodsCoverage:
     """Тесты для покрытия дополнительных методов view."""
@@ -1236,3 +1375,210 @@ class TestViewMethodsCoverage:
 
             assert response.status_code == 200
 
+
+
+def read_sse(response):
+    """Список (событие, данные) из потокового ответа."""
+    body = b''.join(response.streaming_content).decode()
+    events = []
+    for raw_event in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in raw_event.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@pytest.mark.django_db
+class TestChatStreaming:
+    """Потоковый режим (SSE) ChatWithAIView."""
+
+    url = reverse_lazy('orange_assistant:ai_chat')
+
+    @pytest.fixture(autouse=True)
+    def stub_backend(self, settings):
+        settings.AI_CLIENT_BACKEND = 'orange_assistant.ai_client.StubBackend'
+
+    def post(self, client, data):
+        return client.post(
+            self.url, data=json.dumps(data), content_type='application/json',
+            HTTP_ACCEPT='text/event-stream'
+        )
+
+    def test_generated_answer_is_streamed_in_chunks(self, client):
+        """Ответ Gemini приходит несколькими частями и завершается событием done."""
+        response = self.post(client, {'user_input': 'Как создать пост?', 'action_type': 'analyze_sentiment'})
+
+        assert response.status_code == 200
+        assert response.streaming
+        assert response['Content-Type'] == 'text/event-stream'
+        events = read_sse(response)
+        chunks = [data['text'] for event, data in events if event == 'chunk']
+        assert len(chunks) > 1
+        assert 'Как создать пост?' in ''.join(chunks)
+        assert events[-1][0] == 'done'
+        assert events[-1][1]['truncated'] is False
+
+    def test_streamed_shared_answer_is_cached(self, client):
+        """Потоковый ответ FAQ кэшируется и в следующий раз приходит одной частью."""
+        first = read_sse(self.post(client, {'user_input': 'Как создать пост?', 'action_type': 'faq'}))
+        second = read_sse(self.post(client, {'user_input': 'как создать пост?', 'action_type': 'faq'}))
+
+        first_text = ''.join(data['text'] for event, data in first if event == 'chunk')
+        second_chunks = [data['text'] for event, data in second if event == 'chunk']
+        assert second_chunks == [first_text]
+
+    def test_answer_without_generation_is_single_chunk(self, client):
+        """Ответы без обращения к ИИ уходят одной частью."""
+        events = read_sse(self.post(client, {'action_type': 'analyze_profile'}))
+
+        assert events[0] == ('chunk', {'text': "🔒 Эта функция доступна только авторизованным пользователям!"})
+        assert events[1][0] == 'done'
+
+    def test_validation_errors_stay_json(self, client):
+        """Ошибки проверки запроса возвращаются обычным JSON."""
+        response = self.post(client, {'action_type': 'faq', 'user_input': ''})
+
+        assert response.status_code == 400
+        assert response.json()['error'] == 'Введите ваш вопрос'
+
+
+class TestIncrementalTruncation:
+    """Ограничение длины ответа по ходу потока."""
+
+    def collect(self, chunks):
+        from orange_assistant.streaming import truncate_chunks
+        state = {}
+        return ''.join(truncate_chunks(iter(chunks), state)), state
+
+    def test_matches_truncation_of_complete_response(self):
+        from orange_assistant.streaming import truncate_response
+
+        for total in (10, 4900, 4950, 5000, 5001, 12000):
+            text = ''.join(chr(ord('a') + i % 26) for i in range(total))
+            chunks = [text[i:i + 37] for i in range(0, total, 37)]
+
+            streamed, state = self.collect(chunks)
+
+            assert streamed == truncate_response(text)
+            assert state['truncated'] == (total > 5000)
+
+    def test_async_truncation_matches_sync(self):
+        from orange_assistant.streaming import atruncate_chunks, truncate_response
+
+        async def source(chunks):
+            for chunk in chunks:
+                yield chunk
+
+        async def collect(chunks):
+            state = {}
+            parts = [part async for part in atruncate_chunks(source(chunks), state)]
+            return ''.join(parts), state
+
+        for total in (10, 5000, 5001, 12000):
+            text = 'я' * total
+            chunks = [text[i:i + 101] for i in range(0, total, 101)]
+
+            streamed, state = async_to_sync(collect)(chunks)
+
+            assert streamed == truncate_response(text)
+            assert state['truncated'] == (total > 5000)
+
+    def test_generation_stops_after_limit(self):
+        """После превышения лимита источник больше не читается и закрывается."""
+        consumed = []
+
+        def source():
+            try:
+                for i in range(1000):
+                    consumed.append(i)
+                    yield 'x' * 100
+            finally:
+                consumed.append('closed')
+
+        streamed, state = self.collect(source())
+
+        assert state['truncated'] is True
+        assert streamed.endswith("(ответ сокращен)")
+        assert consumed[-1] == 'closed'
+        assert len(consumed) < 60
+
+
+@pytest.mark.django_db
+class TestAsyncChatWithAIView:
+    """Асинхронное представление помощника (ASGI)."""
+
+    @pytest.fixture(autouse=True)
+    def stub_backend(self, settings):
+        settings.AI_CLIENT_BACKEND = 'orange_assistant.ai_client.StubBackend'
+
+    def call(self, data, user=None, headers=None):
+        request = AsyncRequestFactory().post(
+            '/assistant/api/chat/', data=json.dumps(data), content_type='application/json', headers=headers
+        )
+        user = user or AnonymousUser()
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        return async_to_sync(AsyncChatWithAIView.as_view())(request)
+
+    def test_view_is_async(self):
+        assert AsyncChatWithAIView.view_is_async
+        assert iscoroutinefunction(AsyncChatWithAIView.as_view())
+
+    def test_generated_answer(self):
+        response = self.call({'action_type': 'faq', 'user_input': 'Как создать пост?'})
+
+        assert response.status_code == 200
+        assert 'Как создать пост?' in json.loads(response.content)['response']
+        assert 'csrftoken' in response.cookies
+
+    def test_find_post_by_keyword_uses_async_orm(self):
+        post = PostFactory(title='Асинхронные апельсины', text='про апельсины')
+
+        response = self.call({'action_type': 'find_post_by_keyword', 'user_input': 'найди пост апельсины'})
+
+        assert post.title in json.loads(response.content)['response']
+
+    def test_user_activity(self):
+        user = UserFactory(username='async_author')
+        post = PostFactory(author=user, title='Свежий пост')
+        CommentFactory(author=user, post=post, text='Асинхронный комментарий')
+
+        response = self.call({'action_type': 'get_user_activity', 'user_id_target': user.id}, user=user)
+
+        text = json.loads(response.content)['response']
+        assert '@async_author' in text
+        assert 'Свежий пост' in text
+        assert 'Асинхронный комментарий' in text
+
+    def test_natural_language_general_chat(self):
+        user = UserFactory(username='chatter')
+
+        response = self.call({'action_type': 'general_chat', 'user_input': 'Привет, как дела?'}, user=user)
+
+        assert 'офлайн-режим' in json.loads(response.content)['response']
+
+    def test_streaming(self):
+        response = self.call(
+            {'action_type': 'analyze_sentiment', 'user_input': 'Отличный день'},
+            headers={'Accept': 'text/event-stream'}
+        )
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        assert response.is_async
+        body = async_to_sync(read)().decode()
+        assert body.count('event: chunk') > 1
+        assert 'event: done' in body
+
+    def test_validation_and_rate_limit_shared_with_sync_view(self):
+        assert self.call({'action_type': 'unknown'}).status_code == 400
+
+        for _ in range(5):
+            ratelimit.check('ip_127.0.0.1', 'assistant:check_post_content')
+        response = self.call({'action_type': 'check_post_content', 'user_input': 'текст'})
+
+        assert response.status_code == 429
+        assert response['Retry-After']
@@ -1,6 +1,22 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Post
+from django.utils import timezone
+from django.template import Context, Template
+from posts.highlight import highlight_html
+from posts.models import Post, PostImage
+from posts.pagination import CursorPaginator
+from posts.reactions import get_viewer_reactions, toggle_reaction
+from posts.search import IcontainsSearchBackend, PostgresSearchBackend, get_search_backend
+from posts.sidebar import get_popular_tags, get_suggested_users, get_top_authors
+from subscriptions.models import Subscription
+from tests.factories import PostFactory, TagFactory, UserFactory
 
 
 @pytest.mark.django_db
@@ -101,4 +117,506 @@ class TestPostViews:
         # Проверяем, что комментарий создан
         assert post.comments.count() == 1
         comment = post.comments.first()
-        assert comment.text == 'This is a test comment'
\ No newline at end of file
+        assert comment.text == 'This is a test comment'
+
+@pytest.mark.django_db
+class TestPostReactionToggle:
+    """Тесты переключения лайков и дизлайков."""
+
+    def test_like_then_dislike_swaps_reaction(self, authenticated_client, post, user):
+        """Дизлайк снимает лайк, ответ содержит свежие счетчики."""
+        authenticated_client.post(reverse('posts:post-like', kwargs={'pk': post.pk}))
+        response = authenticated_client.post(reverse('posts:post-dislike', kwargs={'pk': post.pk}))
+
+        data = response.json()
+        assert data['disliked'] is True
+        assert data['removed_like'] is True
+        assert data['total_likes'] == 0
+        assert data['total_dislikes'] == 1
+        assert not post.likes.filter(pk=user.pk).exists()
+        assert post.dislikes.filter(pk=user.pk).exists()
+
+    def test_second_like_click_removes_like(self, authenticated_client, post):
+        """Повторный клик по лайку снимает его."""
+        url = reverse('posts:post-like', kwargs={'pk': post.pk})
+        authenticated_client.post(url)
+        data = authenticated_client.post(url).json()
+
+        assert data['liked'] is False
+        assert data['total_likes'] == 0
+        post.refresh_from_db()
+        assert post.likes_count == 0
+
+    def test_like_missing_post_returns_404(self, authenticated_client):
+        """Лайк несуществующего поста возвращает 404."""
+        response = authenticated_client.post(reverse('posts:post-like', kwargs={'pk': 999999}))
+        assert response.status_code == 404
+
+    def test_toggle_query_count(self, post, user):
+        """Переключение укладывается в фиксированное число запросов."""
+        with CaptureQueriesContext(connection) as context:
+            toggle_reaction(post.pk, user.pk, 'like')
+
+        statements = [
+            query for query in context.captured_queries
+            if not query['sql'].upper().startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))
+        ]
+        assert len(statements) <= (2 if connection.vendor == 'postgresql' else 6)
+
+
+
+@pytest.mark.django_db
+class TestViewerReactions:
+    """Реакции зрителя на посты страницы."""
+
+    def _posts(self, user):
+        liked, disliked, untouched = PostFactory.create_batch(3)
+        liked.likes.add(user)
+        disliked.dislikes.add(user)
+        return liked, disliked, untouched
+
+    def test_single_query(self, user, django_assert_num_queries):
+        liked, disliked, untouched = self._posts(user)
+
+        with django_assert_num_queries(1):
+            reactions = get_viewer_reactions(user, [liked.pk, disliked.pk, untouched.pk])
+
+        assert reactions == {liked.pk: 'like', disliked.pk: 'dislike', untouched.pk: None}
+
+    def test_anonymous_viewer_without_queries(self, user, django_assert_num_queries):
+        liked, _, _ = self._posts(user)
+
+        with django_assert_num_queries(0):
+            assert get_viewer_reactions(AnonymousUser(), [liked.pk]) == {liked.pk: None}
+
+    def test_cached_sets_are_reset_on_change(self, settings, user, django_assert_num_queries,
+                                             django_capture_on_commit_callbacks):
+        settings.VIEWER_REACTIONS_CACHE_TIMEOUT = 60
+        liked, disliked, untouched = self._posts(user)
+        post_ids = [liked.pk, disliked.pk, untouched.pk]
+        get_viewer_reactions(user, post_ids)
+
+        with django_assert_num_queries(0):
+            assert get_viewer_reactions(user, post_ids)[liked.pk] == 'like'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            toggle_reaction(untouched.pk, user.pk, 'dislike')
+        assert get_viewer_reactions(user, post_ids)[untouched.pk] == 'dislike'
+
+        user.liked_posts.remove(liked)
+        disliked.dislikes.clear()
+        assert get_viewer_reactions(user, post_ids) == {liked.pk: None, disliked.pk: None, untouched.pk: 'dislike'}
+
+    def test_detail_page_marks_reaction(self, authenticated_client, user):
+        liked, _, _ = self._posts(user)
+
+        response = authenticated_client.get(reverse('posts:post-detail', kwargs={'pk': liked.pk}))
+
+        assert response.context['post'].viewer_reaction == 'like'
+        assert 'like-button active' in response.content.decode()
+
+@pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason="Параллельная запись требует PostgreSQL (SQLite блокирует всю базу)"
+)
+@pytest.mark.django_db(transaction=True)
+class TestPostReactionConcurrency:
+    """Счетчики остаются точными при параллельных кликах."""
+
+    def _run_parallel(self, calls):
+        barrier = threading.Barrier(len(calls))
+
+        def worker(args):
+            barrier.wait()
+            try:
+                return toggle_reaction(*args)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            return list(executor.map(worker, calls))
+
+    def _assert_counters_match(self, post):
+        post.refresh_from_db()
+        assert post.likes_count == post.likes.count()
+        assert post.dislikes_count == post.dislikes.count()
+
+    def test_parallel_likes_from_many_users(self, post):
+        users = UserFactory.create_batch(12)
+
+        self._run_parallel([(post.pk, u.pk, 'like') for u in users])
+        self._assert_counters_match(post)
+        assert post.likes_count == 12
+
+        # Половина переключается на дизлайк, другая половина снимает лайк
+        self._run_parallel(
+            [(post.pk, u.pk, 'dislike') for u in users[:6]]
+            + [(post.pk, u.pk, 'like') for u in users[6:]]
+        )
+        self._assert_counters_match(post)
+        assert post.likes_count == 0
+        assert post.dislikes_count == 6
+
+    def test_parallel_clicks_from_same_user(self, post, user):
+        self._run_parallel([(post.pk, user.pk, 'like')] * 4 + [(post.pk, user.pk, 'dislike')] * 4)
+        self._assert_counters_match(post)
+        assert post.likes_count + post.dislikes_count <= 1
+
+
+@pytest.mark.django_db
+class TestPostSearch:
+    """Тесты поиска постов в ленте."""
+
+    def test_search_finds_post_by_any_term(self, client):
+        """Находятся посты, содержащие фразу или любое из слов запроса."""
+        matching = PostFactory(title='Рецепт апельсинового пирога', text='<p>Мука и сахар</p>')
+        other = PostFactory(title='Заметки о погоде', text='<p>Дождь весь день</p>')
+
+        response = client.get(reverse('posts:post-list'), {'q': 'пирога сахар'})
+
+        posts = list(response.context['posts'])
+        assert matching in posts
+        assert other not in posts
+        assert response.context['search_terms'] == ['пирога', 'сахар']
+
+    def test_search_ignores_markup(self):
+        """Атрибуты и теги HTML не находятся - ищется только текст поста."""
+        post = PostFactory(title='Заметки', text='<p class="orange"><strong>Сочный</strong> мандарин</p>')
+
+        backend = get_search_backend()
+        assert list(backend.filter(Post.objects.all(), 'orange')) == []
+        assert list(backend.filter(Post.objects.all(), 'Сочный')) == [post]
+
+    def test_highlight_touches_text_only(self):
+        """Подсветка не заходит в теги, атрибуты и сущности; фраза целиком важнее слов."""
+        html = '<p class="orange">Сок &amp; orange juice, <a href="/orange/">ORANGE</a> и я</p>'
+
+        result = highlight_html(html, 'orange juice')
+
+        assert result == (
+            '<p class="orange">Сок &amp; <mark class="highlight">orange juice</mark>, '
+            '<a href="/orange/"><mark class="highlight">ORANGE</mark></a> и я</p>'
+        )
+        assert highlight_html(html, 'amp class href я') == html
+        assert highlight_html(html, ['сок']).startswith('<p class="orange"><mark class="highlight">Сок</mark>')
+
+    def test_highlight_filter_escapes_plain_text(self):
+        template = Template('{% load highlight %}{{ title|highlight:query }}')
+
+        result = template.render(Context({'title': '<b>Пирог</b> & чай', 'query': 'пирог'}))
+
+        assert result == '&lt;b&gt;<mark class="highlight">Пирог</mark>&lt;/b&gt; &amp; чай'
+
+    def test_highlight_filter_matches_phrases_with_quotes(self):
+        """Фраза с апострофом или кавычками подсвечивается, хотя в тексте они экранированы."""
+        template = Template('{% load highlight %}{{ title|highlight:query }}')
+
+        result = template.render(Context({'title': "It's \"Orange\" day", 'query': "it's \"orange\""}))
+
+        assert result == '<mark class="highlight">It&#x27;s &quot;Orange&quot;</mark> day'
+
+    def test_backend_can_be_overridden_in_settings(self, settings):
+        """Бэкенд поиска подключается через настройку POSTS_SEARCH_BACKEND."""
+        settings.POSTS_SEARCH_BACKEND = 'posts.search.IcontainsSearchBackend'
+        assert isinstance(get_search_backend(), IcontainsSearchBackend)
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason="Полнотекстовый поиск есть только в PostgreSQL")
+    def test_full_text_search_uses_word_forms_and_rank(self):
+        """Русский стеммер находит другие словоформы, совпадение в заголовке выше."""
+        in_title = PostFactory(title='Путешествие по Латвии', text='<p>Рига и море</p>')
+        in_text = PostFactory(title='Отпуск', text='<p>Мои путешествия летом</p>')
+        PostFactory(title='Кулинария', text='<p>Борщ</p>')
+
+        backend = get_search_backend()
+        assert isinstance(backend, PostgresSearchBackend)
+
+        results = list(backend.order_by_relevance(backend.filter(Post.objects.all(), 'путешествия')))
+        assert results == [in_title, in_text]
+
+        # Релевантность входит в ключ курсора: страницы по одному посту идут в том же порядке
+        paginator = CursorPaginator(
+            backend.filter(Post.objects.all(), 'путешествия'), backend.relevance_ordering(), per_page=1
+        )
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        assert list(first) + list(second) == [in_title, in_text]
+        assert not second.has_next()
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason="Полнотекстовый поиск есть только в PostgreSQL")
+    def test_search_vector_ignores_html_markup(self):
+        """Разметка CKEditor не попадает в поисковый индекс."""
+        post = PostFactory(title='Пост', text='<span style="color:red">Текст</span>')
+        backend = get_search_backend()
+        assert not backend.filter(Post.objects.filter(pk=post.pk), 'color').exists()
+        assert backend.filter(Post.objects.filter(pk=post.pk), 'текст').exists()
+
+
+@pytest.mark.django_db
+class TestPostListCursorPagination:
+    """Тесты keyset-пагинации списков постов."""
+
+    def _walk(self, client, url, params=None):
+        """Проходит все страницы вперед, затем назад; возвращает оба списка id."""
+        params = dict(params or {})
+        forward, pages = [], []
+        response = client.get(url, params)
+        while True:
+            page = response.context['page_obj']
+            pages.append([post.pk for post in page])
+            forward += pages[-1]
+            if not page.has_next():
+                break
+            response = client.get(url, {**params, 'cursor': page.next_cursor})
+
+        backward = list(pages[-1])
+        while response.context['page_obj'].has_previous():
+            response = client.get(url, {**params, 'cursor': response.context['page_obj'].previous_cursor})
+            backward = [post.pk for post in response.context['page_obj']] + backward
+        return forward, backward
+
+    def test_latest_pages_without_count_query(self, client, user):
+        """Лента листается по курсору в обе стороны, COUNT(*) не выполняется."""
+        now = timezone.now()
+        # Одинаковая дата у части постов проверяет разбор ничьих по id
+        posts = [PostFactory(author=user, pub_date=now - timedelta(minutes=i // 3)) for i in range(23)]
+        expected = [post.pk for post in sorted(posts, key=lambda p: (p.pub_date, p.pk), reverse=True)]
+
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse('posts:post-list'))
+        assert not any('"__count" FROM "posts_post"' in query['sql'] for query in queries.captured_queries)
+
+        forward, backward = self._walk(client, reverse('posts:post-list'))
+        assert forward == expected
+        assert backward == expected
+
+    def test_popular_pages_ordered_by_likes(self, client, user):
+        """Популярные листаются по ключу (likes_count, pub_date, id)."""
+        posts = [PostFactory(author=user) for _ in range(12)]
+        for likes, post in enumerate(posts):
+            Post.objects.filter(pk=post.pk).update(likes_count=likes % 4)
+        expected = list(
+            Post.objects.order_by('-likes_count', '-pub_date', '-pk').values_list('pk', flat=True)
+        )
+
+        forward, backward = self._walk(client, reverse('posts:post-list'), {'filter': 'popular'})
+        assert forward == expected
+        assert backward == expected
+
+    def test_keyset_condition_sql(self, user):
+        """На PostgreSQL ключ с одним направлением сравнивается как строка, со смешанным - через OR."""
+        for i in range(3):
+            PostFactory(author=user, title=f'Пост {i % 2}')
+
+        def second_page(ordering):
+            paginator = CursorPaginator(Post.objects.all(), ordering, 2)
+            cursor = paginator.get_page().next_cursor
+            with CaptureQueriesContext(connection) as queries:
+                page = paginator.get_page(cursor)
+            return [post.pk for post in page], queries.captured_queries[0]['sql']
+
+        pks, sql = second_page(('-pub_date', '-pk'))
+        assert pks == list(Post.objects.order_by('-pub_date', '-pk').values_list('pk', flat=True))[2:]
+        row_value = '("posts_post"."pub_date", "posts_post"."id") < ('
+        assert (row_value in sql) == (connection.vendor == 'postgresql')
+
+        pks, sql = second_page(('title', '-pk'))
+        assert pks == list(Post.objects.order_by('title', '-pk').values_list('pk', flat=True))[2:]
+        assert ' OR ' in sql
+
+    def test_tag_pages_and_broken_cursor(self, client, user, tag):
+        """Страницы тега листаются по курсору, испорченный курсор открывает первую страницу."""
+        posts = [PostFactory(author=user) for _ in range(11)]
+        for post in posts:
+            post.tags.add(tag)
+        url = reverse('posts:tag-posts', kwargs={'slug': tag.slug})
+
+        forward, _ = self._walk(client, url)
+        assert sorted(forward) == sorted(post.pk for post in posts)
+
+        response = client.get(url, {'cursor': 'не-курсор'})
+        assert response.status_code == 200
+        assert len(response.context['posts']) == 10
+
+
+@pytest.mark.django_db
+class TestPostCards:
+    """Карточки постов страницы загружаются постоянным числом запросов."""
+
+    def _add_posts(self, author, tag, fans, count):
+        for _ in range(count):
+            post = PostFactory(author=author)
+            post.tags.add(tag, TagFactory())
+            for order in range(3):
+                PostImage.objects.create(post=post, image=f'posts_images/{post.pk}-{order}.jpg', order=order)
+            post.likes.add(*fans)
+
+    def _page_queries(self, client, url):
+        client.get(url)  # прогреваем кэши сайдбара и счетчиков
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(queries.captured_queries)
+
+    @pytest.mark.parametrize('url_name', ['posts:post-list', 'posts:tag-posts', 'subscriptions:feed'])
+    def test_query_count_does_not_depend_on_page_size(self, authenticated_client, user, another_user, tag, url_name):
+        Subscription.objects.create(subscriber=user, author=another_user)
+        fans = UserFactory.create_batch(3) + [user]
+        url = reverse(url_name, kwargs={'slug': tag.slug} if url_name == 'posts:tag-posts' else None)
+
+        self._add_posts(another_user, tag, fans, 2)
+        few = self._page_queries(authenticated_client, url)
+        self._add_posts(another_user, tag, fans, 8)
+        full = self._page_queries(authenticated_client, url)
+
+        assert full == few
+
+    def test_page_query_skips_full_text(self, client, another_user):
+        PostFactory(author=another_user, text='<p>' + 'Длинный текст поста. ' * 100 + '</p>')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('posts:post-list'))
+
+        page_query = next(query['sql'] for query in queries.captured_queries if 'posts_post"."title' in query['sql'])
+        assert '"posts_post"."text"' not in page_query
+        assert 'Длинный текст поста.' in response.context['posts'][0].card_body
+
+    def test_card_data_and_viewer_state(self, authenticated_client, user, another_user, tag):
+        self._add_posts(another_user, tag, [user], 1)
+        disliked = PostFactory(author=another_user)
+        disliked.dislikes.add(user)
+
+        response = authenticated_client.get(reverse('posts:post-list'))
+
+        cards = {post.pk: post for post in response.context['posts']}
+        liked = next(post for post in cards.values() if post.images_count)
+        assert [image.order for image in liked.card_images] == [0, 1, 2]
+        assert tag in liked.card_tags
+        assert liked.viewer_reaction == 'like'
+        assert cards[disliked.pk].viewer_reaction == 'dislike'
+
+    def test_card_bodies_cached_across_viewers(self, authenticated_client, user, another_user, tag):
+        self._add_posts(another_user, tag, [user], 3)
+        url = reverse('posts:post-list')
+        first = {post.pk: post.card_body for post in authenticated_client.get(url).context['posts']}
+        assert all(post.viewer_reaction == 'like' for post in authenticated_client.get(url).context['posts'])
+
+        authenticated_client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get(url)
+
+        assert {post.pk: post.card_body for post in response.context['posts']} == first
+        assert not any('posts_postimage' in query['sql'] for query in queries.captured_queries)
+        assert all(post.viewer_reaction is None for post in response.context['posts'])
+
+    def test_card_version_bumps_on_changes(self, client, another_user, tag):
+        post = PostFactory(author=another_user)
+        url = reverse('posts:post-list')
+        client.get(url)
+
+        post.title = 'Новый заголовок карточки'
+        post.save()
+        assert 'Новый заголовок карточки' in client.get(url).content.decode()
+
+        PostImage.objects.create(post=post, image='posts_images/new.jpg')
+        assert 'posts_images/new.jpg' in client.get(url).content.decode()
+
+        post.tags.add(tag)
+        assert f'#{tag.name}' in client.get(url).content.decode()
+
+        post.refresh_from_db()
+        assert post.card_version == 4
+
+        tag.name = 'переименованный'
+        tag.slug = 'pereimenovannyi'
+        tag.save()
+        # Теги есть и в сайдбаре - проверяем само тело карточки
+        body = client.get(url).context['posts'][0].card_body
+        assert '#переименованный' in body
+        assert '/pereimenovannyi/' in body
+
+        tag.delete()
+        assert '#переименованный' not in client.get(url).context['posts'][0].card_body
+
+    def test_card_body_depends_on_search_query(self, client, another_user):
+        PostFactory(author=another_user, title='Апельсиновый сок')
+        url = reverse('posts:post-list')
+        client.get(url)
+
+        response = client.get(url, {'q': 'сок'})
+
+        assert 'class="highlight"' in response.context['posts'][0].card_body
+
+    def test_card_cache_keys_are_bounded(self, client, another_user):
+        """Страницы поиска и неизвестные фильтры не добавляют ключей в кэш карточек."""
+        from django.core.cache import caches
+        PostFactory(author=another_user, title='Апельсиновый сок')
+        url = reverse('posts:post-list')
+        client.get(url)
+        cached = caches['fragments'].keys('post_card:*')
+        assert len(cached) == 1
+
+        for query in ('сок', 'Апельсиновый', 'Апельсиновый сок'):
+            assert 'class="highlight"' in client.get(url, {'q': query}).context['posts'][0].card_body
+        client.get(url, {'filter': 'что-угодно'})
+
+        assert caches['fragments'].keys('post_card:*') == cached
+
+
+@pytest.mark.django_db
+class TestSidebarCache:
+    """Тесты кэшированных данных сайдбара."""
+
+    def test_popular_tags_are_cached_and_reset_on_tagging(self, user):
+        """Рейтинг тегов берется из кэша и сбрасывается при изменении тегов постов."""
+        python, django = TagFactory(), TagFactory()
+        post = PostFactory(author=user)
+        post.tags.add(python)
+
+        assert [tag.pk for tag in get_popular_tags()][:1] == [python.pk]
+        with CaptureQueriesContext(connection) as queries:
+            get_popular_tags()
+        assert len(queries.captured_queries) == 0
+
+        for _ in range(2):
+            PostFactory(author=user).tags.add(django)
+        assert get_popular_tags()[0].pk == django.pk
+        assert get_popular_tags()[0].posts_count == 2
+
+    def test_suggested_users_filtered_per_viewer(self, user, another_user):
+        """Из общего топа исключаются сам пользователь и его подписки."""
+        star = UserFactory()
+        for follower in UserFactory.create_batch(3):
+            Subscription.objects.create(subscriber=follower, author=star)
+        Subscription.objects.create(subscriber=another_user, author=user)
+
+        suggested = get_suggested_users(user)
+        assert suggested[0] == star
+        assert user not in suggested
+
+        Subscription.objects.create(subscriber=user, author=star)
+        assert star not in get_suggested_users(user)
+        # Подписка сбросила общий рейтинг: у star теперь 4 подписчика
+        assert get_top_authors()[0].subscribers_count == 4
+
+    def test_top_authors_stats_are_not_multiplied(self, user):
+        """Посты и подписчики считаются подзапросами: JOIN не перемножает счетчики."""
+        PostFactory.create_batch(3, author=user)
+        latest = PostFactory(author=user, title='Самый свежий')
+        for follower in UserFactory.create_batch(2):
+            Subscription.objects.create(subscriber=follower, author=user)
+
+        with CaptureQueriesContext(connection) as queries:
+            top = get_top_authors()
+        assert len(queries.captured_queries) == 1
+        assert top[0] == user
+        assert (top[0].posts_count, top[0].subscribers_count) == (4, 2)
+        assert top[0].latest_post_title == latest.title
+
+    def test_post_list_renders_sidebar(self, authenticated_client, user, another_user):
+        """Список постов показывает рекомендации и популярные теги из кэша."""
+        tag = TagFactory(name='апельсины')
+        PostFactory(author=another_user).tags.add(tag)
+
+        response = authenticated_client.get(reverse('posts:post-list'))
+        assert response.context['suggested_users'] == [another_user]
+        assert '#апельсины' in response.content.decode()
@@ -1,6 +1,13 @@
+from datetime import timedelta
+
 import pytest
+from django.core.cache import cache
+from django.core.management import call_command
 from django.urls import reverse
-from subscriptions.models import Subscription
+from django.utils import timezone
+from subscriptions.models import Subscription, TimelineEntry
+from subscriptions.timeline import get_feed_page
+from tests.factories import PostFactory, UserFactory
 
 
 @pytest.mark.django_db
@@ -72,4 +79,163 @@ class TestSubscriptionViews:
         """Тест ленты подписок для неавторизованного пользователя."""
         url = reverse('subscriptions:feed')
         response = client.get(url)
-        assert response.status_code == 302  # Редирект на страницу входа
\ No newline at end of file
+        assert response.status_code == 302  # Редирект на страницу входа
+
+
+@pytest.mark.django_db
+class TestFeedTimeline:
+    """Тесты материализованной ленты подписок."""
+
+    def _create_posts(self, author, count):
+        now = timezone.now()
+        return [
+            PostFactory(author=author, pub_date=now - timedelta(minutes=i))
+            for i in range(count)
+        ]
+
+    def _read_whole_feed(self, user, limit):
+        seen, cursor = [], None
+        while True:
+            page = get_feed_page(user, cursor, limit=limit)
+            seen += [post.pk for post in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                return seen
+
+    def test_new_post_is_fanned_out_to_followers(self, user, another_user):
+        """Новый пост попадает в ленты подписчиков автора."""
+        Subscription.objects.create(subscriber=user, author=another_user)
+        post = PostFactory(author=another_user)
+
+        assert TimelineEntry.objects.filter(owner=user, post=post).exists()
+        assert not TimelineEntry.objects.filter(owner=another_user).exists()
+
+    def test_subscribe_backfills_and_unsubscribe_cleans_timeline(self, user, another_user):
+        """Подписка добавляет старые посты автора в ленту, отписка их убирает."""
+        self._create_posts(another_user, 3)
+        subscription = Subscription.objects.create(subscriber=user, author=another_user)
+        assert TimelineEntry.objects.filter(owner=user).count() == 3
+
+        subscription.delete()
+        assert not TimelineEntry.objects.filter(owner=user).exists()
+
+    def test_keyset_pages_cover_feed_in_order(self, user, another_user):
+        """Страницы по курсору идут от новых к старым без пропусков и повторов."""
+        Subscription.objects.create(subscriber=user, author=another_user)
+        posts = self._create_posts(another_user, 25)
+
+        assert self._read_whole_feed(user, limit=10) == [post.pk for post in posts]
+
+    def test_trimmed_timeline_falls_back_to_direct_read(self, settings, user, another_user):
+        """Лента обрезается до FEED_TIMELINE_LENGTH, старые посты дочитываются напрямую."""
+        settings.FEED_TIMELINE_LENGTH = 3
+        Subscription.objects.create(subscriber=user, author=another_user)
+        posts = self._create_posts(another_user, 7)
+
+        assert self._read_whole_feed(user, limit=2) == [post.pk for post in posts]
+        assert TimelineEntry.objects.filter(owner=user).count() == 7
+
+        call_command('trim_timelines')
+        assert TimelineEntry.objects.filter(owner=user).count() == 3
+        assert self._read_whole_feed(user, limit=2) == [post.pk for post in posts]
+
+    def test_feed_read_does_not_write(self, django_assert_num_queries, user, another_user):
+        """Чтение первой страницы ленты не обрезает ее."""
+        Subscription.objects.create(subscriber=user, author=another_user)
+        self._create_posts(another_user, 3)
+        get_feed_page(user, limit=10)
+
+        # подписки, записи ленты, страница прямым запросом по подпискам
+        with django_assert_num_queries(3):
+            get_feed_page(user, limit=10)
+
+    def test_celebrity_posts_are_merged_on_read(self, settings, user, another_user):
+        """Посты популярных авторов не раскладываются, а подмешиваются при чтении."""
+        settings.FEED_CELEBRITY_FOLLOWERS = 2
+        celebrity = UserFactory()
+        Subscription.objects.create(subscriber=user, author=celebrity)
+        Subscription.objects.create(subscriber=another_user, author=celebrity)
+        Subscription.objects.create(subscriber=user, author=another_user)
+        cache.clear()
+
+        now = timezone.now()
+        regular_old = PostFactory(author=another_user, pub_date=now - timedelta(hours=2))
+        celebrity_post = PostFactory(author=celebrity, pub_date=now - timedelta(hours=1))
+        regular_new = PostFactory(author=another_user, pub_date=now)
+
+        assert not TimelineEntry.objects.filter(post=celebrity_post).exists()
+        assert self._read_whole_feed(user, limit=2) == [regular_new.pk, celebrity_post.pk, regular_old.pk]
+
+    def test_trimmed_timeline_with_celebrity_keeps_older_posts(self, settings, user, another_user):
+        """Посты обычного автора старше обрезанной ленты не теряются за постами популярного."""
+        settings.FEED_CELEBRITY_FOLLOWERS = 2
+        settings.FEED_TIMELINE_LENGTH = 3
+        celebrity = UserFactory()
+        Subscription.objects.create(subscriber=user, author=celebrity)
+        Subscription.objects.create(subscriber=another_user, author=celebrity)
+        Subscription.objects.create(subscriber=user, author=another_user)
+        cache.clear()
+
+        now = timezone.now()
+        regular = [PostFactory(author=another_user, pub_date=now - timedelta(hours=i)) for i in range(6)]
+        old_celebrity = PostFactory(author=celebrity, pub_date=now - timedelta(hours=10))
+        new_celebrity = PostFactory(author=celebrity, pub_date=now - timedelta(minutes=30))
+        call_command('trim_timelines')
+        assert TimelineEntry.objects.filter(owner=user).count() == 3
+
+        expected = [regular[0].pk, new_celebrity.pk] + [post.pk for post in regular[1:]] + [old_celebrity.pk]
+        assert self._read_whole_feed(user, limit=2) == expected
+        assert self._read_whole_feed(user, limit=4) == expected
+
+    def test_former_celebrity_posts_are_fanned_out(self, settings, user, another_user):
+        """Когда подписчиков становится меньше порога, посты автора раскладываются по лентам."""
+        from subscriptions.timeline import celebrity_author_ids
+        settings.FEED_CELEBRITY_FOLLOWERS = 2
+        Subscription.objects.create(subscriber=user, author=another_user)
+        Subscription.objects.create(subscriber=UserFactory(), author=another_user)
+        cache.clear()
+        assert celebrity_author_ids() == {another_user.pk}
+        post = PostFactory(author=another_user)
+        assert not TimelineEntry.objects.filter(post=post).exists()
+
+        settings.FEED_CELEBRITY_FOLLOWERS = 3
+        cache.delete('feed:celebrity_authors')
+
+        # Чтение ленты ничего не раскладывает - автор остается в наборе до команды
+        assert celebrity_author_ids() == {another_user.pk}
+        assert self._read_whole_feed(user, limit=2) == [post.pk]
+        assert not TimelineEntry.objects.filter(post=post).exists()
+
+        call_command('trim_timelines')
+        assert celebrity_author_ids() == set()
+        assert TimelineEntry.objects.filter(owner=user, post=post).exists()
+
+    def test_existing_subscriptions_are_backfilled(self, settings, user, another_user):
+        """Миграция раскладывает посты по лентам подписок, созданных до ленты."""
+        from importlib import import_module
+        from django.apps import apps
+        settings.FEED_TIMELINE_LENGTH = 3
+        Subscription.objects.create(subscriber=user, author=another_user)
+        posts = self._create_posts(another_user, 5)
+        TimelineEntry.objects.all().delete()
+
+        import_module('subscriptions.migrations.0004_fill_timelines').fill_timelines(apps, None)
+
+        assert set(
+            TimelineEntry.objects.filter(owner=user).values_list('post', flat=True)
+        ) == {post.pk for post in posts[:3]}
+
+    def test_previous_page_and_invalid_cursor(self, authenticated_client, user, another_user):
+        """Ссылка назад возвращает предыдущую страницу, испорченный курсор - первую."""
+        Subscription.objects.create(subscriber=user, author=another_user)
+        posts = self._create_posts(another_user, 5)
+        url = reverse('subscriptions:feed')
+
+        first = authenticated_client.get(url, {'cursor': '%%%'}).context
+        assert list(first['posts']) == posts
+        assert not first['is_paginated']
+
+        page = get_feed_page(user, limit=2)
+        second = get_feed_page(user, page.next_cursor, limit=2)
+        assert list(second) == posts[2:4]
+        assert list(get_feed_page(user, second.previous_cursor, limit=2)) == posts[:2]
@@ -3,6 +3,7 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 from allauth.socialaccount.models import SocialApp
 from django.contrib.sites.models import Site
+from subscriptions.models import Subscription
 
 User = get_user_model()
 
@@ -40,6 +41,14 @@ class TestUserViews:
         assert response.status_code == 200
         assert user.username in response.content.decode()
 
+    def test_profile_view_counters(self, client, user, another_user):
+        """Счетчики профиля берутся из сервиса статистики."""
+        Subscription.objects.create(subscriber=another_user, author=user)
+        url = reverse('users:profile', kwargs={'username': user.username})
+        response = client.get(url)
+        assert response.context['profile_stats']['subscribers_count'] == 1
+        assert response.context['profile_stats']['subscriptions_count'] == 0
+
     def test_profile_view_nonexistent_user(self, client):
         """Тест профиля несуществующего пользователя."""
         url = reverse('users:profile', kwargs={'username': 'nonexistent'})
@@ -0,0 +1,148 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# users/lookup.py
+"""
+Поиск пользователей по имени для ассистента и профилей.
+
+- get_user_by_username: точный поиск без учета регистра; на PostgreSQL
+  обслуживается функциональным индексом по UPPER(username) (миграция 0002);
+- suggest_usernames: варианты «возможно, вы имели в виду». При наличии
+  pg_trgm - оператор % по триграммному GIN-индексу с сортировкой по
+  similarity, иначе - кандидаты по префиксу (тот же UPPER-индекс) с
+  ранжированием по похожести в Python. Если по префиксу близких имен не
+  нашлось (опечатка в первых символах), кандидаты берутся регулярным
+  выражением по префиксам с одной правкой среди имен близкой длины.
+"""
+import re
+from difflib import SequenceMatcher
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models.functions import Length
+
+from .models import CustomUser
+
+SUGGESTIONS_LIMIT = 5
+# Минимальная похожесть кандидата (как порог pg_trgm.similarity_threshold по умолчанию)
+MIN_SIMILARITY = 0.3
+# Длина префикса и размер пула кандидатов для поиска без pg_trgm
+PREFIX_LENGTH = 3
+CANDIDATES_POOL = 50
+# Поиск с опечаткой в префиксе: кандидаты, чьи первые TYPO_PREFIX_LENGTH символов
+# отличаются от запроса одной правкой, а длина - не больше чем на LENGTH_TOLERANCE.
+# Нужен, если среди кандидатов по префиксу нет похожих хотя бы на CLOSE_SIMILARITY
+TYPO_PREFIX_LENGTH = 6
+LENGTH_TOLERANCE = 2
+CLOSE_SIMILARITY = 0.8
+
+_trigram_support = {}
+
+
+def has_trigram_support():
+    """Установлено ли расширение pg_trgm в текущей БД (проверяется один раз)."""
+    if connection.vendor != 'postgresql':
+        return False
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _trigram_support:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_support[key] = cursor.fetchone() is not None
+    return _trigram_support[key]
+
+
+def get_user_by_username(username):
+    """Пользователь с точным (без учета регистра) именем или CustomUser.DoesNotExist."""
+    return CustomUser.objects.get(username__iexact=username)
+
+
+def _rank_by_similarity(query, names, limit):
+    """Сортирует имена по похожести на query (difflib), отбрасывая непохожие."""
+    # b2j строится один раз для запроса; быстрые верхние оценки отсекают
+    # заведомо непохожие имена до дорогого ratio()
+    matcher = SequenceMatcher(None)
+    matcher.set_seq2(query.lower())
+    scored = []
+    for name in names:
+        matcher.set_seq1(name.lower())
+        if matcher.real_quick_ratio() < MIN_SIMILARITY or matcher.quick_ratio() < MIN_SIMILARITY:
+            continue
+        ratio = matcher.ratio()
+        if ratio >= MIN_SIMILARITY:
+            scored.append((-ratio, name))
+    scored.sort()
+    return [name for _, name in scored[:limit]]
+
+
+def _typo_prefixes_regex(query):
+    """
+    Регулярное выражение для имен, чьи первые TYPO_PREFIX_LENGTH символов
+    отличаются от query одной правкой: замена, лишний или пропущенный
+    символ, перестановка соседних.
+    """
+    query = query.lower()
+    head = TYPO_PREFIX_LENGTH
+    variants = {re.escape(query[:head])}
+    for i in range(min(head, len(query))):
+        before = re.escape(query[:i])
+        variants.add(before + '.' + re.escape(query[i + 1:head]))  # замена
+        variants.add(before + '.' + re.escape(query[i:head - 1]))  # в запросе пропущен символ
+        variants.add(before + re.escape(query[i + 1:head + 1]))  # в запросе лишний символ
+        if i + 1 < len(query):
+            variants.add(before + re.escape(query[i + 1] + query[i] + query[i + 2:head]))
+    return '^(?:' + '|'.join(sorted(variants)) + ')'
+
+
+def suggest_usernames(query, limit=SUGGESTIONS_LIMIT):
+    """Имена активных пользователей, похожие на query, от самых похожих."""
+    query = (query or '').strip().lstrip('@')
+    if not query:
+        return []
+    users = CustomUser.objects.filter(is_active=True)
+
+    if has_trigram_support():
+        return list(
+            users.filter(username__trigram_similar=query)
+            .annotate(similarity=TrigramSimilarity('username', query))
+            .order_by('-similarity', 'username')
+            .values_list('username', flat=True)[:limit]
+        )
+
+    candidates = list(users.filter(
+        username__istartswith=query[:PREFIX_LENGTH]
+    ).order_by().values_list('username', flat=True)[:CANDIDATES_POOL])
+    suggestions = _rank_by_similarity(query, candidates, limit)
+    if suggestions and SequenceMatcher(None, suggestions[0].lower(), query.lower()).ratio() >= CLOSE_SIMILARITY:
+        return suggestions
+
+    # Опечатка могла попасть в сам префикс. Выражение индекс не использует,
+    # поэтому выполняется только когда по префиксу близких имен не нашлось
+    candidates += users.annotate(username_length=Length('username')).filter(
+        username__iregex=_typo_prefixes_regex(query),
+        username_length__range=(len(query) - LENGTH_TOLERANCE, len(query) + LENGTH_TOLERANCE),
+    ).order_by().values_list('username', flat=True)[:CANDIDATES_POOL]
+    return _rank_by_similarity(query, set(candidates), limit)
+
+
+def lookup_user(username, limit=SUGGESTIONS_LIMIT):
+    """
+    Ищет пользователя по имени. Возвращает (user, suggestions): найденного
+    пользователя или None и, если точного совпадения нет, список похожих имен.
+    """
+    try:
+        return get_user_by_username(username), []
+    except CustomUser.DoesNotExist:
+        return None, suggest_usernames(username, limit)
@@ -0,0 +1,129 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import hashlib
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from users.lookup import get_user_by_username, has_trigram_support, suggest_usernames
+from users.models import CustomUser
+
+# Синтетические имена одинаково строятся в SQL и в Python: 8 hex-символов md5 + номер
+INSERT_SYNTHETIC_USERS_SQL = """
+INSERT INTO {table} (password, is_superuser, username, first_name, last_name,
+                     email, is_staff, is_active, date_joined)
+SELECT '!', false, substr(md5(i::text), 1, 8) || '_b' || i, '', '', '', false, true, now()
+FROM generate_series(1, %s) AS i
+"""
+
+
+def synthetic_username(number):
+    return f"{hashlib.md5(str(number).encode()).hexdigest()[:8]}_b{number}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет поиск пользователя по имени (точный без учета регистра и "
+        "варианты «возможно, вы имели в виду») на синтетической таблице. "
+        "Пользователи создаются внутри транзакции, которая затем откатывается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1_000_000,
+            help='Сколько синтетических пользователей создать (по умолчанию 1 000 000)',
+        )
+        parser.add_argument(
+            '--queries', type=int, default=200,
+            help='Сколько запросов каждого вида выполнить',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        users_count = options['users']
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            self._create_users(users_count)
+            self.stdout.write(
+                f"Создано {users_count} пользователей за {time.perf_counter() - started:.1f} с "
+                f"(pg_trgm: {'да' if has_trigram_support() else 'нет'})"
+            )
+
+            names = [synthetic_username(rng.randint(1, users_count)) for _ in range(options['queries'])]
+            # Точный поиск в другом регистре и имена с опечаткой (пропущен символ):
+            # в префиксе, по которому ищутся кандидаты без pg_trgm, и после него
+            exact_queries = [name.upper() for name in names]
+            typo_queries = {
+                position: [name[:position] + name[position + 1:] for name in names]
+                for position in (0, 1, 2, 4)
+            }
+
+            if connection.vendor == 'postgresql':
+                plan = CustomUser.objects.filter(username__iexact=exact_queries[0]).explain()
+                self.stdout.write(f"План точного поиска:\n{plan}")
+
+            self._report('Точный поиск (iexact)', exact_queries, get_user_by_username)
+            for position, queries in typo_queries.items():
+                self._report(
+                    f'Похожие имена (опечатка в символе {position})', queries, suggest_usernames, expected=names
+                )
+
+            transaction.set_rollback(True)
+
+    def _create_users(self, users_count):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    INSERT_SYNTHETIC_USERS_SQL.format(table=connection.ops.quote_name(CustomUser._meta.db_table)),
+                    [users_count]
+                )
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(CustomUser._meta.db_table)}")
+            return
+
+        batch_size = 10_000
+        for start in range(1, users_count + 1, batch_size):
+            CustomUser.objects.bulk_create(
+                CustomUser(username=synthetic_username(number), password='!')
+                for number in range(start, min(start + batch_size, users_count + 1))
+            )
+
+    def _report(self, title, queries, lookup, expected=None):
+        """expected - имена, которые должны оказаться среди подсказок (доля попаданий)."""
+        timings, results = [], []
+        for query in queries:
+            started = time.perf_counter()
+            try:
+                results.append(lookup(query))
+            except CustomUser.DoesNotExist:
+                results.append(None)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        line = (
+            f"{title}: медиана {statistics.median(timings):.3f} мс, "
+            f"p95 {p95:.3f} мс, максимум {timings[-1]:.3f} мс ({len(timings)} запросов)"
+        )
+        if expected is not None:
+            found = sum(name in result for name, result in zip(expected, results))
+            line += f", нужное имя среди подсказок: {found * 100 / len(expected):.0f}%"
+        self.stdout.write(line)
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.5 on 2025-06-05 11:20
+
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# username__iexact компилируется в UPPER("username"::text) = UPPER(%s), и
+# обычный btree-индекс по username для него бесполезен. Функциональный индекс
+# с text_pattern_ops обслуживает и точное сравнение, и префиксный LIKE 'АБ%'
+# (istartswith), которым подбираются варианты без pg_trgm.
+CREATE_UPPER_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS users_customuser_username_upper_idx
+    ON users_customuser (UPPER(username::text) text_pattern_ops);
+"""
+
+# Триграммный GIN-индекс для нечеткого поиска (оператор %) - только если
+# расширение pg_trgm доступно на сервере и у пользователя БД есть права
+CREATE_TRGM_INDEX_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS users_customuser_username_trgm_idx
+    ON users_customuser USING gin (username gin_trgm_ops);
+"""
+
+DROP_INDEXES_SQL = """
+DROP INDEX IF EXISTS users_customuser_username_trgm_idx;
+DROP INDEX IF EXISTS users_customuser_username_upper_idx;
+"""
+
+
+def create_username_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_UPPER_INDEX_SQL)
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        trgm_available = cursor.fetchone() is not None
+    if not trgm_available:
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute(CREATE_TRGM_INDEX_SQL)
+    except DatabaseError as e:
+        # Нет прав на CREATE EXTENSION - поиск работает через префиксный индекс
+        logger.warning(f"Триграммный индекс по username не создан, похожие имена ищутся без pg_trgm: {e}")
+
+
+def drop_username_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEXES_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_username_indexes, drop_username_indexes),
+    ]
@@ -0,0 +1,93 @@
+# Copyright 2024-2025 Aleksejs Giruckis, Igor Pronin, Viktor Yerokhov,
+# Maxim Schneider, Ivan Miakinnov, Eugen Maljas
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# users/profile_stats.py
+"""
+Статистика профиля: посты, комментарии, полученные лайки, подписчики и
+подписки пользователя.
+
+Все счетчики считаются одним запросом - коррелированными подзапросами по
+индексам author_id/subscriber_id (лайки - сумма денормализованного
+Post.likes_count), без обхода постов и JOIN с GROUP BY.
+
+Результат кэшируется на PROFILE_STATS_CACHE_TIMEOUT секунд. Создание и
+удаление постов, комментариев и подписок сбрасывает кэш сигналами (см.
+posts.signals и subscriptions.signals); полученные лайки могут отставать
+не дольше TTL.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Post
+from subscriptions.models import Subscription
+from .models import CustomUser
+
+PROFILE_STATS_CACHE_TIMEOUT = 60
+
+COUNTERS = (
+    'posts_count',
+    'comments_count',
+    'likes_received',
+    'subscribers_count',
+    'subscriptions_count',
+)
+
+
+def _cache_key(user_id):
+    return f'profile_stats:{user_id}'
+
+
+def _per_user(queryset, field, aggregate):
+    rows = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        total=aggregate
+    ).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _query_stats(user_id):
+    return CustomUser.objects.filter(pk=user_id).annotate(
+        posts_count=_per_user(Post.objects.all(), 'author', Count('pk')),
+        comments_count=_per_user(Comment.objects.all(), 'author', Count('pk')),
+        likes_received=_per_user(Post.objects.all(), 'author', Sum('likes_count')),
+        subscribers_count=_per_user(Subscription.objects.all(), 'author', Count('pk')),
+        subscriptions_count=_per_user(Subscription.objects.all(), 'subscriber', Count('pk')),
+    ).values('username', 'date_joined', *COUNTERS).first()
+
+
+def get_profile_stats(user_id, use_cache=True):
+    """
+    Словарь со счетчиками COUNTERS, а также username и date_joined.
+    Для несуществующего пользователя - CustomUser.DoesNotExist.
+    """
+    key = _cache_key(user_id)
+    if use_cache:
+        stats = cache.get(key)
+        if stats is not None:
+            return stats
+
+    stats = _query_stats(user_id)
+    if stats is None:
+        raise CustomUser.DoesNotExist(f"Пользователь {user_id} не найден")
+
+    if use_cache:
+        cache.set(key, stats, getattr(settings, 'PROFILE_STATS_CACHE_TIMEOUT', PROFILE_STATS_CACHE_TIMEOUT))
+    return stats
+
+
+def invalidate_profile_stats(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids if user_id])
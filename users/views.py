@@ -20,9 +20,12 @@ from django.contrib.auth import get_user_model
 from django.views.generic import UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
-from django.db.models import Count, Exists, OuterRef
+from django.db.models import Exists, OuterRef
 from .forms import ProfileUpdateForm
+from .profile_stats import get_profile_stats
 from subscriptions.models import Subscription
+from posts.cards import card_queryset, load_post_cards
+from posts.reactions import reaction_context
 from posts.models import Post, Comment  # Добавлен импорт Comment
 
 CustomUser = get_user_model()
@@ -44,28 +47,19 @@ def profile_view(request, username):
             author=profile_user
         ).exists()
 
-    # Получаем несколько последних постов пользователя, с аннотациями
-    posts_query = Post.objects.filter(author=profile_user)
-
-    # Добавляем аннотации для подсчета лайков и комментариев
-    user_posts = posts_query.annotate(
-        likes_count=Count('likes', distinct=True),
-        comments_count=Count('comments', distinct=True)
-    ).order_by('-pub_date')[:4]
-
-    # Определяем, какие посты лайкнул текущий пользователь
-    user_liked_posts = []
-    if request.user.is_authenticated:
-        # Получаем ID постов, которые лайкнул пользователь
-        liked_post_ids = posts_query.filter(likes=request.user).values_list('id', flat=True)
-        user_liked_posts = list(liked_post_ids)
+    # Несколько последних постов пользователя; лайки и комментарии - из
+    # колонок-счетчиков, реакции зрителя - одним запросом на все карточки
+    user_posts = load_post_cards(
+        card_queryset(Post.objects.filter(author=profile_user)).order_by('-pub_date')[:4]
+    )
 
     context = {
         'profile_user': profile_user,
         'is_subscribed': is_subscribed,
         'user_posts': user_posts,
-        'user_liked_posts': user_liked_posts,
+        'profile_stats': get_profile_stats(profile_user.pk),
         'search_terms': request.GET.get('q', ''),
+        **reaction_context(request.user, user_posts),
     }
     return render(request, 'users/profile.html', context)
 